@@ -14,6 +14,8 @@ from compas.geometry import Bezier
 
 BYTE_ORDER = '!'
 PAYLOAD_FORMAT = 'I'
+# the first bytes of a binary execution file, see workshop_sjsu.ur.execution_file
+EXECUTION_FILE_MAGIC = b'SJSUEXEC'
 
 
 def get_current_ip_address():
@@ -58,8 +60,10 @@ def detect_esp32_webserver(ip_range):
                 return ip_address
 
 
-async def handle_tcp_request(callback, reader, writer):
+async def handle_tcp_request(callback, on_connect, reader, writer):
     try:
+        if on_connect:
+            on_connect()
         while True:
             try:
                 data = await reader.read(4)
@@ -76,9 +80,9 @@ async def handle_tcp_request(callback, reader, writer):
             writer.close()
 
 
-async def start_server(callback, port=9111):
+async def start_server(callback, port=9111, on_connect=None):
     print(' [ ] Starting TCP server...\r', end='', flush=True)
-    server = await asyncio.start_server(functools.partial(handle_tcp_request, callback), '0.0.0.0', port)
+    server = await asyncio.start_server(functools.partial(handle_tcp_request, callback, on_connect), '0.0.0.0', port)
     addr, port = server.sockets[0].getsockname()
     print(f' [✓] Started TCP server on {addr}:{port}')
 
@@ -92,6 +96,18 @@ def load_command_file(file):
         print('     Verify the file exists and is a valid JSON file.')
         sys.exit(1)
 
+    with io.open(file, 'rb') as fp:
+        binary = fp.read(len(EXECUTION_FILE_MAGIC)) == EXECUTION_FILE_MAGIC
+    if binary:
+        # only the needed columns are read, the frames are memory-mapped for their count
+        from workshop_sjsu.ur.execution_file import ExecutionFile
+        execution = ExecutionFile(file)
+        return dict(
+            colors=(execution.colors / 255.).tolist(),
+            gradients=execution.gradients.astype(float).tolist(),
+            frames=execution.frames,
+        )
+
     with io.open(file, 'r') as fp:
         commands = json.load(fp)
 
@@ -223,13 +239,19 @@ if __name__ == '__main__':
         return vmapped
 
     def robot_callback(value):
-        r, g, b = [int(c * 255) for c in execution_data.flat_data['colors'][value]]
+        r, g, b = [int(round(c * 255)) for c in execution_data.flat_data['colors'][value]]
         vmapped = map_gradient_value(execution_data.flat_data['gradients'][value])
         #vmapped = execution_data.flat_data['gradients'][value] * 0.1
         brightness = int(vmapped * 255)
         print(f', RGB: {r}, {g}, {b}, Brightness: {brightness}\r', end='', flush=True)
         session.get(f'http://{esp32_ip_address}/leds?rgb=[{r},{g},{b}]&brightness={brightness}', verify=False)
 
-    asyncio.get_event_loop().run_until_complete(start_server(robot_callback))
+    def robot_connected():
+        # dark until the first waypoint, e.g. while a resumed program approaches it,
+        # the indices are the ones of the whole file, also of resumed programs and windows
+        print(' [✓] Robot program connected, LEDs off')
+        session.get(f'http://{esp32_ip_address}/leds?rgb=[0,0,0]&brightness=0', verify=False)
+
+    asyncio.get_event_loop().run_until_complete(start_server(robot_callback, on_connect=robot_connected))
     # python lightbrush\lightbrush_proxy\proxy.py --ip 10.0.0.20 C:\Users\rustr\workspace\teaching\workshop_sjsu\src\workshop_sjsu\data\current_file.txt
     # put in browser http://10.0.0.20/leds?rgb=[0,0,255]&brightness=200 to do it "by hand"
@@ -2,6 +2,8 @@ import os
 
 HERE = os.path.dirname(__file__)
 DATA = os.path.join(HERE, "data")
+# the setup, planning and reachability caches, outside of the package
+CACHE = os.path.join(os.path.expanduser("~"), ".workshop_sjsu")
 
 WEB = os.path.join(HERE, "..", "..", "web")
 WEB = os.path.abspath(WEB)
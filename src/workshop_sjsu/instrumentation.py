@@ -0,0 +1,139 @@
+import io
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        calls, seconds = self.instrumentation.stages.get(self.name, (0, 0.))
+        self.instrumentation.stages[self.name] = (calls + 1, seconds + time.time() - self.t0)
+
+
+class Instrumentation(object):
+    """Wall times per stage, counters and failures by reason of a planning run.
+
+    A disabled instance is a no-op, so that the planning code can always
+    call it, see :data:`DISABLED`.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+
+    Examples
+    --------
+
+    >>> instrumentation = Instrumentation()
+    >>> with instrumentation.stage('smooth'):
+    ...     instrumentation.count('ik.calls', 3)
+    ...     instrumentation.fail('no_solution')
+    >>> report = instrumentation.report()
+    >>> report['counters'], report['failures']
+    ({'ik.calls': 3}, {'no_solution': 1})
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = {}
+        self.failures = {}
+        self.histograms = {}
+
+    def stage(self, name):
+        """Returns a context manager that adds its wall time to the stage ``name``."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def fail(self, reason, n=1):
+        if self.enabled:
+            self.failures[reason] = self.failures.get(reason, 0) + n
+
+    def observe(self, name, value):
+        """Counts how often ``value`` occurs for ``name``, e.g. the number of solutions per call."""
+        if self.enabled:
+            histogram = self.histograms.setdefault(name, {})
+            histogram[value] = histogram.get(value, 0) + 1
+
+    def report(self):
+        """Returns the stages, counters, failures and histograms as a dict."""
+        return {'stages': dict((name, {'calls': calls, 'seconds': seconds})
+                               for name, (calls, seconds) in self.stages.items()),
+                'counters': dict(self.counters),
+                'failures': dict(self.failures),
+                'histograms': dict((name, dict((str(value), count) for value, count in sorted(histogram.items())))
+                                   for name, histogram in self.histograms.items())}
+
+    def save(self, filepath):
+        """Writes the :meth:`report` as JSON."""
+        with io.open(filepath, 'w') as fp:
+            fp.write(json.dumps(self.report(), indent=2, sort_keys=True))
+
+    def summary(self):
+        """Returns the stages by time and the counters as text."""
+        lines = []
+        for name, (calls, seconds) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append("%-45s %8.3f s  (%i calls)" % (name, seconds, calls))
+        for name, value in sorted(self.counters.items()):
+            lines.append("%-45s %8i" % (name, value))
+        for reason, value in sorted(self.failures.items()):
+            lines.append("%-45s %8i" % ("failed: " + reason, value))
+        return "\n".join(lines)
+
+    @contextmanager
+    def profile(self, filepath=None):
+        """Runs the block with ``cProfile`` if enabled and ``filepath`` is given,
+        and dumps the stats there, to be read with ``pstats``."""
+        if not self.enabled or not filepath:
+            yield
+            return
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(filepath)
+
+
+DISABLED = Instrumentation(enabled=False)
+"""The no-op instrumentation used when none is given."""
+
+
+def timed(name):
+    """Decorates a method to add its wall time to the stage ``name`` of
+    the ``instrumentation`` attribute of its instance."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrumentation.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
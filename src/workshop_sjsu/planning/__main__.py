@@ -0,0 +1,5 @@
+import sys
+
+from workshop_sjsu.planning.cli import main
+
+sys.exit(main())
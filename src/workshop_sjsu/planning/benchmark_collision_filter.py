@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+from compas.robots import Configuration
+from compas_fab.backends import BackendError
+from compas_fab.backends.pybullet import LOG
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(path)
+
+from workshop_sjsu.planning.setup import Client
+from workshop_sjsu.planning.setup import sjsu_setup
+from workshop_sjsu.planning.setup import sjsu_collision_filter
+
+LOG.setLevel(logging.ERROR)
+
+
+def random_joint_values(count, seed=0):
+    """Returns ``count`` random joint values around the drawing pose."""
+    rng = np.random.RandomState(seed)
+    home = np.array([0., -np.pi / 2, np.pi / 2, -np.pi / 2, -np.pi / 2, 0.])
+    return home + rng.uniform(-np.pi / 2, np.pi / 2, (count, 6))
+
+
+def compare(joint_values, batch=8):
+    """Checks every configuration fully and pruned by the capsule filter,
+    which classifies ``batch`` configurations at a time, like the 8
+    solutions of an inverse kinematics call.
+
+    Returns
+    -------
+    dict
+        The mean ``full`` and ``filtered`` time in s per check, the
+        ``classify`` time of the filter included in ``filtered``, the
+        ``disagreements`` of the verdicts, which must be 0, the number of
+        ``collisions`` and the filter's ``stats``.
+    """
+    with Client(connection_type='direct') as client:
+        robot, scene = sjsu_setup(client)
+        collision_filter = sjsu_collision_filter(robot)
+        names = robot.get_configurable_joint_names()
+        configurations = [Configuration.from_revolute_values(values, joint_names=names)
+                          for values in joint_values.tolist()]
+
+        t0 = time.time()
+        full = []
+        for configuration in configurations:
+            try:
+                client.check_collisions(robot, configuration)
+                full.append(False)
+            except BackendError:
+                full.append(True)
+        t1 = time.time()
+        classified = [collision_filter.classify(joint_values[i:i + batch]) for i in range(0, len(joint_values), batch)]
+        objects_free = np.concatenate([objects for objects, pairs in classified])
+        pairs_free = np.concatenate([pairs for objects, pairs in classified])
+        t2 = time.time()
+        filtered = []
+        for configuration, objects, pairs in zip(configurations, objects_free, pairs_free):
+            link_pairs = [pair for pair, free in zip(collision_filter.link_pairs, pairs) if not free]
+            try:
+                client.check_collisions_filtered(robot, configuration, check_objects=not objects, link_pairs=link_pairs)
+                filtered.append(False)
+            except BackendError:
+                filtered.append(True)
+        t3 = time.time()
+
+    count = len(configurations)
+    return {'full': (t1 - t0) / count,
+            'filtered': (t3 - t1) / count,
+            'classify': (t2 - t1) / count,
+            'disagreements': int(np.sum(np.array(full) != np.array(filtered))),
+            'collisions': int(np.sum(full)),
+            'stats': collision_filter.stats}
+
+
+if __name__ == "__main__":
+
+    joint_values = random_joint_values(2000)
+    for batch in (8, 2000):
+        r = compare(joint_values, batch)
+        stats = r['stats']
+        print("batches of %i" % batch)
+        print("  full check:     %.3f ms per configuration" % (r['full'] * 1e3))
+        print("  filtered check: %.3f ms per configuration (%.2fx), %.3f ms of it classifying" % (
+            r['filtered'] * 1e3, r['full'] / r['filtered'], r['classify'] * 1e3))
+        print("  %i of %i object checks and %i of %i link pair checks avoided" % (
+            stats['object_checks_avoided'], stats['checked'], stats['link_pair_checks_avoided'], stats['link_pair_checks']))
+        print("  %i collisions, %i disagreements" % (r['collisions'], r['disagreements']))
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import logging
+import tempfile
+
+import numpy as np
+from compas.robots import Configuration
+from compas_fab.backends import CollisionError
+from compas_fab.backends.pybullet import LOG
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(path)
+
+from workshop_sjsu.planning.setup import Client
+from workshop_sjsu.planning.setup import sjsu_setup
+from workshop_sjsu.planning.collision_geometry import CollisionGeometry
+
+LOG.setLevel(logging.ERROR)
+
+
+def random_joint_values(count, seed=0):
+    """Returns ``count`` random joint values around the drawing pose, where
+    the tool comes close to the camera and the robot to itself."""
+    rng = np.random.RandomState(seed)
+    home = np.array([0., -np.pi / 2, np.pi / 2, -np.pi / 2, -np.pi / 2, 0.])
+    return (home + rng.uniform(-np.pi / 2, np.pi / 2, (count, 6))).tolist()
+
+
+def in_collision(client, robot, joint_values):
+    """Returns for every joint values whether the robot collides."""
+    names = robot.get_configurable_joint_names()
+    collisions = []
+    for values in joint_values:
+        try:
+            client.check_collisions(robot, Configuration.from_revolute_values(values, joint_names=names))
+            collisions.append(False)
+        except CollisionError:
+            collisions.append(True)
+    return collisions
+
+
+def time_checks(joint_values, geometry=None):
+    """Returns the mean time in s per collision check, with the full or the
+    simplified geometry."""
+    with Client(connection_type='direct') as client:
+        robot, scene = sjsu_setup(client, geometry=geometry)
+        t0 = time.time()
+        in_collision(client, robot, joint_values)
+        return (time.time() - t0) / len(joint_values)
+
+
+def validate(geometry, joint_values):
+    """Compares the collision checks with the simplified geometry to the ones
+    with the full meshes.
+
+    Returns
+    -------
+    dict
+        ``agree``, ``false_negatives``, configurations that collide only with
+        the full meshes, which must be 0 for ``method="hull"``, and
+        ``false_positives``, configurations that collide only with the
+        simplified geometry.
+    """
+    with Client(connection_type='direct') as client:
+        robot, scene = sjsu_setup(client)
+        full = np.array(in_collision(client, robot, joint_values))
+    with Client(connection_type='direct') as client:
+        robot, scene = sjsu_setup(client, geometry=geometry)
+        simplified = np.array(in_collision(client, robot, joint_values))
+    return {'agree': int(np.sum(full == simplified)),
+            'false_negatives': int(np.sum(full & ~simplified)),
+            'false_positives': int(np.sum(~full & simplified)),
+            'collisions': int(np.sum(full))}
+
+
+if __name__ == "__main__":
+
+    joint_values = random_joint_values(2000)
+    if len(sys.argv) > 1:
+        # validate with the configurations of an execution file too
+        from workshop_sjsu.ur.execution_file import ExecutionFile
+        joint_values += np.array(ExecutionFile(sys.argv[1]).configurations).tolist()
+
+    directory = tempfile.mkdtemp()
+    full = time_checks(joint_values)
+    print("full meshes:        %.3f ms per check" % (full * 1e3))
+    for method, inflation in (('hull', 0.), ('hull', 0.005), ('vhacd', 0.)):
+        geometry = CollisionGeometry(directory, inflation=inflation, method=method)
+        t0 = time.time()
+        geometry.robot_urdf()
+        geometry.camera()
+        simplification = time.time() - t0
+        simplified = time_checks(joint_values, geometry)
+        r = validate(geometry, joint_values)
+        print("%-5s %.3f m:       %.3f ms per check (%.1fx), simplified in %.1f s" % (
+            method, inflation, simplified * 1e3, full / simplified, simplification))
+        print("  %i of %i agree, %i collisions, %i false negatives, %i false positives" % (
+            r['agree'], len(joint_values), r['collisions'], r['false_negatives'], r['false_positives']))
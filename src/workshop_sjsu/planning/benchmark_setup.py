@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import logging
+
+from compas_fab.backends.pybullet import LOG
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(path)
+
+from workshop_sjsu.planning.setup import Client
+from workshop_sjsu.planning.setup import sjsu_setup
+from workshop_sjsu.planning.setup_cache import SetupCache
+
+LOG.setLevel(logging.ERROR)
+
+
+def time_setup(cache_filepath=None, repeat=5):
+    """Returns the best time of ``repeat`` runs of :func:`sjsu_setup`, with a
+    fresh :class:`SetupCache` per run if ``cache_filepath`` is given."""
+    times = []
+    for _ in range(repeat):
+        with Client(connection_type='direct') as client:
+            t0 = time.time()
+            cache = SetupCache(cache_filepath) if cache_filepath else None
+            sjsu_setup(client, cache=cache)
+            times.append(time.time() - t0)
+    return min(times)
+
+
+if __name__ == "__main__":
+
+    filepath = os.path.join(os.path.dirname(__file__), "setup_cache_benchmark.bin")
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+    cold = time_setup()
+    first = time_setup(filepath, repeat=1)  # writes the snapshot
+    warm = time_setup(filepath)
+    os.remove(filepath)
+
+    print("cold setup:        %.3f s" % cold)
+    print("snapshot creation: %.3f s" % first)
+    print("warm setup:        %.3f s (%.1fx)" % (warm, cold / warm))
@@ -0,0 +1,212 @@
+"""Plans drawings into execution files from the command line.
+
+Run it with ``python -m workshop_sjsu.planning``, e.g. for a queue of
+drawings on a headless server::
+
+    python -m workshop_sjsu.planning drawings/*.json --direct --workers 8 \\
+        --cache-dir cache --order --decimate 0.001 --format binary
+
+Every drawing is written next to its input as ``<name>_execution.json``, or
+``.sjsu`` for the binary format, unless ``--output`` or ``--output-dir`` is
+given. The exit code is :data:`EXIT_OK` if all drawings were planned,
+:data:`EXIT_FAILED` if one of them failed and :data:`EXIT_USAGE` for
+invalid arguments.
+"""
+import os
+import sys
+import logging
+import argparse
+import traceback
+
+import compas
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+EXTENSIONS = {'json': '.json', 'binary': '.sjsu'}
+
+
+def parser():
+    p = argparse.ArgumentParser(prog='python -m workshop_sjsu.planning',
+                                description='Plans light paintings into execution files for the UR5e.')
+    p.add_argument('inputs', nargs='+', metavar='input',
+                   help='drawing JSON file(s) with points3d, gradients and colors')
+    p.add_argument('-o', '--output', help='the execution file, only for a single input')
+    p.add_argument('--output-dir', help='the directory of the execution files, defaults to the one of the input')
+    p.add_argument('--format', choices=sorted(EXTENSIONS), default=None,
+                   help='the execution file format, defaults to the extension of --output or json')
+    p.add_argument('--direct', action='store_true', help='run PyBullet headless instead of with a GUI')
+    p.add_argument('--workers', type=int, default=None,
+                   help='check the paths in that many worker processes')
+    p.add_argument('--cache-dir', help='keep the setup, planning and reachability caches in this directory')
+    p.add_argument('--reachability-map', action='store_true',
+                   help='check the points in unreachable areas of a reachability map first, '
+                        'built once in --cache-dir')
+    p.add_argument('--convex-geometry', choices=('hull', 'vhacd'), default=None,
+                   help='check collisions with simplified convex meshes, cached in --cache-dir')
+    p.add_argument('--inflation', type=float, default=0., metavar='DISTANCE',
+                   help='grow the simplified convex meshes by this safety distance in m')
+    p.add_argument('--decimate', type=float, default=None, metavar='TOLERANCE',
+                   help='decimate the paths with this geodesic tolerance in m')
+    p.add_argument('--order', action='store_true', help='reorder the paths to shorten the transitions')
+    p.add_argument('--seeded', action='store_true', help='solve the transitions on the branch of the previous path')
+    p.add_argument('--stream', action='store_true',
+                   help='plan path by path with bounded memory, only for the binary format')
+    p.add_argument('--report', help='write the stage timings and counters as JSON to this file')
+    p.add_argument('--profile', help='write cProfile stats to this file')
+    p.add_argument('-q', '--quiet', action='store_true', help='only print errors')
+    return p
+
+
+def output_path(args, filepath):
+    """Returns the execution file path of an input drawing."""
+    if args.output:
+        return args.output
+    name, _ = os.path.splitext(os.path.basename(filepath))
+    directory = args.output_dir or os.path.dirname(filepath)
+    return os.path.join(directory, name + '_execution' + EXTENSIONS[args.format])
+
+
+def load_drawing(filepath):
+    """Returns the points3d, gradients and colors of a drawing file."""
+    data = compas.json_load(filepath)
+    missing = [key for key in ('points3d', 'gradients', 'colors') if key not in data]
+    if missing:
+        raise ValueError("%s has no %s" % (filepath, ", ".join(missing)))
+    return data['points3d'], data['gradients'], data['colors']
+
+
+def plan(session, args, filepath, reachability_map=None):
+    """Plans one drawing and writes its execution file, returns its path."""
+    from workshop_sjsu.planning import streaming
+    from workshop_sjsu.ur import execution_file
+
+    points3d, gradients, colors = load_drawing(filepath)
+    decimation = {'tolerance': args.decimate} if args.decimate is not None else None
+    output = output_path(args, filepath)
+    directory = os.path.dirname(output)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # written next to the output first, so that a failed run leaves no partial file behind
+    partial = output + '.partial'
+    try:
+        if args.stream:
+            with execution_file.ExecutionFileWriter(partial) as writer:
+                segments = session.stream(points3d, gradients, colors, reachability_map=reachability_map,
+                                          seeded=args.seeded, decimation=decimation)
+                for _ in streaming.write(segments, writer):
+                    pass
+        else:
+            data = session.prepare(points3d, gradients, colors, reachability_map=reachability_map,
+                                   workers=args.workers, seeded=args.seeded, order=args.order,
+                                   decimation=decimation)
+            if args.format == 'binary':
+                execution_file.save(partial, data)
+            else:
+                compas.json_dump(data, partial)
+        os.replace(partial, output)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return output
+
+
+def main(argv=None):
+    """Runs the command line interface, returns the exit code."""
+    p = parser()
+    try:
+        args = p.parse_args(argv)
+    except SystemExit as e:
+        return e.code
+
+    if args.format is None:
+        extension = os.path.splitext(args.output or '')[1]
+        args.format = 'binary' if extension == EXTENSIONS['binary'] else 'json'
+    if args.output and len(args.inputs) > 1:
+        p.print_usage(sys.stderr)
+        print("error: --output needs a single input, use --output-dir", file=sys.stderr)
+        return EXIT_USAGE
+    if args.stream and args.format != 'binary':
+        p.print_usage(sys.stderr)
+        print("error: --stream needs --format binary", file=sys.stderr)
+        return EXIT_USAGE
+    if args.stream and (args.order or args.workers):
+        p.print_usage(sys.stderr)
+        print("error: --stream plans the paths in order and in this process", file=sys.stderr)
+        return EXIT_USAGE
+    if args.reachability_map and not args.cache_dir:
+        p.print_usage(sys.stderr)
+        print("error: --reachability-map needs --cache-dir", file=sys.stderr)
+        return EXIT_USAGE
+    if args.inflation and not args.convex_geometry:
+        p.print_usage(sys.stderr)
+        print("error: --inflation needs --convex-geometry", file=sys.stderr)
+        return EXIT_USAGE
+    missing = [filepath for filepath in args.inputs if not os.path.isfile(filepath)]
+    if missing:
+        print("error: cannot find %s" % ", ".join(missing), file=sys.stderr)
+        return EXIT_USAGE
+
+    from compas_fab.backends.pybullet import LOG
+    from workshop_sjsu.instrumentation import Instrumentation
+    from workshop_sjsu.planning.session import PlanningSession
+    from workshop_sjsu.planning.setup_cache import SetupCache
+    from workshop_sjsu.planning.planning_cache import PlanningCache
+    from workshop_sjsu.planning.collision_geometry import CollisionGeometry
+
+    LOG.setLevel(logging.ERROR)
+    if args.quiet:
+        sys.stdout = open(os.devnull, 'w')
+
+    setup_cache = planning_cache = None
+    if args.cache_dir:
+        if not os.path.isdir(args.cache_dir):
+            os.makedirs(args.cache_dir)
+        setup_cache = SetupCache(os.path.join(args.cache_dir, 'setup_cache.bin'))
+        planning_cache = PlanningCache(os.path.join(args.cache_dir, 'planning_cache.json'))
+    geometry = None
+    if args.convex_geometry:
+        directory = os.path.join(args.cache_dir, 'collision_geometry') if args.cache_dir else None
+        geometry = CollisionGeometry(directory, inflation=args.inflation, method=args.convex_geometry)
+    instrumentation = Instrumentation(enabled=bool(args.report or args.profile))
+
+    failed = []
+    try:
+        with instrumentation.profile(args.profile), \
+                PlanningSession(connection_type='direct' if args.direct else 'gui', setup_cache=setup_cache,
+                                planning_cache=planning_cache, collision_geometry=geometry,
+                                instrumentation=instrumentation) as session:
+            reachability_map = session.reachability_map(args.cache_dir) if args.reachability_map else None
+            for filepath in args.inputs:
+                print("Planning %s" % filepath)
+                try:
+                    output = plan(session, args, filepath, reachability_map)
+                except Exception:
+                    failed.append(filepath)
+                    traceback.print_exc()
+                    print("error: planning %s failed" % filepath, file=sys.stderr)
+                    continue
+                print("Wrote %s" % output)
+                if planning_cache is not None:
+                    planning_cache.save()
+    except Exception:
+        traceback.print_exc()
+        print("error: the planning session failed", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if args.quiet:
+            sys.stdout.close()
+            sys.stdout = sys.__stdout__
+
+    if planning_cache is not None and not args.quiet:
+        print(planning_cache.report())
+    if args.report:
+        instrumentation.save(args.report)
+
+    if failed:
+        print("error: %i of %i drawings failed: %s" % (len(failed), len(args.inputs), ", ".join(failed)),
+              file=sys.stderr)
+        return EXIT_FAILED
+    return EXIT_OK
@@ -0,0 +1,240 @@
+import io
+import os
+import re
+import hashlib
+import numpy as np
+from scipy.spatial import ConvexHull
+from scipy.spatial import HalfspaceIntersection
+
+from compas.datastructures import Mesh
+
+from workshop_sjsu import DATA
+from workshop_sjsu import CACHE
+
+VERSION = 1
+
+URDF = os.path.join(DATA, "ur_e_description", "urdf", "ur5e_robot.urdf")
+CAMERA = os.path.join(DATA, "camera_in_position.json")
+PACKAGE = "package://ur_e_description/"
+
+
+def _support_subset(points, count):
+    """Returns the indices of up to ``count`` points that are extreme in
+    evenly spread directions."""
+    indices = []
+    n = count
+    while len(indices) < count and n <= 64 * count:
+        # a Fibonacci sphere of directions
+        k = np.arange(n) + 0.5
+        z = 1 - 2 * k / n
+        r = np.sqrt(1 - z * z)
+        phi = np.pi * (1 + 5 ** 0.5) * k
+        directions = np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=1)
+        indices = np.unique(np.argmax(points @ directions.T, axis=0))
+        n *= 2
+    return indices[:count]
+
+
+def simplify_hull(points, max_vertices=48, inflation=0.):
+    """Returns a convex polytope that contains the convex hull of the
+    points, grown by ``inflation``.
+
+    The hull of ``max_vertices`` extreme points is computed, then each of
+    its face planes is moved outwards until all points are inside, plus
+    the inflation, and the polytope of these planes is built again. It has
+    a few times more vertices than ``max_vertices``, but far fewer than
+    the hull of a detailed mesh.
+
+    Parameters
+    ----------
+    points : array_like
+        (N, 3) points.
+    max_vertices : int, optional
+    inflation : float, optional
+        The safety distance in m every face is moved outwards.
+
+    Returns
+    -------
+    tuple of :class:`numpy.ndarray`
+        The (V, 3) vertices and the (F, 3) outward oriented triangles.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    hull = ConvexHull(points)
+    vertices = points[hull.vertices]
+    if len(vertices) > max_vertices:
+        vertices = vertices[_support_subset(vertices, max_vertices)]
+    elif inflation <= 0:
+        return _triangles(vertices)
+
+    # the planes n.x + d <= 0 of the hull, coplanar triangles merged
+    equations = np.unique(np.round(ConvexHull(vertices).equations, 9), axis=0)
+    excess = np.max(points[hull.vertices] @ equations[:, :3].T + equations[:, 3], axis=0)
+    equations[:, 3] -= np.maximum(excess, 0) + inflation + 1e-9
+    interior = vertices.mean(axis=0)
+    polytope = HalfspaceIntersection(equations, interior)
+    return _triangles(polytope.intersections)
+
+
+def _triangles(points):
+    hull = ConvexHull(points)
+    vertices = points[hull.vertices]
+    index = np.full(len(points), -1)
+    index[hull.vertices] = np.arange(len(hull.vertices))
+    faces = index[hull.simplices]
+    # orient the triangles along the outward normals of the hull
+    a, b, c = (vertices[faces[:, i]] for i in range(3))
+    flip = np.einsum('ij,ij->i', np.cross(b - a, c - a), hull.equations[:, :3]) < 0
+    faces[flip] = faces[flip][:, ::-1]
+    return vertices, faces
+
+
+def write_obj(filepath, parts):
+    """Writes a list of ``(vertices, faces)`` as the objects of an OBJ file."""
+    offset = 1
+    with io.open(filepath, 'w') as fp:
+        for i, (vertices, faces) in enumerate(parts):
+            fp.write(u"o part_%i\n" % i)
+            for v in vertices:
+                fp.write(u"v %.9f %.9f %.9f\n" % tuple(v))
+            for f in faces:
+                fp.write(u"f %i %i %i\n" % tuple(f + offset))
+            offset += len(vertices)
+
+
+def read_obj_parts(filepath):
+    """Returns the vertices of every object of an OBJ file."""
+    vertices, parts = [], []
+    with io.open(filepath, 'r') as fp:
+        for line in fp:
+            if line.startswith('o ') or (line.startswith('f ') and not parts):
+                parts.append(set())
+            if line.startswith('v '):
+                vertices.append([float(v) for v in line.split()[1:4]])
+            elif line.startswith('f '):
+                parts[-1].update(int(v.split('/')[0]) - 1 for v in line.split()[1:])
+    vertices = np.array(vertices)
+    return [vertices[sorted(part)] for part in parts if len(part) >= 4]
+
+
+def read_mesh(filepath):
+    """Reads a mesh file, JSON, STL or OBJ."""
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.json':
+        return Mesh.from_json(filepath)
+    if extension == '.stl':
+        return Mesh.from_stl(filepath)
+    return Mesh.from_obj(filepath)
+
+
+class CollisionGeometry(object):
+    """Simplified convex collision geometry of the robot links and the
+    camera, cached on disk.
+
+    Every mesh is replaced by a simplified convex polytope that contains
+    its convex hull, the shape PyBullet checks full meshes with, grown by
+    ``inflation``, see :func:`simplify_hull`. With
+    ``method="vhacd"``, the mesh is first decomposed into convex parts by
+    ``pybullet.vhacd`` and every part is simplified; this follows concave
+    meshes more closely, but the parts only approximate the mesh, see
+    :func:`workshop_sjsu.planning.benchmark_collision_geometry.validate`.
+
+    The files are named by a hash of the source and the parameters, so
+    changed meshes or parameters are simplified again.
+
+    Parameters
+    ----------
+    directory : str, optional
+        The cache directory, defaults to ``collision_geometry`` in
+        :data:`workshop_sjsu.CACHE`.
+    inflation : float, optional
+        The safety distance in m.
+    max_vertices : int, optional
+    method : str, optional
+        ``"hull"`` or ``"vhacd"``.
+
+    Examples
+    --------
+
+    >>> geometry = CollisionGeometry(inflation=0.005)           # doctest: +SKIP
+    >>> robot, scene = sjsu_setup(client, geometry=geometry)    # doctest: +SKIP
+    """
+
+    def __init__(self, directory=None, inflation=0., max_vertices=48, method='hull'):
+        if method not in ('hull', 'vhacd'):
+            raise ValueError("Unknown method: %s" % method)
+        self.directory = directory or os.path.join(CACHE, "collision_geometry")
+        self.inflation = inflation
+        self.max_vertices = max_vertices
+        self.method = method
+        self.key = hashlib.sha1(repr((VERSION, inflation, max_vertices, method)).encode('utf-8')).hexdigest()
+
+    def _path(self, source, name, extension):
+        h = hashlib.sha1(self.key.encode('utf-8'))
+        with io.open(source, 'rb') as fp:
+            h.update(fp.read())
+        return os.path.join(self.directory, "%s_%s%s" % (name, h.hexdigest()[:16], extension))
+
+    def simplified(self, source, name=None):
+        """Returns the OBJ file of the simplified mesh file ``source``,
+        created on first use."""
+        name = name or os.path.splitext(os.path.basename(source))[0]
+        filepath = self._path(source, name, '.obj')
+        if os.path.exists(filepath):
+            return filepath
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        mesh = read_mesh(source)
+        points = np.array(mesh.vertices_attributes('xyz'))
+        parts = self._decompose(mesh, filepath) if self.method == 'vhacd' else [points]
+        # written next to the target first, so that concurrent setups never read half a file
+        partial = '%s.%i.partial' % (filepath, os.getpid())
+        write_obj(partial, [simplify_hull(part, self.max_vertices, self.inflation) for part in parts])
+        os.replace(partial, filepath)
+        return filepath
+
+    def _decompose(self, mesh, filepath):
+        import pybullet
+        from compas_fab.backends.pybullet.utils import redirect_stdout
+        paths = ['%s.%i.%s' % (filepath, os.getpid(), extension) for extension in ('source.obj', 'vhacd.obj', 'log')]
+        mesh.to_obj(paths[0])
+        try:
+            with redirect_stdout():
+                pybullet.vhacd(paths[0], paths[1], paths[2])
+            parts = read_obj_parts(paths[1])
+        finally:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        return parts or [np.array(mesh.vertices_attributes('xyz'))]
+
+    def camera(self):
+        """Returns the OBJ file of the simplified camera."""
+        return self.simplified(CAMERA, 'camera')
+
+    def robot_urdf(self, urdf_filename=URDF):
+        """Returns a copy of the URDF file whose collision meshes are the
+        simplified ones, and whose other meshes are referenced by absolute paths."""
+        with io.open(urdf_filename, 'r') as fp:
+            urdf = fp.read()
+        package = os.path.join(os.path.dirname(os.path.dirname(urdf_filename)), '')
+
+        def collision(match):
+            block = match.group(0)
+            for filename in re.findall(r'filename="([^"]+)"', block):
+                source = filename.replace(PACKAGE, package) if filename.startswith(PACKAGE) else filename
+                block = block.replace(filename, self.simplified(source))
+            return block
+
+        urdf = re.sub(r'<collision>.*?</collision>', collision, urdf, flags=re.S)
+        urdf = urdf.replace(PACKAGE, package)
+
+        filepath = self._path(urdf_filename, os.path.splitext(os.path.basename(urdf_filename))[0], '.urdf')
+        # the key of the URDF also covers its simplified meshes
+        filepath = filepath[:-len('.urdf')] + '_' + hashlib.sha1(urdf.encode('utf-8')).hexdigest()[:8] + '.urdf'
+        if not os.path.exists(filepath):
+            partial = '%s.%i.partial' % (filepath, os.getpid())
+            with io.open(partial, 'w') as fp:
+                fp.write(urdf)
+            os.replace(partial, filepath)
+        return filepath
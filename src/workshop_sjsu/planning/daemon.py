@@ -0,0 +1,460 @@
+"""A long-running planning service with warm workers.
+
+Every worker process holds a :class:`PlanningSession` with a ``direct``
+PyBullet client, the robot, tool and camera loaded once, and its own
+in-memory :class:`PlanningCache`. Jobs are submitted over HTTP on
+localhost::
+
+    python -m workshop_sjsu.planning.daemon --workers 4 --port 8765
+
+======================  ======  ============================================
+path                    method
+======================  ======  ============================================
+``/jobs``               POST    submit ``{"drawing": {...}}`` or ``{"path": "..."}``
+                                with optional ``"name"`` and ``"options"``
+``/jobs/<id>``          GET     the status, ``queued``, ``running``, ``done``
+                                or ``failed``, and the latencies
+``/jobs/<id>/result``   GET     the execution file
+``/status``             GET     the queue depth, workers and job latencies
+======================  ======  ============================================
+
+The options are the ones of :meth:`PlanningSession.prepare`, ``order``,
+``seeded`` and ``decimation``, and the ``format`` of the execution file,
+``json`` or ``binary``. Jobs with the same ``name``, e.g. revisions of a
+drawing, go to the worker that planned it last, so that its planning
+cache re-uses the unchanged paths.
+
+Finished jobs and their execution files are removed after ``expire``
+seconds. A worker that dies is restarted, the job it was running fails
+and its queued jobs are sent to the new worker.
+"""
+import io
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import tempfile
+import threading
+import traceback
+import multiprocessing
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer
+    from urllib.request import Request
+    from urllib.request import urlopen
+except ImportError:
+    pass
+
+import compas
+
+DEFAULT_PORT = 8765
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _work(index, tasks, results, taken, cache_dir, cache_size=None):
+    """The main function of a worker process, it keeps the id of the job it
+    has taken in the shared value ``taken``."""
+    from compas_fab.backends.pybullet import LOG
+    from workshop_sjsu.planning.session import PlanningSession
+    from workshop_sjsu.planning.setup_cache import SetupCache
+    from workshop_sjsu.planning.planning_cache import PlanningCache
+    from workshop_sjsu.ur import execution_file
+
+    LOG.setLevel(logging.ERROR)
+    setup_cache = planning_cache_path = None
+    if cache_dir:
+        setup_cache = SetupCache(os.path.join(cache_dir, 'setup_cache.bin'))
+        planning_cache_path = os.path.join(cache_dir, 'planning_cache.json')
+    # the file is only read, every worker keeps its own entries in memory
+    planning_cache = PlanningCache(planning_cache_path, maxsize=cache_size)
+    planning_cache.filepath = None
+
+    with PlanningSession(connection_type='direct', setup_cache=setup_cache, planning_cache=planning_cache) as session:
+        results.put(('ready', index, None))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            job_id, drawing, options, output = task
+            taken.value = int(job_id)
+            results.put((RUNNING, job_id, time.time()))
+            try:
+                data = session.prepare(drawing['points3d'], drawing['gradients'], drawing['colors'],
+                                       seeded=options.get('seeded', False), order=options.get('order', False),
+                                       decimation=options.get('decimation'))
+                if options.get('format') == 'binary':
+                    execution_file.save(output, data)
+                else:
+                    compas.json_dump(data, output)
+                results.put((DONE, job_id, time.time()))
+            except Exception:
+                results.put((FAILED, job_id, traceback.format_exc()))
+            taken.value = -1
+
+
+class PlanningDaemon(object):
+    """Runs planning jobs on warm worker processes.
+
+    Parameters
+    ----------
+    workers : int, optional
+        The number of worker processes.
+    directory : str, optional
+        The directory of the execution files, defaults to a temporary one.
+    cache_dir : str, optional
+        The setup cache is kept here, and the planning cache is read from here.
+    history : int, optional
+        The number of finished jobs the latencies are computed of.
+    cache_size : int, optional
+        The maximum number of paths, and of transitions, in the planning
+        cache of every worker.
+    expire : float, optional
+        The seconds after which a finished job and its execution file are
+        removed.
+    interval : float, optional
+        The seconds between the checks of the workers and of the expired jobs.
+    """
+
+    def __init__(self, workers=2, directory=None, cache_dir=None, history=100,
+                 cache_size=10000, expire=3600., interval=1.):
+        self.num_workers = workers
+        self.directory = directory or tempfile.mkdtemp(prefix='sjsu_planning_')
+        self.cache_dir = cache_dir
+        self.history = history
+        self.cache_size = cache_size
+        self.expire = expire
+        self.interval = interval
+        self.jobs = {}
+        # the queued and running tasks, to send them to a restarted worker
+        self.tasks = {}
+        self.restarts = 0
+        self.stopping = False
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.processes = []
+        self.queues = []
+        self.taken = []
+        self.pending = []
+        self.affinity = {}
+        self.results = None
+        self._next_id = 0
+        self._collector = None
+
+    def start(self, timeout=120):
+        """Starts the workers and waits until they are set up."""
+        for directory in (self.directory, self.cache_dir):
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.results = multiprocessing.Queue()
+        self.stopping = False
+        for index in range(self.num_workers):
+            self.queues.append(None)
+            self.processes.append(None)
+            self.taken.append(None)
+            self.pending.append(0)
+            process = self._start_worker(index)
+            # one at a time, the first one may write the setup cache
+            t0 = time.time()
+            while True:
+                try:
+                    self.results.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    if not process.is_alive() or time.time() - t0 > timeout:
+                        self.stop()
+                        raise RuntimeError("Planning worker %i failed to start" % index)
+        self._collector = threading.Thread(target=self._collect)
+        self._collector.daemon = True
+        self._collector.start()
+
+    def _start_worker(self, index):
+        tasks = multiprocessing.Queue()
+        taken = multiprocessing.Value('l', -1)
+        process = multiprocessing.Process(target=_work, args=(index, tasks, self.results, taken, self.cache_dir,
+                                                              self.cache_size))
+        process.daemon = True
+        process.start()
+        self.queues[index] = tasks
+        self.taken[index] = taken
+        self.processes[index] = process
+        return process
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+        for tasks in self.queues:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(10)
+            if process.is_alive():
+                process.terminate()
+        if self.results is not None:
+            self.results.put(None)
+        self.processes, self.queues, self.taken, self.pending = [], [], [], []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, drawing, options=None, name=None):
+        """Queues a drawing and returns the job id.
+
+        Parameters
+        ----------
+        drawing : dict
+            The ``points3d``, ``gradients`` and ``colors`` of the drawing.
+        options : dict, optional
+            ``order``, ``seeded``, ``decimation`` and ``format``.
+        name : str, optional
+            Jobs of the same name are sent to the same worker if it is not
+            busier than the others.
+        """
+        options = dict(options or {})
+        drawing = dict((key, drawing[key]) for key in ('points3d', 'gradients', 'colors'))
+        extension = '.sjsu' if options.get('format') == 'binary' else '.json'
+        with self.lock:
+            job_id = str(self._next_id)
+            self._next_id += 1
+            worker = self.pending.index(min(self.pending))
+            if name in self.affinity and self.pending[self.affinity[name]] <= self.pending[worker]:
+                worker = self.affinity[name]
+            if name is not None:
+                self.affinity[name] = worker
+            self.pending[worker] += 1
+            output = os.path.join(self.directory, job_id + '_execution' + extension)
+            self.jobs[job_id] = {'id': job_id, 'name': name, 'status': QUEUED, 'worker': worker,
+                                 'format': options.get('format', 'json'), 'output': output,
+                                 'submitted': time.time(), 'started': None, 'finished': None, 'error': None}
+            self.tasks[job_id] = (job_id, drawing, options, output)
+            self.queues[worker].put(self.tasks[job_id])
+        return job_id
+
+    def _collect(self):
+        while True:
+            try:
+                message = self.results.get(timeout=self.interval)
+            except queue.Empty:
+                self._check()
+                continue
+            if message is None:
+                return
+            status, job_id, value = message
+            with self.lock:
+                job = self.jobs.get(job_id)
+                # restarted workers report that they are ready, failed jobs of dead workers may still report
+                if status == 'ready' or job is None or job['status'] in (DONE, FAILED):
+                    continue
+                if status == RUNNING:
+                    job['status'] = status
+                    job['started'] = value
+                    continue
+                self._finish(job, status, value if status == FAILED else None)
+
+    def _finish(self, job, status, error=None):
+        job['status'] = status
+        job['finished'] = time.time()
+        job['error'] = error
+        self.tasks.pop(job['id'], None)
+        self.pending[job['worker']] -= 1
+        self.latencies.append(job['finished'] - job['submitted'])
+        del self.latencies[:-self.history]
+
+    def _check(self):
+        """Restarts the dead workers and removes the expired jobs."""
+        with self.lock:
+            if self.stopping:
+                return
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                self.restarts += 1
+                # the worker may have taken a job before its running message is collected
+                taken = str(self.taken[index].value)
+                self._start_worker(index)
+                for job in sorted(self.jobs.values(), key=lambda job: int(job['id'])):
+                    if job['worker'] != index:
+                        continue
+                    if job['status'] == RUNNING or (job['status'] == QUEUED and job['id'] == taken):
+                        self._finish(job, FAILED, "Planning worker %i died with exit code %s" % (
+                            index, process.exitcode))
+                    elif job['status'] == QUEUED:
+                        self.queues[index].put(self.tasks[job['id']])
+
+            now = time.time()
+            for job in list(self.jobs.values()):
+                if job['finished'] and now - job['finished'] > self.expire:
+                    del self.jobs[job['id']]
+                    if os.path.exists(job['output']):
+                        os.remove(job['output'])
+
+    def job(self, job_id):
+        """Returns the status of a job with its queue wait and run time, or ``None``."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        now = time.time()
+        job['wait'] = (job['started'] or now) - job['submitted']
+        job['runtime'] = (job['finished'] or now) - job['started'] if job['started'] else None
+        del job['output']
+        return job
+
+    def result(self, job_id):
+        """Returns the execution file path of a finished job, or ``None``."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job['output'] if job and job['status'] == DONE else None
+
+    def wait(self, job_id, timeout=None, interval=0.01):
+        """Blocks until a job is done or failed, returns its status, or
+        ``None`` if the job is unknown or expired."""
+        t0 = time.time()
+        while True:
+            job = self.job(job_id)
+            if job is None or job['status'] in (DONE, FAILED) or (timeout is not None and time.time() - t0 > timeout):
+                return job
+            time.sleep(interval)
+
+    def status(self):
+        """Returns the queue depth, the busy workers and the latencies of the recent jobs."""
+        with self.lock:
+            counts = dict((status, 0) for status in (QUEUED, RUNNING, DONE, FAILED))
+            for job in self.jobs.values():
+                counts[job['status']] += 1
+            latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        return {'workers': len(self.processes),
+                'alive': sum(1 for process in self.processes if process.is_alive()),
+                'restarts': self.restarts,
+                'queue_depth': counts[QUEUED],
+                'running': counts[RUNNING],
+                'done': counts[DONE],
+                'failed': counts[FAILED],
+                'latency': {'mean': sum(latencies) / len(latencies) if latencies else None,
+                            'p50': percentile(0.5),
+                            'p90': percentile(0.9),
+                            'max': latencies[-1] if latencies else None}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        daemon = self.server.planning
+        parts = self.path.strip('/').split('/')
+        if parts == ['status']:
+            return self._send(200, daemon.status())
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = daemon.job(parts[1])
+            if job is None:
+                return self._send(404, {'error': 'unknown job %s' % parts[1]})
+            if len(parts) == 2:
+                return self._send(200, job)
+            if parts[2] == 'result':
+                output = daemon.result(parts[1])
+                if output is None:
+                    return self._send(409, {'error': 'job %s is %s' % (parts[1], job['status'])})
+                with io.open(output, 'rb') as fp:
+                    content_type = 'application/octet-stream' if job['format'] == 'binary' else 'application/json'
+                    return self._send(200, fp.read(), content_type)
+        self._send(404, {'error': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        if self.path.strip('/') != 'jobs':
+            return self._send(404, {'error': 'unknown path %s' % self.path})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            drawing = request.get('drawing')
+            if drawing is None:
+                drawing = compas.json_load(request['path'])
+            job_id = self.server.planning.submit(drawing, request.get('options'), request.get('name'))
+        except (ValueError, KeyError, TypeError, IOError) as e:
+            return self._send(400, {'error': '%s: %s' % (type(e).__name__, e)})
+        self._send(202, {'id': job_id})
+
+
+def serve(daemon, host='127.0.0.1', port=DEFAULT_PORT):
+    """Serves the daemon's jobs over HTTP until interrupted."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.planning = daemon
+    server.daemon_threads = True
+    print("Planning daemon with %i workers on http://%s:%i" % (daemon.num_workers, host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def submit(drawing, options=None, name=None, url='http://127.0.0.1:%i' % DEFAULT_PORT, timeout=None):
+    """Submits a drawing to a running daemon, waits for it and returns the
+    execution file's content.
+
+    Parameters
+    ----------
+    drawing : dict or str
+        The drawing, or the path of a drawing file on this machine.
+    """
+    request = {'options': options or {}, 'name': name}
+    request['path' if isinstance(drawing, str) else 'drawing'] = drawing
+    body = json.dumps(request).encode('utf-8')
+    job = json.loads(urlopen(Request(url + '/jobs', body, {'Content-Type': 'application/json'})).read())
+    t0 = time.time()
+    while True:
+        status = json.loads(urlopen('%s/jobs/%s' % (url, job['id'])).read())
+        if status['status'] == FAILED:
+            raise RuntimeError(status['error'])
+        if status['status'] == DONE:
+            return urlopen('%s/jobs/%s/result' % (url, job['id'])).read()
+        if timeout is not None and time.time() - t0 > timeout:
+            raise RuntimeError("job %s timed out" % job['id'])
+        time.sleep(0.02)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog='python -m workshop_sjsu.planning.daemon',
+                                description='Serves planning jobs on warm workers on localhost.')
+    p.add_argument('--workers', type=int, default=2)
+    p.add_argument('--port', type=int, default=DEFAULT_PORT)
+    p.add_argument('--directory', help='the directory of the execution files')
+    p.add_argument('--cache-dir', help='the directory of the setup and planning caches')
+    p.add_argument('--cache-size', type=int, default=10000,
+                   help='the maximum number of paths, and of transitions, in the cache of a worker')
+    p.add_argument('--expire', type=float, default=3600.,
+                   help='the seconds after which finished jobs and their execution files are removed')
+    args = p.parse_args(argv)
+    with PlanningDaemon(args.workers, args.directory, args.cache_dir,
+                        cache_size=args.cache_size, expire=args.expire) as daemon:
+        serve(daemon, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
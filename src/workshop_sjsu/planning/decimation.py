@@ -0,0 +1,132 @@
+import numpy as np
+
+
+def _geodesic_deviation(points, a, b):
+    """Returns the geodesic distances of points on a sphere around the origin
+    to the great-circle arc from ``a`` to ``b``."""
+    radius = np.linalg.norm(points, axis=1)
+    u = points / radius[:, None]
+    ua = a / np.linalg.norm(a)
+    ub = b / np.linalg.norm(b)
+
+    def angle(v, w):
+        return np.arccos(np.clip(np.dot(v, w), -1., 1.))
+
+    to_ends = np.minimum(angle(u, ua), angle(u, ub))
+    normal = np.cross(ua, ub)
+    length = np.linalg.norm(normal)
+    if length < 1e-12:
+        return radius * to_ends
+    normal /= length
+    # the projection lies on the arc if it is between a and b
+    on_arc = (np.dot(np.cross(ua, u), normal) >= 0) & (np.dot(np.cross(u, ub), normal) >= 0)
+    to_circle = np.arcsin(np.clip(np.abs(np.dot(u, normal)), 0., 1.))
+    return radius * np.where(on_arc, to_circle, to_ends)
+
+
+def decimate_path(points, colors=None, gradients=None, tolerance=0.001, color_tolerance=0.02, gradient_tolerance=0.02):
+    """Returns the indices of the points to keep of a path on a sphere.
+
+    A Ramer-Douglas-Peucker simplification in geodesic distance: a point is
+    only dropped if it is within ``tolerance`` of the great-circle arc
+    between the kept points around it, and its color and gradient are
+    within their tolerances of the values interpolated along that arc.
+
+    Parameters
+    ----------
+    points : array_like
+        (N, 3) points, relative to the sphere center.
+    colors : array_like, optional
+        (N, 3) colors.
+    gradients : array_like, optional
+        (N,) gradients.
+    tolerance : float, optional
+        The maximum geodesic distance in m.
+    color_tolerance, gradient_tolerance : float, optional
+        The maximum deviation of any color channel and of the gradient.
+
+    Returns
+    -------
+    list of int
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+
+    values = []
+    if colors is not None:
+        values.append((np.asarray(colors, dtype=float).reshape(n, -1), color_tolerance))
+    if gradients is not None:
+        values.append((np.asarray(gradients, dtype=float).reshape(n, -1), gradient_tolerance))
+
+    # the interpolation parameter of the values is the length along the path
+    distance = np.concatenate([[0.], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        inner = slice(i + 1, j)
+        # scaled so that a deviation of 1 is at the tolerance, for every criterion
+        error = _geodesic_deviation(points[inner], points[i], points[j]) / tolerance
+        span = distance[j] - distance[i]
+        t = (distance[inner] - distance[i]) / span if span > 0 else np.zeros(j - i - 1)
+        for value, value_tolerance in values:
+            interpolated = value[i] + t[:, None] * (value[j] - value[i])
+            error = np.maximum(error, np.abs(value[inner] - interpolated).max(axis=1) / value_tolerance)
+        k = int(np.argmax(error))
+        if error[k] > 1:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return np.flatnonzero(keep).tolist()
+
+
+def decimate(points3d, colors, gradients, **tolerances):
+    """Decimates every path with :func:`decimate_path`.
+
+    Parameters
+    ----------
+    points3d, colors, gradients : list of list
+        The points, colors and gradients per path.
+    tolerances :
+        The keyword arguments of :func:`decimate_path`.
+
+    Returns
+    -------
+    tuple
+        The decimated points3d, colors and gradients.
+    """
+    new_points3d, new_colors, new_gradients = [], [], []
+    for points, colors_per_path, gradients_per_path in zip(points3d, colors, gradients):
+        indices = decimate_path(points, colors_per_path, gradients_per_path, **tolerances)
+        new_points3d.append([points[i] for i in indices])
+        new_colors.append([colors_per_path[i] for i in indices])
+        new_gradients.append([gradients_per_path[i] for i in indices])
+    before = sum(len(points) for points in points3d)
+    after = sum(len(points) for points in new_points3d)
+    print("Decimation keeps %i of %i points (%.1fx fewer)." % (after, before, float(before) / max(after, 1)))
+    return new_points3d, new_colors, new_gradients
+
+
+if __name__ == "__main__":
+
+    # a quarter of a great circle sampled densely, with a color change in the middle
+    theta = np.linspace(0, np.pi / 2, 101)
+    points = 0.15 * np.stack([np.cos(theta), np.sin(theta), np.zeros_like(theta)], axis=1)
+    assert decimate_path(points) == [0, 100]
+
+    colors = [[0, 0, 0]] * 50 + [[1, 0, 0]] * 51
+    indices = decimate_path(points, colors)
+    assert 49 in indices and 50 in indices and len(indices) == 4
+
+    # a bump of 2 mm is kept, of 0.5 mm dropped
+    for height, kept in ((0.002, True), (0.0005, False)):
+        bumped = points.copy()
+        bumped[50, 2] = height
+        assert (50 in decimate_path(bumped)) == kept
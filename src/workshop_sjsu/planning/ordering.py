@@ -0,0 +1,268 @@
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+
+from workshop_sjsu.planning import SPHERE_CENTER
+from workshop_sjsu.planning import SPHERE_RADIUS
+
+
+def path_endpoints(frames):
+    """Returns the (N, 3) unit directions from the sphere center to the start
+    and to the end point of every path."""
+    center = np.asarray(SPHERE_CENTER)
+    starts = np.array([list(path[0].point) for path in frames]).reshape(-1, 3) - center
+    ends = np.array([list(path[-1].point) for path in frames]).reshape(-1, 3) - center
+    starts /= np.linalg.norm(starts, axis=1)[:, None]
+    ends /= np.linalg.norm(ends, axis=1)[:, None]
+    return starts, ends
+
+
+class _Tour(object):
+    """An open tour through paths that can each run in either direction.
+
+    The endpoints are numbered ``p`` for the start and ``p + n`` for the end
+    of path ``p``, a tour entry ``(p, reverse)`` is entered at its end if it
+    runs in reverse.
+    """
+
+    def __init__(self, starts, ends, tour):
+        self.n = len(starts)
+        self.points = [tuple(p) for p in np.vstack([starts, ends]).tolist()]
+        self.tour = tour
+        self.distances = {}
+        self.update()
+
+    def update(self, lo=0, hi=None):
+        """Updates the positions of the entries ``lo`` to ``hi``."""
+        if lo == 0 and hi is None:
+            self.pos = [0] * self.n
+        hi = len(self.tour) - 1 if hi is None else hi
+        for k in range(lo, hi + 1):
+            self.pos[self.tour[k][0]] = k
+
+    def entry(self, k):
+        p, reverse = self.tour[k]
+        return p + self.n if reverse else p
+
+    def exit(self, k):
+        p, reverse = self.tour[k]
+        return p if reverse else p + self.n
+
+    def d(self, a, b):
+        """The great-circle distance between two endpoints."""
+        key = (a, b) if a < b else (b, a)
+        distance = self.distances.get(key)
+        if distance is None:
+            u = self.points[a]
+            v = self.points[b]
+            dot = u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+            distance = self.distances[key] = SPHERE_RADIUS * math.acos(max(-1., min(1., dot)))
+        return distance
+
+    def length(self):
+        return sum(self.d(self.exit(k), self.entry(k + 1)) for k in range(len(self.tour) - 1))
+
+    def reverse_gain(self, i, j):
+        """The gain of reversing the entries ``i`` to ``j``."""
+        m = len(self.tour)
+        gain = 0.
+        if i > 0:
+            gain += self.d(self.exit(i - 1), self.entry(i)) - self.d(self.exit(i - 1), self.exit(j))
+        if j < m - 1:
+            gain += self.d(self.exit(j), self.entry(j + 1)) - self.d(self.entry(i), self.entry(j + 1))
+        return gain
+
+    def reverse(self, i, j):
+        self.tour[i:j + 1] = [(p, not reverse) for p, reverse in reversed(self.tour[i:j + 1])]
+        self.update(i, j)
+
+    def two_opt(self, nearest):
+        """Applies improving segment reversals between neighbouring endpoints."""
+        improved = False
+        m = len(self.tour)
+        for i in range(m):
+            for side in (0, 1):
+                # side 0: new edge from the exit of i - 1 to the exit of j, reversing i..j
+                # side 1: new edge from the entry of i to the entry of j, reversing i..j - 1
+                if side == 0 and i == 0:
+                    continue
+                x = self.exit(i - 1) if side == 0 else self.entry(i)
+                for e in nearest[x]:
+                    j = self.pos[e % self.n]
+                    if side == 0 and (e != self.exit(j) or j < i):
+                        continue
+                    if side == 1 and (e != self.entry(j) or j <= i):
+                        continue
+                    a, b = (i, j) if side == 0 else (i, j - 1)
+                    if self.reverse_gain(a, b) > 1e-9:
+                        self.reverse(a, b)
+                        improved = True
+                        break
+        return improved
+
+    def or_opt(self, nearest, max_length=3):
+        """Moves segments of up to ``max_length`` entries next to neighbouring
+        endpoints, in either direction."""
+        improved = False
+        k = 0
+        while k < len(self.tour):
+            moved = False
+            for length in range(1, max_length + 1):
+                if k + length > len(self.tour) or length >= len(self.tour):
+                    break
+                if self._move_segment(k, length, nearest):
+                    moved = improved = True
+                    break
+            if not moved:
+                k += 1
+        return improved
+
+    def _move_segment(self, i, length, nearest):
+        m = len(self.tour)
+        j = i + length - 1
+        seg_entry, seg_exit = self.entry(i), self.exit(j)
+
+        # the gain of taking the segment out
+        removal = 0.
+        if i > 0:
+            removal += self.d(self.exit(i - 1), seg_entry)
+        if j < m - 1:
+            removal += self.d(seg_exit, self.entry(j + 1))
+        if i > 0 and j < m - 1:
+            removal -= self.d(self.exit(i - 1), self.entry(j + 1))
+
+        # insert after position a (-1 for the front), between a and its successor
+        candidates = set([-1, m - 1])
+        for e in list(nearest[seg_entry]) + list(nearest[seg_exit]):
+            q = self.pos[e % self.n]
+            candidates.update((q - 1, q))
+        best, best_a, best_reverse = 1e-9, None, False
+        for a in candidates:
+            if i - 1 <= a <= j:
+                continue
+            b = a + 1 if a + 1 != i else j + 1
+            a_exit = self.exit(a) if a >= 0 else None
+            b_entry = self.entry(b) if b < m else None
+            for reverse in (False, True):
+                first, last = (seg_exit, seg_entry) if reverse else (seg_entry, seg_exit)
+                cost = 0.
+                if a_exit is not None:
+                    cost += self.d(a_exit, first)
+                if b_entry is not None:
+                    cost += self.d(last, b_entry)
+                if a_exit is not None and b_entry is not None:
+                    cost -= self.d(a_exit, b_entry)
+                if removal - cost > best:
+                    best, best_a, best_reverse = removal - cost, a, reverse
+        if best_a is None:
+            return False
+
+        segment = self.tour[i:j + 1]
+        if best_reverse:
+            segment = [(p, not reverse) for p, reverse in reversed(segment)]
+        rest = self.tour[:i] + self.tour[j + 1:]
+        insert = best_a + 1 if best_a < i else best_a + 1 - length
+        self.tour = rest[:insert] + segment + rest[insert:]
+        self.update(min(i, insert), max(j, insert + length - 1))
+        return True
+
+
+def order_paths(frames, neighbors=10, max_passes=20, tolerance=1e-2):
+    """Orders the paths and their directions to shorten the transitions.
+
+    The paths are first chained greedily, always going to the nearest free
+    endpoint, then the tour is improved by 2-opt segment reversals and
+    Or-opt segment moves. Candidate moves are restricted to the
+    ``neighbors`` nearest endpoints found with a k-d tree.
+
+    Parameters
+    ----------
+    frames : list of list of :class:`compas.geometry.Frame`
+        The frames per path.
+    neighbors : int, optional
+        The number of nearest endpoints considered per endpoint.
+    max_passes : int, optional
+        The maximum number of improvement passes.
+    tolerance : float, optional
+        Stops once a pass shortens the transitions by less than this fraction.
+
+    Returns
+    -------
+    list of tuple
+        ``(index, reverse)`` per path in the new order.
+    """
+    n = len(frames)
+    if n == 0:
+        return []
+    starts, ends = path_endpoints(frames)
+    points = np.vstack([starts, ends])
+    tree = cKDTree(points)
+    k = min(neighbors + 1, 2 * n)
+    nearest = tree.query(points, k)[1].reshape(2 * n, -1)[:, 1:].tolist()
+
+    # greedy nearest free endpoint, starting with the first path
+    used = np.zeros(n, dtype=bool)
+    used[0] = True
+    tour = [(0, False)]
+    current = n  # end of path 0
+    for _ in range(n - 1):
+        found = None
+        count = k
+        while found is None:
+            for e in np.atleast_1d(tree.query(points[current], count)[1]):
+                if not used[e % n]:
+                    found = e
+                    break
+            count = min(2 * count, 2 * n)
+        p = found % n
+        reverse = found >= n
+        used[p] = True
+        tour.append((p, bool(reverse)))
+        current = p if reverse else p + n
+
+    t = _Tour(starts, ends, tour)
+    length = t.length()
+    for _ in range(max_passes):
+        improved = t.two_opt(nearest)
+        improved = t.or_opt(nearest) or improved
+        previous, length = length, t.length()
+        if not improved or previous - length < tolerance * previous:
+            break
+    return t.tour
+
+
+def transition_length(frames, order=None):
+    """Returns the total great-circle length of the transitions between the
+    paths in the given order, in the file order if ``None``."""
+    if not frames:
+        return 0.
+    starts, ends = path_endpoints(frames)
+    order = order if order is not None else [(i, False) for i in range(len(frames))]
+    return _Tour(starts, ends, list(order)).length()
+
+
+def reorder(order, values_per_path):
+    """Permutes a list of per-path lists and reverses the ones that run in reverse."""
+    return [list(reversed(values_per_path[i])) if reverse else list(values_per_path[i]) for i, reverse in order]
+
+
+if __name__ == "__main__":
+
+    from compas.geometry import Frame
+
+    def frame(theta, phi):
+        point = np.asarray(SPHERE_CENTER) + SPHERE_RADIUS * np.array([math.sin(theta) * math.cos(phi),
+                                                                       math.sin(theta) * math.sin(phi),
+                                                                       math.cos(theta)])
+        return Frame(point.tolist(), [1, 0, 0], [0, 1, 0])
+
+    # short strokes along a meridian, stored in an alternating, zig-zag order
+    strokes = [[frame(0.2 + 0.1 * i, 0), frame(0.25 + 0.1 * i, 0)] for i in range(10)]
+    frames = [strokes[i] for i in [0, 9, 1, 8, 2, 7, 3, 6, 4, 5]]
+    frames = [path if i % 3 else path[::-1] for i, path in enumerate(frames)]
+
+    order = order_paths(frames)
+    assert sorted(i for i, _ in order) == list(range(10))
+    assert transition_length(frames, order) < 0.5 * transition_length(frames)
+    assert abs(transition_length(frames, order) - 9 * 0.05 * SPHERE_RADIUS) < 1e-6
+    assert reorder([(1, True), (0, False)], [[1, 2], [3, 4]]) == [[4, 3], [1, 2]]
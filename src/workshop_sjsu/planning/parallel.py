@@ -0,0 +1,138 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+
+from compas.robots import Configuration
+from compas_fab.backends.exceptions import BackendError
+
+from workshop_sjsu.instrumentation import DISABLED
+from workshop_sjsu.planning import IK_IDX
+from workshop_sjsu.planning.setup import Client
+from workshop_sjsu.planning.setup import sjsu_setup
+from workshop_sjsu.ur.kinematics.offset_wrist_kinematics import UR5e
+from workshop_sjsu.ur.kinematics.offset_wrist_numpy import frames_to_numpy
+
+
+def tool0_frames_numpy(robot, frames_per_path):
+    """Returns the (N, 4, 4) tool0 frames of the tool center frames of a path."""
+    Te = np.linalg.inv(frames_to_numpy([robot.attached_tool.frame])[0])
+    return frames_to_numpy(frames_per_path) @ Te
+
+
+def reachable_joint_values(client, robot, T_t0cf, kinematics=None, instrumentation=None, first=None):
+    """Returns the ``IK_IDX`` joint values of all frames of a path, or ``None``
+    if one of them has no solution or is in collision.
+
+    All frames of the path are solved in one call, then only the ``IK_IDX``
+    solution is checked for collisions until the first failing frame. The
+    frames ``first`` are checked before the others, the result is the same.
+
+    Parameters
+    ----------
+    client : :class:`workshop_sjsu.planning.setup.Client`
+    robot : :class:`compas_fab.robots.Robot`
+    T_t0cf : :class:`numpy.ndarray`
+        (N, 4, 4) tool0 frames, see :func:`tool0_frames_numpy`.
+    kinematics : :class:`workshop_sjsu.ur.kinematics.offset_wrist_kinematics.OffsetWristKinematics`, optional
+    instrumentation : :class:`workshop_sjsu.instrumentation.Instrumentation`, optional
+    first : array_like, optional
+        The indices of the frames to check first, e.g. the ones of
+        :meth:`workshop_sjsu.planning.reachability.ReachabilityMap.triage`.
+    """
+    kinematics = kinematics or UR5e()
+    instrumentation = instrumentation or DISABLED
+    joint_names = robot.get_configurable_joint_names()
+    solutions, mask = kinematics.inverse_numpy(T_t0cf)
+    instrumentation.count('ik.batch_calls')
+    instrumentation.count('ik.batch_frames', len(T_t0cf))
+    if not mask[:, IK_IDX].all():
+        instrumentation.fail('path.no_solution')
+        return None
+    joint_values_per_path = solutions[:, IK_IDX].tolist()
+
+    order = np.arange(len(joint_values_per_path))
+    if first is not None and len(first):
+        order = np.concatenate([first, np.setdiff1d(order, first)]).astype(int)
+    for i in order:
+        instrumentation.count('collision_checks.issued')
+        try:
+            client.check_collisions(robot, Configuration.from_revolute_values(joint_values_per_path[i],
+                                                                              joint_names=joint_names))
+        except BackendError:
+            instrumentation.fail('path.collision')
+            return None
+    return joint_values_per_path
+
+
+# the client and robot of a worker process, created by _init_worker
+_worker = {}
+
+
+def _init_worker(geometry=None, camera=True):
+    # same as entering the client's context, it stays connected for the life of the process
+    client = Client(connection_type='direct').__enter__()
+    robot, _ = sjsu_setup(client, camera=camera, geometry=geometry)
+    _worker.update(client=client, robot=robot, kinematics=UR5e())
+
+
+def _check_path(args):
+    index, T_t0cf, first = args
+    t0 = time.time()
+    result = reachable_joint_values(_worker['client'], _worker['robot'], T_t0cf, _worker['kinematics'], first=first)
+    return index, result, os.getpid(), time.time() - t0
+
+
+def reduce_to_reachable_parallel(robot, frames, indices=None, workers=None, geometry=None, camera=True, first=None):
+    """Checks the paths in a pool of worker processes.
+
+    Every worker holds its own ``Client(connection_type='direct')`` with the
+    robot and scene of :func:`sjsu_setup`, and the paths are sharded across
+    them.
+
+    Parameters
+    ----------
+    robot : :class:`compas_fab.robots.Robot`
+        The robot with the attached tool, only used to compute the tool0 frames.
+    frames : list of list of :class:`compas.geometry.Frame`
+        The frames per path.
+    indices : list of int, optional
+        The indices of the paths to check, defaults to all.
+    workers : int, optional
+        The number of worker processes, defaults to the number of cores.
+    geometry : :class:`workshop_sjsu.planning.collision_geometry.CollisionGeometry`, optional
+        The collision geometry of the workers' scene.
+    camera : bool, optional
+        If the camera is added to the workers' scene, like in the session.
+    first : dict, optional
+        The indices of the frames to check first per path index, see
+        :func:`reachable_joint_values`.
+
+    Returns
+    -------
+    tuple
+        The joint values per reachable path and their indices, both in the
+        original order, and a dict of ``{pid: (num_paths, seconds)}``.
+    """
+    if indices is None:
+        indices = range(len(frames))
+    workers = workers or multiprocessing.cpu_count()
+    first = first or {}
+    tasks = [(i, tool0_frames_numpy(robot, frames[i]), first.get(i)) for i in indices]
+
+    joint_values = []
+    indices2keep = []
+    timings = {}
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(geometry, camera))
+    try:
+        # imap keeps the order of the tasks
+        for index, result, pid, seconds in pool.imap(_check_path, tasks):
+            num_paths, total = timings.get(pid, (0, 0.))
+            timings[pid] = (num_paths + 1, total + seconds)
+            if result is not None:
+                joint_values.append(result)
+                indices2keep.append(index)
+    finally:
+        pool.terminate()
+        pool.join()
+    return joint_values, indices2keep, timings
@@ -0,0 +1,113 @@
+import io
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+from workshop_sjsu.ur.kinematics.offset_wrist_numpy import frames_to_numpy
+
+
+class PlanningCache(object):
+    """An on-disk cache of the reachability verdict and configurations of
+    paths, and of the configurations of the transitions between them.
+
+    Paths are keyed by a hash of their frames, transitions by a hash of
+    their start and end frame. Both keys include the ``scene`` key of the
+    robot, tool, collision objects and planning constants, see
+    :func:`workshop_sjsu.planning.reachability.scene_key`.
+
+    Parameters
+    ----------
+    filepath : str, optional
+        A JSON file to load the cache from, and to :meth:`save` it to.
+    maxsize : int, optional
+        The maximum number of paths, and of transitions, the least recently
+        used ones are evicted first. Unbounded if ``None``.
+
+    Examples
+    --------
+
+    >>> cache = PlanningCache()
+    >>> cache.report()
+    'Reused 0 of 0 paths and 0 of 0 transitions.'
+    """
+
+    def __init__(self, filepath=None, maxsize=None):
+        self.filepath = filepath
+        self.maxsize = maxsize
+        self.paths = OrderedDict()
+        self.transitions = OrderedDict()
+        self.paths_reused = 0
+        self.paths_solved = 0
+        self.transitions_reused = 0
+        self.transitions_solved = 0
+        if filepath and os.path.exists(filepath):
+            self.load(filepath)
+
+    @property
+    def stats(self):
+        return {'paths_reused': self.paths_reused,
+                'paths_solved': self.paths_solved,
+                'transitions_reused': self.transitions_reused,
+                'transitions_solved': self.transitions_solved}
+
+    def report(self):
+        return "Reused %i of %i paths and %i of %i transitions." % (
+            self.paths_reused, self.paths_reused + self.paths_solved,
+            self.transitions_reused, self.transitions_reused + self.transitions_solved)
+
+    def _hash(self, scene, frames, *extra):
+        h = hashlib.sha1(scene.encode('utf-8'))
+        # rounded, so that re-creating the frames of the same points gives the same key
+        h.update(repr([round(v, 9) + 0. for v in frames_to_numpy(frames).ravel().tolist()]).encode('utf-8'))
+        h.update(repr(extra).encode('utf-8'))
+        return h.hexdigest()
+
+    def path_key(self, scene, frames_per_path):
+        return self._hash(scene, frames_per_path)
+
+    def transition_key(self, scene, start_frame, end_frame, seeded=False):
+        return self._hash(scene, [start_frame, end_frame], seeded)
+
+    def get_path(self, key):
+        """Returns ``(found, joint_values)``, the joint values are ``None`` for
+        unreachable paths."""
+        if key in self.paths:
+            self.paths_reused += 1
+            self.paths.move_to_end(key)
+            return True, self.paths[key]
+        return False, None
+
+    def put_path(self, key, joint_values):
+        self.paths_solved += 1
+        self._put(self.paths, key, joint_values)
+
+    def get_transition(self, key):
+        joint_values = self.transitions.get(key)
+        if joint_values is not None:
+            self.transitions_reused += 1
+            self.transitions.move_to_end(key)
+        return joint_values
+
+    def put_transition(self, key, joint_values):
+        self.transitions_solved += 1
+        self._put(self.transitions, key, joint_values)
+
+    def _put(self, entries, key, joint_values):
+        entries.pop(key, None)
+        entries[key] = joint_values
+        while self.maxsize is not None and len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def save(self, filepath=None):
+        filepath = filepath or self.filepath
+        with io.open(filepath, 'w') as fp:
+            json.dump({'paths': self.paths, 'transitions': self.transitions}, fp)
+
+    def load(self, filepath):
+        with io.open(filepath, 'r') as fp:
+            data = json.load(fp)
+        for key, joint_values in data['paths'].items():
+            self._put(self.paths, key, joint_values)
+        for key, joint_values in data['transitions'].items():
+            self._put(self.transitions, key, joint_values)
@@ -0,0 +1,231 @@
+import os
+import hashlib
+import numpy as np
+
+from compas.robots import Configuration
+from compas_fab.backends.exceptions import BackendError
+
+from workshop_sjsu.planning import SPHERE_CENTER
+from workshop_sjsu.planning import SPHERE_RADIUS
+from workshop_sjsu.planning import IK_IDX
+from workshop_sjsu.planning.utilities import sphere_frames_numpy
+from workshop_sjsu.ur.kinematics.offset_wrist_kinematics import UR5e
+from workshop_sjsu.ur.kinematics.offset_wrist_numpy import frames_to_numpy
+
+
+UNREACHABLE = 0
+REACHABLE = 1
+UNDECIDED = -1
+
+
+def scene_key(robot, client=None, *extra):
+    """Returns a hash of the robot, its tool, the scene, the planning
+    constants and any ``extra`` values, e.g. the sphere grid.
+
+    With a :class:`workshop_sjsu.planning.setup.Client`, the meshes and
+    frames of the links, the tool and the collision objects are hashed, see
+    its ``scene_fingerprint``, otherwise only the tool frame and the names
+    of the collision objects."""
+    parts = [robot.name, repr([round(v, 6) for v in SPHERE_CENTER]), repr(round(SPHERE_RADIUS, 6)),
+             str(IK_IDX), repr(extra)]
+    tool = robot.attached_tool
+    if tool:
+        parts.append(repr([round(v, 6) for v in list(tool.frame.point) + list(tool.frame.xaxis) + list(tool.frame.yaxis)]))
+    if hasattr(client, 'scene_fingerprint'):
+        parts.append(client.scene_fingerprint(robot))
+    elif client is not None:
+        parts.append(','.join(sorted(client.collision_objects.keys())))
+        parts.append(','.join(sorted(client.attached_collision_objects.keys())))
+        geometry = getattr(client, 'collision_geometry', None)
+        if geometry is not None:
+            parts.append(geometry.key)
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ReachabilityMap(object):
+    """A precomputed map of the reachable directions of the painting sphere.
+
+    The sphere is sampled on a grid of ``lat_count`` polar angles from the
+    north to the south pole and ``lon_count`` azimuth angles. Every node
+    stores whether the ``IK_IDX`` solution of its frame exists and is
+    collision free, together with that solution as seed.
+
+    Parameters
+    ----------
+    reachable : array_like
+        (lat_count, lon_count) booleans.
+    seeds : array_like
+        (lat_count, lon_count, 6) joint values, ``nan`` where unreachable.
+    key : str, optional
+        The :func:`scene_key` the map was built for.
+
+    Examples
+    --------
+
+    >>> reachability_map = ReachabilityMap(np.ones((3, 4), dtype=bool), np.zeros((3, 4, 6)))
+    >>> reachability_map.lookup([np.asarray(SPHERE_CENTER) + [0, 0, SPHERE_RADIUS]]).tolist()
+    [1]
+    """
+
+    def __init__(self, reachable, seeds, key=None):
+        self.reachable = np.asarray(reachable, dtype=bool)
+        self.seeds = np.asarray(seeds, dtype=float)
+        self.key = key
+
+    @property
+    def lat_count(self):
+        return self.reachable.shape[0]
+
+    @property
+    def lon_count(self):
+        return self.reachable.shape[1]
+
+    @staticmethod
+    def grid_points(lat_count, lon_count):
+        """Returns the (lat_count, lon_count, 3) points of the grid nodes in the RCF."""
+        theta = np.linspace(0, np.pi, lat_count)[:, None]
+        phi = np.arange(lon_count)[None, :] * (2 * np.pi / lon_count)
+        directions = np.stack([np.sin(theta) * np.cos(phi),
+                               np.sin(theta) * np.sin(phi),
+                               np.cos(theta) * np.ones_like(phi)], axis=2)
+        return np.asarray(SPHERE_CENTER) + SPHERE_RADIUS * directions
+
+    def _grid_coordinates(self, points):
+        directions = np.asarray(points, dtype=float).reshape(-1, 3) - np.asarray(SPHERE_CENTER)
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        theta = np.arccos(np.clip(directions[:, 2], -1., 1.))
+        phi = np.mod(np.arctan2(directions[:, 1], directions[:, 0]), 2 * np.pi)
+        fi = theta / (np.pi / (self.lat_count - 1))
+        fj = phi / (2 * np.pi / self.lon_count)
+        return fi, fj
+
+    def lookup(self, points):
+        """Returns for every point if the surrounding grid nodes are all
+        reachable (``REACHABLE``), all unreachable (``UNREACHABLE``) or
+        mixed (``UNDECIDED``).
+
+        Parameters
+        ----------
+        points : array_like
+            (N, 3) points on the sphere in the RCF.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            (N,) int8 array.
+        """
+        fi, fj = self._grid_coordinates(points)
+        i0 = np.minimum(np.floor(fi).astype(int), self.lat_count - 1)
+        i1 = np.minimum(i0 + 1, self.lat_count - 1)
+        j0 = np.floor(fj).astype(int) % self.lon_count
+        j1 = (j0 + 1) % self.lon_count
+        corners = np.stack([self.reachable[i0, j0], self.reachable[i0, j1],
+                            self.reachable[i1, j0], self.reachable[i1, j1]], axis=1)
+        result = np.full(len(fi), UNDECIDED, dtype=np.int8)
+        result[corners.all(axis=1)] = REACHABLE
+        result[~corners.any(axis=1)] = UNREACHABLE
+        return result
+
+    def triage(self, frames):
+        """Returns for every path the indices of its points whose surrounding
+        grid nodes are all unreachable.
+
+        The map only samples the sphere, such a point can still be reachable
+        between the nodes, so no path is dropped by the map. The exact check
+        of these points comes first instead, see
+        :func:`workshop_sjsu.planning.parallel.reachable_joint_values`, and a
+        path that fails there fails with the fewest collision checks.
+
+        Parameters
+        ----------
+        frames : list of list of :class:`compas.geometry.Frame`
+            The frames per path.
+
+        Returns
+        -------
+        list of :class:`numpy.ndarray`
+        """
+        points = [list(frame.point) for frames_per_path in frames for frame in frames_per_path]
+        if not points:
+            return [np.zeros(0, dtype=int) for _ in frames]
+        unreachable = self.lookup(points) == UNREACHABLE
+        offsets = np.cumsum([0] + [len(frames_per_path) for frames_per_path in frames])
+        return [np.flatnonzero(unreachable[offsets[i]:offsets[i + 1]]) for i in range(len(frames))]
+
+    @classmethod
+    def build(cls, client, robot, lat_count=91, lon_count=180):
+        """Builds the map with the same checks as ``reduce_to_reachable``.
+
+        Parameters
+        ----------
+        client : :class:`workshop_sjsu.planning.setup.Client`
+            A client with the robot and the scene of :func:`sjsu_setup`.
+        robot : :class:`compas_fab.robots.Robot`
+            The robot with the attached tool.
+        lat_count, lon_count : int, optional
+            The grid resolution.
+        """
+        points = cls.grid_points(lat_count, lon_count).reshape(-1, 3)
+        Te = np.linalg.inv(frames_to_numpy([robot.attached_tool.frame])[0])
+        solutions, mask = UR5e().inverse_numpy(sphere_frames_numpy(points) @ Te)
+        solutions, mask = solutions[:, IK_IDX], mask[:, IK_IDX]
+
+        joint_names = robot.get_configurable_joint_names()
+        for n in np.flatnonzero(mask):
+            configuration = Configuration.from_revolute_values(solutions[n].tolist(), joint_names=joint_names)
+            try:
+                client.check_collisions(robot, configuration)
+            except BackendError:
+                mask[n] = False
+        solutions[~mask] = np.nan
+
+        key = scene_key(robot, client, lat_count, lon_count)
+        return cls(mask.reshape(lat_count, lon_count), solutions.reshape(lat_count, lon_count, 6), key)
+
+    @classmethod
+    def from_cache(cls, directory, client, robot, lat_count=91, lon_count=180):
+        """Loads the map of the scene from ``directory``, or builds and saves it."""
+        key = scene_key(robot, client, lat_count, lon_count)
+        filepath = os.path.join(directory, "reachability_%s.npz" % key[:16])
+        if os.path.exists(filepath):
+            reachability_map = cls.load(filepath)
+            if reachability_map.key == key:
+                return reachability_map
+        reachability_map = cls.build(client, robot, lat_count, lon_count)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        reachability_map.save(filepath)
+        return reachability_map
+
+    def save(self, filepath):
+        np.savez_compressed(filepath,
+                            shape=np.array(self.reachable.shape),
+                            reachable=np.packbits(self.reachable.ravel()),
+                            seeds=self.seeds.astype(np.float32),
+                            key=np.array(self.key or ''))
+
+    @classmethod
+    def load(cls, filepath):
+        with np.load(filepath) as data:
+            shape = tuple(data['shape'])
+            reachable = np.unpackbits(data['reachable'])[:shape[0] * shape[1]].reshape(shape)
+            return cls(reachable.astype(bool), data['seeds'].astype(float), str(data['key']) or None)
+
+
+if __name__ == "__main__":
+
+    from workshop_sjsu.planning.utilities import translate_and_create_frames
+
+    points = ReachabilityMap.grid_points(7, 12).reshape(-1, 3)
+    frames = translate_and_create_frames([(points - np.asarray(SPHERE_CENTER)).tolist()])[0]
+    assert np.allclose(sphere_frames_numpy(points), frames_to_numpy(frames))
+
+    reachable = np.zeros((7, 12), dtype=bool)
+    reachable[:4] = True
+    reachability_map = ReachabilityMap(reachable, np.zeros((7, 12, 6)))
+    north = np.asarray(SPHERE_CENTER) + [0, 0, SPHERE_RADIUS]
+    south = np.asarray(SPHERE_CENTER) - [0, 0, SPHERE_RADIUS]
+    equator = ReachabilityMap.grid_points(7, 12)[3, 0] - [0, 0, 0.01]
+    assert reachability_map.lookup([north, south, equator]).tolist() == [REACHABLE, UNREACHABLE, UNDECIDED]
+    paths = translate_and_create_frames([[p - np.asarray(SPHERE_CENTER) for p in (north, south, equator)], []])
+    assert [suspects.tolist() for suspects in reachability_map.triage(paths)] == [[1], []]
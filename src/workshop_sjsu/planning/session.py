@@ -0,0 +1,444 @@
+from compas.robots import Configuration
+
+from workshop_sjsu import CACHE
+from workshop_sjsu.instrumentation import DISABLED
+from workshop_sjsu.instrumentation import timed
+from workshop_sjsu.planning import IK_IDX
+from workshop_sjsu.planning.setup import Client
+from workshop_sjsu.planning.setup import sjsu_setup
+from workshop_sjsu.planning.utilities import translate_and_create_frames
+from workshop_sjsu.planning.utilities import create_transition_frames_between_paths
+from workshop_sjsu.planning.utilities import make_configurations_smooth
+from workshop_sjsu.planning.utilities import joint_limits
+from workshop_sjsu.planning.reachability import ReachabilityMap
+from workshop_sjsu.planning.reachability import scene_key
+from workshop_sjsu.planning.setup_cache import source_hash
+from workshop_sjsu.planning.decimation import decimate
+from workshop_sjsu.planning.ordering import order_paths
+from workshop_sjsu.planning.ordering import reorder
+from workshop_sjsu.planning.ordering import transition_length
+from workshop_sjsu.planning.parallel import reachable_joint_values
+from workshop_sjsu.planning.parallel import reduce_to_reachable_parallel
+from workshop_sjsu.planning.parallel import tool0_frames_numpy
+from workshop_sjsu.planning import streaming
+from workshop_sjsu.ur.kinematics.offset_wrist_kinematics import UR5e
+
+
+class PlanningSession(object):
+    """Owns one client, robot and scene for the planning stages.
+
+    The URDF/SRDF, the tool and the camera are loaded once when the session
+    is opened, and re-used by all stages until it is closed.
+
+    Parameters
+    ----------
+    connection_type : str, optional
+        The connection type of the :class:`workshop_sjsu.planning.setup.Client`.
+    camera : bool, optional
+        If the camera is added to the scene.
+    ik_cache : :class:`workshop_sjsu.ur.kinematics.ik_cache.IKCache`, optional
+        A cache for the inverse kinematics of the transitions.
+    setup_cache : :class:`workshop_sjsu.planning.setup_cache.SetupCache`, optional
+        A snapshot of the parsed tool, camera and semantics for a fast start.
+    planning_cache : :class:`workshop_sjsu.planning.planning_cache.PlanningCache`, optional
+        Paths and transitions found in it are not solved again. Its keys
+        include the content of the URDF, the tool and the camera files.
+    collision_geometry : :class:`workshop_sjsu.planning.collision_geometry.CollisionGeometry`, optional
+        If given, collisions are checked with its simplified convex meshes.
+    instrumentation : :class:`workshop_sjsu.instrumentation.Instrumentation`, optional
+        Records the wall time of the stages and the counters of the inverse
+        kinematics and collision checks. Worker processes are not recorded.
+
+    Examples
+    --------
+
+    >>> with PlanningSession(connection_type='direct') as session:           # doctest: +SKIP
+    ...     data = session.prepare(points3d, gradients, colors)               # doctest: +SKIP
+    """
+
+    def __init__(self, connection_type='gui', camera=True, ik_cache=None, setup_cache=None,
+                 planning_cache=None, instrumentation=None, collision_geometry=None):
+        self.connection_type = connection_type
+        self.camera = camera
+        self.ik_cache = ik_cache
+        self.setup_cache = setup_cache
+        self.planning_cache = planning_cache
+        self.instrumentation = instrumentation or DISABLED
+        self.collision_geometry = collision_geometry
+        self.scene_key = None
+        self.client = None
+        self.robot = None
+        self.scene = None
+        self.kinematics = UR5e()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        with self.instrumentation.stage('setup'):
+            self.client = Client(connection_type=self.connection_type, ik_cache=self.ik_cache,
+                                 instrumentation=self.instrumentation).__enter__()
+            self.robot, self.scene = sjsu_setup(self.client, camera=self.camera, cache=self.setup_cache,
+                                                geometry=self.collision_geometry)
+        # the planning cache persists, so it is also keyed by the content of the source files
+        sources = (self.setup_cache.key if self.setup_cache else source_hash()) if self.planning_cache else None
+        self.scene_key = scene_key(self.robot, self.client, sources)
+
+    def close(self):
+        if self.client is not None:
+            self.client.__exit__()
+        self.client = None
+        self.robot = None
+        self.scene = None
+
+    def reachability_map(self, directory=CACHE, lat_count=91, lon_count=180):
+        """Returns the :class:`ReachabilityMap` of the session's scene, built
+        on first use and cached in ``directory``."""
+        return ReachabilityMap.from_cache(directory, self.client, self.robot, lat_count, lon_count)
+
+    @timed('reduce_to_reachable')
+    def reduce_to_reachable(self, frames, reachability_map=None, workers=None):
+        """Returns the configurations of the paths that are reachable without
+        collision, and the indices of these paths.
+
+        Parameters
+        ----------
+        frames : list of list of :class:`compas.geometry.Frame`
+            The frames per path.
+        reachability_map : :class:`ReachabilityMap`, optional
+            The points in its unreachable areas are checked first, see
+            :meth:`ReachabilityMap.triage`.
+        workers : int, optional
+            If given, the paths are checked by that many worker processes.
+        """
+        robot = self.robot
+        joint_names = robot.get_configurable_joint_names()
+        num_frames = sum([len(frames_per_path) for frames_per_path in frames])
+
+        # the points in the unreachable areas of the map are checked first
+        candidates = range(len(frames))
+        first = {}
+        if reachability_map is not None:
+            first = dict((i, suspects) for i, suspects in enumerate(reachability_map.triage(frames)) if len(suspects))
+            self.instrumentation.count('paths.suspected_by_map', len(first))
+            print("Reachability map suspects %i of %i paths, their unreachable points are checked first." %
+                  (len(first), len(frames)))
+
+        # paths of the planning cache are not checked again
+        cache = self.planning_cache
+        results = {}
+        if cache is not None:
+            keys = dict((i, cache.path_key(self.scene_key, frames[i])) for i in candidates)
+            for i in candidates:
+                found, joint_values_per_path = cache.get_path(keys[i])
+                if found:
+                    results[i] = joint_values_per_path
+        unsolved = [i for i in candidates if i not in results]
+        self.instrumentation.count('paths.cached', len(results))
+
+        if workers and unsolved:
+            # shard the paths across worker processes with their own direct clients
+            joint_values, indices, timings = reduce_to_reachable_parallel(robot, frames, unsolved, workers,
+                                                                        self.collision_geometry, self.camera, first)
+            for pid, (num_paths, seconds) in sorted(timings.items()):
+                print("Worker %i checked %i paths in %.2f s." % (pid, num_paths, seconds))
+            self.instrumentation.count('paths.checked_by_workers', len(unsolved))
+            solved = dict((i, None) for i in unsolved)
+            solved.update(zip(indices, joint_values))
+        else:
+            solved = {}
+            for i in unsolved:
+                T_t0cf = tool0_frames_numpy(robot, frames[i])
+                solved[i] = reachable_joint_values(self.client, robot, T_t0cf, self.kinematics, self.instrumentation,
+                                                   first.get(i))
+
+        if cache is not None:
+            for i in unsolved:
+                cache.put_path(keys[i], solved[i])
+        results.update(solved)
+
+        indices2keep = [i for i in candidates if results[i] is not None]
+        joint_values = [results[i] for i in indices2keep]
+
+        configurations = []
+        for joint_values_per_path in joint_values:
+            configurations.append([Configuration.from_revolute_values(q, joint_names=joint_names)
+                                   for q in joint_values_per_path])
+
+        num_configurations = sum([len(configurations_per_path)
+                                 for configurations_per_path in configurations])
+        print("Removing %i of %i frames, since they are not reachable." %
+              (num_frames - num_configurations, num_frames))
+
+        return configurations, indices2keep
+
+    @timed('add_transition_between_paths_and_flatten')
+    def add_transition_between_paths_and_flatten(self, frames, gradients, colors, configurations, seeded=False):
+        """Connects the paths with transitions along the sphere and flattens them.
+
+        Returns
+        -------
+        tuple
+            The flattened frames, gradients, colors, configurations and startends.
+        """
+        client = self.client
+        robot = self.robot
+
+        frames_flattened = []
+        gradients_flattened = []
+        colors_flattened = []
+        configurations_flattened = []
+        startends = [] # here we set start and end points to 1, rest is 0
+
+        def create_startend(num):
+            array = [0 for _ in range(num)]
+            array[0] = 1
+            array[-1] = 1
+            return array
+
+        if len(frames) == 1:  # one path
+            frames_flattened = frames[0]
+            gradients_flattened = gradients[0]
+            colors_flattened = colors[0]
+            configurations_flattened = configurations[0]
+
+            startends = create_startend(len(frames_flattened))
+
+        else:
+            # all transitions are sampled in one go
+            transitions = create_transition_frames_between_paths(frames)
+
+            for i, (path1, path2) in enumerate(zip(frames[:-1], frames[1:])):
+
+                transition_frames = transitions[i]
+
+                # add another 2
+                # TODO: this can be improved by moving along the sphere to the point
+                #point_s = closest_point_on_plane(path1[-1].point, UP_PLANE)
+                #frame_s = Frame(point_s, path1[-1].xaxis, path1[-1].yaxis)
+
+                #point_e = closest_point_on_plane(path2[0].point, UP_PLANE)
+                #frame_e = Frame(point_e, path2[-1].xaxis, path2[-1].yaxis)
+
+                if i == 0:
+                    frames_flattened += path1
+                    gradients_flattened += gradients[i]
+                    colors_flattened += colors[i]
+                    configurations_flattened += configurations[i]
+                    startends += create_startend(len(path1))
+
+                # transition
+                frames_flattened += transition_frames  # [frame_s, frame_e]
+                gradients_flattened += [0 for _ in range(len(transition_frames))]
+                colors_flattened += [(0, 0, 0) for _ in range(len(transition_frames))]
+                startends += create_startend(len(transition_frames))
+
+                # configurations_flattened
+                configurations_flattened += self._transition_configurations(transition_frames, configurations_flattened[-1], seeded)
+
+                # path2
+                frames_flattened += path2
+                gradients_flattened += gradients[i + 1]
+                colors_flattened += colors[i + 1]
+                configurations_flattened += configurations[i + 1]
+                startends += create_startend(len(path2))
+
+        print("Now %d frames with transitions" % len(frames_flattened))
+
+        # add offs to start and end
+        def add_offs(array_flattened, off=None, num=2):
+            if off is None:
+                s = array_flattened[0]
+                e = array_flattened[-1]
+            else:
+                s = off
+                e = off
+
+            start = [s for _ in range(num)]
+            end = [e for _ in range(num)]
+            return start + array_flattened + end
+
+        num = 2
+        frames_flattened = add_offs(frames_flattened, off=None, num=num)
+        gradients_flattened = add_offs(gradients_flattened, off=0, num=num)
+        colors_flattened = add_offs(colors_flattened, off=(0, 0, 0), num=num)
+        configurations_flattened = add_offs(configurations_flattened, off=None, num=num)
+        startends = add_offs(startends, off=0, num=num)
+
+        return frames_flattened, gradients_flattened, colors_flattened, configurations_flattened, startends
+
+    @timed('order_paths')
+    def order_paths(self, frames, gradients, colors, configurations, velocity=0.01):
+        """Reorders and reverses the paths to shorten the transitions between
+        them, see :func:`workshop_sjsu.planning.ordering.order_paths`.
+
+        Parameters
+        ----------
+        velocity : float, optional
+            The tool speed in m/s used to estimate the time saved.
+
+        Returns
+        -------
+        tuple
+            The reordered frames, gradients, colors and configurations.
+        """
+        order = order_paths(frames)
+        before = transition_length(frames)
+        after = transition_length(frames, order)
+        print("Path ordering shortens the transitions from %.2f m to %.2f m, saving about %.0f s." %
+              (before, after, (before - after) / velocity))
+        return (reorder(order, frames), reorder(order, gradients),
+                reorder(order, colors), reorder(order, configurations))
+
+    @timed('transition_configurations')
+    def _transition_configurations(self, transition_frames, previous, seeded):
+        cache = self.planning_cache
+        if cache is not None:
+            key = cache.transition_key(self.scene_key, transition_frames[0], transition_frames[-1], seeded)
+            joint_values = cache.get_transition(key)
+            if joint_values is not None:
+                joint_names = self.robot.get_configurable_joint_names()
+                return [Configuration.from_revolute_values(q, joint_names=joint_names) for q in joint_values]
+
+        client = self.client
+        robot = self.robot
+        configurations = []
+        for frame_tcf in transition_frames:
+            frame0_t0cf = robot.attached_tool.from_tcf_to_t0cf([frame_tcf])[0]
+            if seeded:
+                # only solve the branch of the previous configuration
+                configs = client.inverse_kinematics(robot, frame0_t0cf,
+                                                    start_configuration=previous,
+                                                    options={
+                                                        "check_collision": True,
+                                                        "cull": False,
+                                                        "seeded": True}
+                                                    )
+                solution = configs[0]
+            else:
+                configs = client.inverse_kinematics(robot, frame0_t0cf,
+                                                    options={
+                                                        "check_collision": True,
+                                                        "cull": False}
+                                                    )
+                solution = configs[IK_IDX]
+            if not solution:
+                self.instrumentation.fail('transition.no_solution')
+                raise ValueError("No solution for transition")
+            configurations.append(solution)
+            previous = solution
+
+        if cache is not None:
+            cache.put_transition(key, [c.joint_values for c in configurations])
+        return configurations
+
+    @timed('make_configurations_smooth')
+    def make_configurations_smooth(self, configurations, check_limits=False):
+        """Unwraps and centers the joint values, if ``check_limits`` is
+        ``True`` they are also shifted into the joint limits of the robot, and
+        a ``ValueError`` is raised for the ones that do not fit."""
+        limits = joint_limits(self.robot) if check_limits else None
+        return make_configurations_smooth(configurations, limits)
+
+    @timed('prepare')
+    def prepare(self, points3d, gradients, colors, reachability_map=None, workers=None, seeded=False,
+                order=False, decimation=None):
+        """Runs all stages on a drawing and returns the execution data.
+
+        Parameters
+        ----------
+        points3d : list of list of point
+            The points per path, relative to the sphere center.
+        gradients, colors : list of list
+            The gradient and color per point.
+        reachability_map, workers :
+            See :meth:`reduce_to_reachable`.
+        seeded : bool, optional
+            See :meth:`add_transition_between_paths_and_flatten`.
+        order : bool, optional
+            If ``True``, the paths are reordered with :meth:`order_paths`.
+        decimation : dict, optional
+            If given, the paths are first decimated with these tolerances,
+            see :func:`workshop_sjsu.planning.decimation.decimate_path`,
+            e.g. ``{"tolerance": 0.001}``.
+
+        Returns
+        -------
+        dict
+            The ``frames``, ``gradients``, ``colors``, ``configurations`` and
+            ``startends`` of the execution file.
+        """
+        if decimation is not None:
+            with self.instrumentation.stage('decimate'):
+                points3d, colors, gradients = decimate(points3d, colors, gradients, **decimation)
+
+        # 1. Move points to defined sphere center (in RCF) and make frames
+        with self.instrumentation.stage('create_frames'):
+            frames = translate_and_create_frames(points3d)
+
+        # 2. Reduce to only use buildable paths
+        configurations, indices2keep = self.reduce_to_reachable(frames, reachability_map, workers)
+
+        # remove also from frames, gradients and colors
+        frames = [frames[i] for i in indices2keep]
+        gradients = [gradients[i] for i in indices2keep]
+        colors = [colors[i] for i in indices2keep]
+
+        if order:
+            frames, gradients, colors, configurations = self.order_paths(frames, gradients, colors, configurations)
+
+        # 3. Connect the paths and smooth the joint values
+        F, G, C, J, S = self.add_transition_between_paths_and_flatten(frames, gradients, colors, configurations, seeded)
+        J = self.make_configurations_smooth(J)
+
+        data = {}
+        data['frames'] = F
+        data['gradients'] = G
+        data['colors'] = C
+        data['configurations'] = J
+        data['startends'] = S
+        return data
+
+    def stream(self, points3d, gradients, colors, reachability_map=None, seeded=False, decimation=None,
+               check_limits=False):
+        """Runs the stages on a drawing path by path, see
+        :mod:`workshop_sjsu.planning.streaming`.
+
+        Nothing is planned until the returned generator is consumed, then
+        every path is planned, connected and smoothed as soon as it is read,
+        so only one path is held in memory. The paths are not reordered.
+
+        Parameters
+        ----------
+        points3d, gradients, colors : iterable
+            The points, gradients and colors per path.
+        reachability_map, seeded, decimation :
+            See :meth:`prepare`.
+        check_limits : bool, optional
+            See :meth:`make_configurations_smooth`, the error is raised when the
+            segment is read.
+
+        Returns
+        -------
+        generator
+            The segments of the execution data, the keys are the ones of
+            :meth:`prepare`.
+
+        Examples
+        --------
+
+        >>> with ExecutionFileWriter(filepath) as writer:                         # doctest: +SKIP
+        ...     for segment in streaming.write(session.stream(*drawing), writer): # doctest: +SKIP
+        ...         pass                                                          # doctest: +SKIP
+        """
+        paths = streaming.iter_paths(points3d, gradients, colors)
+        if decimation is not None:
+            paths = streaming.decimate_paths(paths, **decimation)
+        paths = streaming.create_frames(paths)
+        paths = streaming.reachable_paths(self, paths, reachability_map)
+        segments = streaming.add_transitions(self, paths, seeded)
+        return streaming.smooth(segments, joint_limits(self.robot) if check_limits else None)
@@ -1,4 +1,5 @@
 import os
+import hashlib
 import compas
 from compas.robots import LocalPackageMeshLoader
 from compas.robots import RobotModel
@@ -11,6 +12,7 @@ from compas_fab.robots import CollisionMesh
 from compas_fab.robots import Robot
 
 from workshop_sjsu import DATA
+from workshop_sjsu.ur.kinematics.offset_wrist_kinematics import UR5e as UR5eKinematics
 from workshop_sjsu.ur.kinematics.analytical_inverse_kinematics import UR5AnalyticalIK
 from workshop_sjsu.ur.kinematics.analytical_inverse_kinematics import UR5eAnalyticalIK
 
@@ -30,14 +32,27 @@ def UR5e():
     return robot
 
 
-def sjsu_setup(client, camera=True):
-    tool = Tool.from_json(os.path.join(DATA, "tool.json"))
+def sjsu_setup(client, camera=True, cache=None, geometry=None):
+    """Loads the robot, the tool and the camera.
 
-    # TODO: convert to pybullet convex meshes?
+    A :class:`workshop_sjsu.planning.setup_cache.SetupCache` can be passed to
+    re-use the parsed tool, camera mesh and semantics of previous runs.
+
+    With a :class:`workshop_sjsu.planning.collision_geometry.CollisionGeometry`,
+    the links and the camera are checked with its simplified convex meshes.
+    """
+    client.collision_geometry = geometry
 
     # Load UR5
-    robot = client.load_robot(urdf_filename)
-    robot.semantics = RobotSemantics.from_srdf_file(srdf_filename, robot.model)
+    robot = client.load_robot(geometry.robot_urdf(urdf_filename) if geometry else urdf_filename)
+
+    if cache:
+        cache.ensure(srdf_filename, robot.model)
+        tool = cache.tool()
+        robot.semantics = cache.semantics(robot.model)
+    else:
+        tool = Tool.from_json(os.path.join(DATA, "tool.json"))
+        robot.semantics = RobotSemantics.from_srdf_file(srdf_filename, robot.model)
 
     # Update disabled collisions
     client.disabled_collisions = robot.semantics.disabled_collisions
@@ -46,8 +61,14 @@ def sjsu_setup(client, camera=True):
     robot.attach_tool(tool)
     scene = PlanningScene(robot)
 
-    if camera:
-        camera_mesh = Mesh.from_json(os.path.join(DATA, "camera_in_position.json"))
+    if camera and geometry:
+        # loaded directly, so that the parts of a convex decomposition stay separate
+        client.collision_objects['camera'] = [client.body_from_obj(geometry.camera())]
+    elif camera:
+        if cache:
+            camera_mesh = cache.camera_mesh()
+        else:
+            camera_mesh = Mesh.from_json(os.path.join(DATA, "camera_in_position.json"))
         cm = CollisionMesh(camera_mesh, 'camera')
         scene.add_collision_mesh(cm)
 
@@ -56,8 +77,98 @@ def sjsu_setup(client, camera=True):
 
 if not compas.IPY:
 
+    import numpy as np
+    import pybullet
+
     from compas_fab.backends import PyBulletClient
+    from workshop_sjsu.planning.collision_filter import CapsuleCollisionFilter
+
+    def sjsu_collision_filter(robot, camera=True, margin=0.01):
+        """Creates the capsule collision pre-filter for a robot set up with :func:`sjsu_setup`."""
+        obstacles = []
+        if camera:
+            obstacles.append(Mesh.from_json(os.path.join(DATA, "camera_in_position.json")))
+        loader = LocalPackageMeshLoader(DATA, 'ur_e_description')
+        disabled_collisions = robot.semantics.disabled_collisions if robot.semantics else None
+        return CapsuleCollisionFilter.from_robot(robot, UR5eKinematics(), loader, obstacles,
+                                                 disabled_collisions=disabled_collisions, margin=margin)
 
     class Client(PyBulletClient):
+        def __init__(self, *args, **kwargs):
+            self.ik_cache = kwargs.pop('ik_cache', None)
+            self.instrumentation = kwargs.pop('instrumentation', None)
+            self.collision_geometry = None
+            self._scene_fingerprints = {}
+            super(Client, self).__init__(*args, **kwargs)
+
         def inverse_kinematics(self, *args, **kwargs):
-            return UR5eAnalyticalIK(self)(*args, **kwargs)
+            return UR5eAnalyticalIK(self, cache=self.ik_cache, instrumentation=self.instrumentation)(*args, **kwargs)
+
+        def scene_fingerprint(self, robot, precision=6):
+            """Returns a hash of the content of the scene: the collision shapes,
+            mesh vertices and poses of the robot's links and of every collision
+            object, the joints, and the collision meshes and frame of the
+            attached tool.
+
+            PyBullet does not return the faces of its meshes, the ones of the
+            tool are hashed from its compas meshes. The hash is computed once
+            per robot, tool and set of bodies.
+            """
+            tool = robot.attached_tool
+            bodies = sorted((name, tuple(ids)) for objects in (self.collision_objects, self.attached_collision_objects)
+                            for name, ids in objects.items())
+            memo = (robot.name, id(tool), tuple(bodies))
+            if memo not in self._scene_fingerprints:
+                digest = hashlib.sha1()
+
+                def update(values):
+                    # + 0. turns -0. into 0.
+                    digest.update(np.ascontiguousarray(np.round(np.asarray(values, dtype=float), precision) + 0.).tobytes())
+
+                def update_body(body_id):
+                    kwargs = {'physicsClientId': self.client_id}
+                    position, orientation = pybullet.getBasePositionAndOrientation(body_id, **kwargs)
+                    update(list(position) + list(orientation))
+                    for link in range(-1, pybullet.getNumJoints(body_id, **kwargs)):
+                        if link >= 0:
+                            info = pybullet.getJointInfo(body_id, link, **kwargs)
+                            digest.update(info[1] + info[12])
+                            update([info[2]] + list(info[8:11]) + list(info[13]) + list(info[14]) + list(info[15]))
+                        # the filenames of meshes loaded by compas_fab are temporary
+                        for shape in pybullet.getCollisionShapeData(body_id, link, **kwargs):
+                            update([shape[2]] + list(shape[3]) + list(shape[5]) + list(shape[6]))
+                            if shape[2] == pybullet.GEOM_MESH:
+                                update(pybullet.getMeshData(body_id, link, **kwargs)[1])
+
+                update_body(self.get_uid(self.get_cached_robot(robot)))
+                for name, ids in bodies:
+                    digest.update(name.encode('utf-8'))
+                    for body_id in ids:
+                        update_body(body_id)
+                if tool:
+                    update(list(tool.frame.point) + list(tool.frame.xaxis) + list(tool.frame.yaxis))
+                    for attached in tool.attached_collision_meshes:
+                        mesh = attached.collision_mesh
+                        digest.update(attached.link_name.encode('utf-8'))
+                        update(list(mesh.frame.point) + list(mesh.frame.xaxis) + list(mesh.frame.yaxis))
+                        vertices, faces = mesh.mesh.to_vertices_and_faces()
+                        update(vertices)
+                        digest.update(repr(faces).encode('utf-8'))
+                self._scene_fingerprints[memo] = digest.hexdigest()
+            return self._scene_fingerprints[memo]
+
+        def check_collisions_filtered(self, robot, configuration, check_objects=True, link_pairs=None):
+            """Like ``check_collisions``, but only checks the collision objects if
+            ``check_objects`` is ``True``, and only the given pairs of link names
+            for self collision.
+            """
+            cached_robot = self.get_cached_robot(robot)
+            body_id = self.get_uid(cached_robot)
+            joint_ids = self._get_joint_ids_by_name(configuration.joint_names, cached_robot)
+            self._set_joint_positions(joint_ids, configuration.joint_values, body_id)
+            if check_objects:
+                self.check_collision_with_objects(robot)
+            for link_1_name, link_2_name in link_pairs or []:
+                link_1_id = self._get_link_id_by_name(link_1_name, cached_robot)
+                link_2_id = self._get_link_id_by_name(link_2_name, cached_robot)
+                self._check_collision(body_id, link_1_name, body_id, link_2_name, link_1_id, link_2_id)
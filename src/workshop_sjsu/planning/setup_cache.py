@@ -0,0 +1,154 @@
+import io
+import os
+import sys
+import hashlib
+import marshal
+
+import compas
+from compas.datastructures import Mesh
+from compas.geometry import Frame
+from compas_fab.robots import RobotSemantics
+from compas_fab.robots import Tool
+
+from workshop_sjsu import DATA
+from workshop_sjsu import CACHE
+
+# the files the collision geometry of the robot, the tool and the camera are built from
+SOURCES = [os.path.join(DATA, "tool.json"),
+           os.path.join(DATA, "camera_in_position.json"),
+           os.path.join(DATA, "ur_e_description"),
+           os.path.join(DATA, "ur5_e_moveit_config")]
+
+
+def source_hash(sources=None):
+    """Returns a hash of the content of the source files and directories,
+    the python version and the compas version.
+
+    The ``visual`` meshes of the robot do not change the planning, and they
+    are most of the bytes of the sources, so they are not hashed.
+    """
+    h = hashlib.sha1()
+    h.update(("%s|%s" % (sys.version, compas.__version__)).encode('utf-8'))
+    filepaths = []
+    for source in sources or SOURCES:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs[:] = [d for d in dirs if d != 'visual']
+                filepaths += [os.path.join(root, f) for f in files]
+        else:
+            filepaths.append(source)
+    for filepath in sorted(filepaths):
+        h.update(os.path.relpath(filepath, DATA).replace(os.sep, '/').encode('utf-8'))
+        with io.open(filepath, 'rb') as fp:
+            h.update(fp.read())
+    return h.hexdigest()
+
+
+def _mesh_state(mesh):
+    return {'attributes': dict(mesh.attributes),
+            'dva': dict(mesh.default_vertex_attributes),
+            'dea': dict(mesh.default_edge_attributes),
+            'dfa': dict(mesh.default_face_attributes),
+            'vertex': mesh.vertex,
+            'face': mesh.face,
+            'halfedge': mesh.halfedge,
+            'facedata': mesh.facedata,
+            'edgedata': mesh.edgedata,
+            'max_vertex': mesh._max_vertex,
+            'max_face': mesh._max_face}
+
+
+def _mesh_from_state(state):
+    # assigns the halfedge structure directly instead of adding face by face
+    mesh = Mesh()
+    mesh.attributes.update(state['attributes'])
+    mesh.default_vertex_attributes.update(state['dva'])
+    mesh.default_edge_attributes.update(state['dea'])
+    mesh.default_face_attributes.update(state['dfa'])
+    mesh.vertex = state['vertex']
+    mesh.face = state['face']
+    mesh.halfedge = state['halfedge']
+    mesh.facedata = state['facedata']
+    mesh.edgedata = state['edgedata']
+    mesh._max_vertex = state['max_vertex']
+    mesh._max_face = state['max_face']
+    return mesh
+
+
+class SetupCache(object):
+    """A binary snapshot of the parsed tool, camera mesh and robot semantics.
+
+    The snapshot is keyed by :func:`source_hash`, it is rebuilt from the
+    source files whenever one of them changes. It is written with
+    :mod:`marshal`, which is only readable by the same python version.
+
+    Parameters
+    ----------
+    filepath : str, optional
+        The file of the snapshot, defaults to ``setup_cache.bin`` in
+        :data:`workshop_sjsu.CACHE`.
+
+    Examples
+    --------
+
+    >>> cache = SetupCache()        # doctest: +SKIP
+    >>> tool = cache.tool()         # doctest: +SKIP
+    """
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or os.path.join(CACHE, "setup_cache.bin")
+        self.key = source_hash()
+        self.state = None
+        if os.path.exists(self.filepath):
+            try:
+                with io.open(self.filepath, 'rb') as fp:
+                    state = marshal.load(fp)
+            except (EOFError, ValueError, TypeError):
+                state = None
+            if state and state.get('key') == self.key:
+                self.state = state
+        self.hit = self.state is not None
+
+    def _build(self, srdf_filename, robot_model):
+        tool = Tool.from_json(os.path.join(DATA, "tool.json"))
+        camera_mesh = Mesh.from_json(os.path.join(DATA, "camera_in_position.json"))
+        semantics = RobotSemantics.from_srdf_file(srdf_filename, robot_model)
+        link = tool.tool_model.links[0]
+        # every part is marshalled on its own, so each call gets fresh objects
+        self.state = {
+            'key': self.key,
+            'tool': marshal.dumps({'name': tool.name,
+                                   'link_name': tool.link_name,
+                                   'frame': [list(tool.frame.point), list(tool.frame.xaxis), list(tool.frame.yaxis)],
+                                   'visual': _mesh_state(link.visual[0].geometry.shape.geometry),
+                                   'collision': _mesh_state(link.collision[0].geometry.shape.geometry)}),
+            'camera': marshal.dumps(_mesh_state(camera_mesh)),
+            'semantics': marshal.dumps({'groups': semantics.groups,
+                                        'main_group_name': semantics.main_group_name,
+                                        'passive_joints': semantics.passive_joints,
+                                        'end_effectors': semantics.end_effectors,
+                                        'disabled_collisions': semantics.disabled_collisions,
+                                        'group_states': semantics.group_states}),
+        }
+        directory = os.path.dirname(self.filepath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with io.open(self.filepath, 'wb') as fp:
+            marshal.dump(self.state, fp)
+
+    def ensure(self, srdf_filename, robot_model):
+        """Builds and writes the snapshot if it is missing or outdated."""
+        if self.state is None:
+            self._build(srdf_filename, robot_model)
+
+    def tool(self):
+        data = marshal.loads(self.state['tool'])
+        visual = _mesh_from_state(data['visual'])
+        collision = _mesh_from_state(data['collision'])
+        return Tool(visual, Frame(*data['frame']), collision, name=data['name'], link_name=data['link_name'])
+
+    def camera_mesh(self):
+        return _mesh_from_state(marshal.loads(self.state['camera']))
+
+    def semantics(self, robot_model):
+        return RobotSemantics(robot_model, **marshal.loads(self.state['semantics']))
@@ -0,0 +1,195 @@
+"""Generator stages of the planning pipeline.
+
+Every stage takes an iterable and yields one path, or one segment of the
+flattened execution data, at a time, so the stages can be chained and
+only hold the path that is passing through::
+
+    paths = iter_paths(points3d, gradients, colors)
+    paths = create_frames(paths)
+    paths = reachable_paths(session, paths)
+    segments = add_transitions(session, paths)
+    segments = smooth(segments)
+    segments = write(segments, writer)
+
+A path is a dict with its ``index`` in the drawing, ``points``,
+``gradients``, ``colors`` and, once planned, ``frames`` and
+``joint_values``. A segment has the keys of the execution file:
+``frames``, ``gradients``, ``colors``, ``configurations`` (joint values)
+and ``startends``.
+"""
+import math
+import numpy as np
+
+from compas.robots import Configuration
+
+from workshop_sjsu.planning.decimation import decimate_path
+from workshop_sjsu.planning.parallel import reachable_joint_values
+from workshop_sjsu.planning.parallel import tool0_frames_numpy
+from workshop_sjsu.planning.utilities import translate_and_create_frames
+from workshop_sjsu.planning.utilities import create_transition_frames_between_paths
+from workshop_sjsu.planning.utilities import check_limits
+
+
+def iter_paths(points3d, gradients, colors):
+    """Yields the paths of a drawing, the arguments can be any iterables."""
+    for index, (points, gradients_per_path, colors_per_path) in enumerate(zip(points3d, gradients, colors)):
+        yield {'index': index, 'points': points, 'gradients': gradients_per_path, 'colors': colors_per_path}
+
+
+def decimate_paths(paths, **tolerances):
+    """Decimates every path, see :func:`workshop_sjsu.planning.decimation.decimate_path`."""
+    for path in paths:
+        indices = decimate_path(path['points'], path['colors'], path['gradients'], **tolerances)
+        path = dict(path)
+        for key in ('points', 'gradients', 'colors'):
+            path[key] = [path[key][i] for i in indices]
+        yield path
+
+
+def create_frames(paths):
+    """Adds the ``frames`` on the sphere to every path."""
+    for path in paths:
+        path = dict(path)
+        path['frames'] = translate_and_create_frames([path['points']])[0]
+        yield path
+
+
+def reachable_paths(session, paths, reachability_map=None):
+    """Adds the ``joint_values`` to every path that is reachable without
+    collision, and drops the others.
+
+    The checks are the same as in
+    :meth:`workshop_sjsu.planning.session.PlanningSession.reduce_to_reachable`,
+    path by path.
+    """
+    cache = session.planning_cache
+    num_paths = num_kept = num_frames = num_configurations = 0
+    for path in paths:
+        frames = path['frames']
+        num_paths += 1
+        num_frames += len(frames)
+        found = False
+        if cache is not None:
+            key = cache.path_key(session.scene_key, frames)
+            found, joint_values = cache.get_path(key)
+            if found:
+                session.instrumentation.count('paths.cached')
+        if not found:
+            T_t0cf = tool0_frames_numpy(session.robot, frames)
+            first = reachability_map.triage([frames])[0] if reachability_map is not None else None
+            joint_values = reachable_joint_values(session.client, session.robot, T_t0cf, session.kinematics,
+                                                  session.instrumentation, first)
+            if cache is not None:
+                cache.put_path(key, joint_values)
+        if joint_values is None:
+            continue
+
+        num_kept += 1
+        num_configurations += len(joint_values)
+        path = dict(path)
+        path['joint_values'] = joint_values
+        yield path
+
+    print("Kept %i of %i paths, removing %i of %i frames, since they are not reachable." %
+          (num_kept, num_paths, num_frames - num_configurations, num_frames))
+
+
+def _segment(frames, gradients, colors, joint_values, startend=True):
+    startends = [0] * len(frames)
+    if startend and startends:
+        startends[0] = startends[-1] = 1
+    return {'frames': list(frames), 'gradients': list(gradients), 'colors': list(colors),
+            'configurations': list(joint_values), 'startends': startends}
+
+
+def add_transitions(session, paths, seeded=False, num_offs=2):
+    """Yields the paths with the transitions between them along the sphere,
+    led in and out by ``num_offs`` copies of the first and last waypoint,
+    see :meth:`workshop_sjsu.planning.session.PlanningSession.add_transition_between_paths_and_flatten`.
+    """
+    joint_names = session.robot.get_configurable_joint_names()
+    previous = None
+    count = 0
+    for path in paths:
+        frames = path['frames']
+        if previous is None:
+            lead_in = _segment([frames[0]] * num_offs, [0] * num_offs, [(0, 0, 0)] * num_offs,
+                               [path['joint_values'][0]] * num_offs, startend=False)
+        else:
+            transition_frames = create_transition_frames_between_paths([previous['frames'], frames])[0]
+            start_configuration = Configuration.from_revolute_values(previous['joint_values'][-1],
+                                                                     joint_names=joint_names)
+            configurations = session._transition_configurations(transition_frames, start_configuration, seeded)
+            transition = _segment(transition_frames, [0] * len(transition_frames), [(0, 0, 0)] * len(transition_frames),
+                                  [c.joint_values for c in configurations])
+            count += len(transition_frames)
+            yield transition
+        segment = _segment(frames, path['gradients'], path['colors'], path['joint_values'])
+        if previous is None:
+            # the lead-in is part of the first segment, the smoothing is started with it
+            segment = dict((key, lead_in[key] + segment[key]) for key in segment)
+        count += len(frames)
+        yield segment
+        previous = path
+
+    if previous is not None:
+        print("Now %d frames with transitions" % count)
+        yield _segment([previous['frames'][-1]] * num_offs, [0] * num_offs, [(0, 0, 0)] * num_offs,
+                       [previous['joint_values'][-1]] * num_offs, startend=False)
+
+
+def smooth(segments, limits=None):
+    """Unwraps the joint values across the segments and centers them.
+
+    Unlike :func:`workshop_sjsu.planning.utilities.smooth_joint_values`,
+    which centers the range of the whole trajectory, the 2 pi shift of
+    every joint is fixed by the range of the first segment. A
+    ``ValueError`` is raised as soon as values are outside the ``limits``,
+    see :func:`workshop_sjsu.planning.utilities.check_limits`.
+    """
+    two_pi = 2 * math.pi
+    last = shift = None
+    if limits is not None:
+        lower, upper = np.asarray(limits, dtype=float).T
+    for segment in segments:
+        q = np.array(segment['configurations'], dtype=float).reshape(-1, 6)
+        if not len(q):
+            yield segment
+            continue
+        if last is not None:
+            q = np.unwrap(np.vstack([last, q]), axis=0)[1:]
+        else:
+            q = np.unwrap(q, axis=0)
+        last = q[-1].copy()
+        q[:, -1] = 0
+        if shift is None:
+            shift = two_pi * np.round((q.min(axis=0) + q.max(axis=0)) / (2 * two_pi))
+            if limits is not None:
+                shifts = np.array([0., two_pi, -two_pi])[:, None]
+                excess = (np.maximum(lower - (q.min(axis=0) - shift - shifts), 0) +
+                          np.maximum((q.max(axis=0) - shift - shifts) - upper, 0))
+                shift = shift + shifts[np.argmin(excess, axis=0), 0]
+        q -= shift
+        if limits is not None:
+            check_limits(q, limits)
+        segment = dict(segment)
+        segment['configurations'] = q.tolist()
+        yield segment
+
+
+def write(segments, writer):
+    """Writes every segment with an
+    :class:`workshop_sjsu.ur.execution_file.ExecutionFileWriter`, and passes
+    it on once it is written."""
+    for segment in segments:
+        writer.write(segment)
+        yield segment
+
+
+def collect(segments):
+    """Concatenates the segments into the data of one execution file."""
+    data = {'frames': [], 'gradients': [], 'colors': [], 'configurations': [], 'startends': []}
+    for segment in segments:
+        for key in data:
+            data[key].extend(segment[key])
+    return data
@@ -1,14 +1,24 @@
+import math
+import compas
 from compas.geometry import Point
 from compas.geometry import Plane
 from compas.geometry import Frame
 from compas.geometry import Vector
 from compas.geometry import angle_points
 from compas.geometry import Rotation
+from compas.robots import Configuration
 from workshop_sjsu.planning import SPHERE_CENTER
 from workshop_sjsu.planning import SPHERE_RADIUS
 
+if not compas.IPY:
+    import numpy as np
+    from workshop_sjsu.ur.kinematics.offset_wrist_numpy import frames_to_numpy
+    from workshop_sjsu.ur.kinematics.offset_wrist_numpy import numpy_to_frames
+
 
 def translate_and_create_frames(points3d):
+    if not compas.IPY:
+        return [numpy_to_frames(T) for T in translate_and_create_frames_numpy(points3d)]
     frames = []
     for points_per_path in points3d:
         frames.append([])
@@ -21,6 +31,56 @@ def translate_and_create_frames(points3d):
     return frames
 
 
+def sphere_frames_numpy(points):
+    """Returns the frames of points on the sphere as (N, 4, 4) array.
+
+    The frames are the same as ``Frame.from_plane(Plane(point, point - SPHERE_CENTER))``,
+    the point is the origin and the normal is the z-axis.
+
+    Parameters
+    ----------
+    points : array_like
+        (N, 3) points in the robot coordinate frame.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    normals = points - np.asarray(SPHERE_CENTER)
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    x, y, z = normals.T
+    zeros = np.zeros_like(x)
+    candidates = np.stack([np.stack([-y, x, zeros], axis=1),
+                           np.stack([zeros, -z, y], axis=1),
+                           np.stack([z, zeros, -x], axis=1)], axis=1)
+    idx = np.argmax(np.linalg.norm(candidates, axis=2), axis=1)
+    xaxis = candidates[np.arange(len(points)), idx]
+    xaxis /= np.linalg.norm(xaxis, axis=1)[:, None]
+    yaxis = np.cross(normals, xaxis)
+    T = np.tile(np.eye(4), (len(points), 1, 1))
+    T[:, :3, 0] = xaxis
+    T[:, :3, 1] = yaxis
+    T[:, :3, 2] = normals
+    T[:, :3, 3] = points
+    return T
+
+
+def translate_and_create_frames_numpy(points3d):
+    """Array version of :func:`translate_and_create_frames`.
+
+    Parameters
+    ----------
+    points3d : list of array_like
+        The (N, 3) points per path, relative to the sphere center.
+
+    Returns
+    -------
+    list of :class:`numpy.ndarray`
+        The (N, 4, 4) frames per path.
+    """
+    counts = [len(points_per_path) for points_per_path in points3d]
+    points = [point for points_per_path in points3d for point in points_per_path]
+    T = sphere_frames_numpy(np.asarray(points, dtype=float).reshape(-1, 3) + np.asarray(SPHERE_CENTER))
+    return np.split(T, np.cumsum(counts)[:-1])
+
+
 def create_transition_frames_on_sphere(start_frame, end_frame):
     """
     """
@@ -49,3 +109,160 @@ def create_transition_frames_on_sphere(start_frame, end_frame):
             plane = Plane(p, normal)
             transition_frames.append(Frame.from_plane(plane))
     return transition_frames
+
+
+def create_transition_frames_on_sphere_numpy(start_frames, end_frames, max_dist=0.02):
+    """Array version of :func:`create_transition_frames_on_sphere` for many
+    transitions at once.
+
+    The points of all arcs are sampled with one spherical linear
+    interpolation, with at most ``max_dist`` between two points.
+
+    Parameters
+    ----------
+    start_frames, end_frames : :class:`numpy.ndarray`
+        The (M, 4, 4) start and end frames of the transitions.
+
+    Returns
+    -------
+    tuple
+        The (K, 4, 4) frames of all transitions and the (M,) number of
+        frames per transition.
+    """
+    start_frames = np.asarray(start_frames, dtype=float).reshape(-1, 4, 4)
+    end_frames = np.asarray(end_frames, dtype=float).reshape(-1, 4, 4)
+    O = np.asarray(SPHERE_CENTER)
+    a = start_frames[:, :3, 3] - O
+    b = end_frames[:, :3, 3] - O
+    radius = np.linalg.norm(a, axis=1)
+    ua = a / radius[:, None]
+    ub = b / np.linalg.norm(b, axis=1)[:, None]
+    angle = np.arccos(np.clip(np.einsum('ij,ij->i', ua, ub), -1., 1.))
+    num = (angle * SPHERE_RADIUS / max_dist).astype(int)
+    arcs = num >= 2
+    counts = np.where(arcs, num, 2)
+
+    # the arc's unit vector perpendicular to a in the plane of a and b
+    ortho = ub - ua * np.cos(angle)[:, None]
+    ortho /= np.maximum(np.linalg.norm(ortho, axis=1), 1e-12)[:, None]
+
+    transition = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(len(transition)) - np.repeat(np.cumsum(counts) - counts, counts)
+    theta = angle[transition] * step / np.maximum(counts[transition] - 1, 1)
+    points = O + radius[transition, None] * (ua[transition] * np.cos(theta)[:, None] +
+                                             ortho[transition] * np.sin(theta)[:, None])
+    T = sphere_frames_numpy(points)
+
+    # too short arcs only consist of copies of the start and end frame
+    first = np.cumsum(counts) - counts
+    short = np.flatnonzero(~arcs)
+    T[first[short]] = start_frames[short]
+    T[first[short] + 1] = end_frames[short]
+    return T, counts
+
+
+def create_transition_frames_between_paths(frames):
+    """Returns the transition frames from the end of every path to the start
+    of the next one, see :func:`create_transition_frames_on_sphere`.
+
+    Parameters
+    ----------
+    frames : list of list of :class:`compas.geometry.Frame`
+        The frames per path.
+
+    Returns
+    -------
+    list of list of :class:`compas.geometry.Frame`
+        One list of transition frames less than there are paths.
+    """
+    if compas.IPY:
+        return [create_transition_frames_on_sphere(path1[-1], path2[0]) for path1, path2 in zip(frames[:-1], frames[1:])]
+    if len(frames) < 2:
+        return []
+    T, counts = create_transition_frames_on_sphere_numpy(frames_to_numpy([path[-1] for path in frames[:-1]]),
+                                                         frames_to_numpy([path[0] for path in frames[1:]]))
+    transition_frames = numpy_to_frames(T)
+    offsets = np.cumsum(counts) - counts
+    return [transition_frames[o:o + c] for o, c in zip(offsets, counts)]
+
+
+def joint_limits(robot):
+    """Returns the (lower, upper) limits of the configurable joints of a robot."""
+    return [(joint.limit.lower, joint.limit.upper) for joint in robot.get_configurable_joints()]
+
+
+def smooth_joint_values(joint_values, limits=None):
+    """Unwraps a trajectory of joint values and centers every joint's range.
+
+    Every joint is unwrapped cumulatively so that consecutive values never
+    differ by more than pi, then the whole joint is shifted by a multiple of
+    2 pi so that its range is centered around zero. The last joint is set
+    to zero.
+
+    Parameters
+    ----------
+    joint_values : array_like
+        (N, 6) joint values, they are not modified.
+    limits : list of tuple, optional
+        The (lower, upper) limits per joint, see :func:`joint_limits`. If
+        given, joints whose range exceeds the limits are shifted by 2 pi if
+        that fits them in.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        (N, 6) joint values.
+
+    Raises
+    ------
+    ValueError
+        If joint values are still outside the ``limits``, they are never
+        moved silently, see :func:`outside_limits`.
+    """
+    q = np.unwrap(np.array(joint_values, dtype=float).reshape(-1, 6), axis=0)
+    q[:, -1] = 0
+    if not len(q):
+        return q
+
+    two_pi = 2 * math.pi
+    center = q.min(axis=0) + q.max(axis=0)
+    q -= two_pi * np.round(center / (2 * two_pi))
+
+    if limits is not None:
+        lower, upper = np.asarray(limits, dtype=float).T
+        shifts = np.array([0., -two_pi, two_pi])[:, None]
+        excess = (np.maximum(lower - (q.min(axis=0) + shifts), 0) +
+                  np.maximum((q.max(axis=0) + shifts) - upper, 0))
+        q += shifts[np.argmin(excess, axis=0), 0]
+        check_limits(q, limits)
+    return q
+
+
+def outside_limits(joint_values, limits):
+    """Returns a (N,) mask of the joint values with a joint outside the
+    (lower, upper) ``limits``.
+
+    Examples
+    --------
+
+    >>> outside_limits([[0, 0, 0, 0, 0, 0], [4, 0, 0, 0, 0, 0]], [(-3, 3)] * 6).tolist()
+    [False, True]
+    """
+    q = np.asarray(joint_values, dtype=float).reshape(-1, 6)
+    lower, upper = np.asarray(limits, dtype=float).T
+    return np.any((q < lower) | (q > upper), axis=1)
+
+
+def check_limits(joint_values, limits):
+    """Raises a ``ValueError`` that lists the configurations outside the
+    ``limits``, see :func:`outside_limits`."""
+    indices = np.flatnonzero(outside_limits(joint_values, limits))
+    if len(indices):
+        raise ValueError("%i of %i configurations are outside the joint limits, at %s" % (
+            len(indices), len(np.reshape(joint_values, (-1, 6))), indices[:10].tolist()))
+
+
+def make_configurations_smooth(configurations, limits=None):
+    """Returns new configurations with the joint values of :func:`smooth_joint_values`."""
+    joint_values = smooth_joint_values([c.joint_values for c in configurations], limits)
+    return [Configuration.from_revolute_values(j) for j in joint_values.tolist()]
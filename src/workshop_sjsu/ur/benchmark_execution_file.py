@@ -0,0 +1,85 @@
+import io
+import os
+import sys
+import json
+import time
+import tempfile
+
+import numpy as np
+import compas
+from compas.geometry import Frame
+from compas.robots import Configuration
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(path)
+
+from workshop_sjsu.ur import execution_file
+
+
+def random_execution_data(count, seed=0):
+    """Returns execution data of ``count`` random waypoints, as written by the planning."""
+    rng = np.random.RandomState(seed)
+    points = rng.uniform(-1, 1, (count, 3)).tolist()
+    joint_values = rng.uniform(-np.pi, np.pi, (count, 6)).tolist()
+    startends = np.zeros(count, dtype=int)
+    startends[::20] = 1
+    return {'frames': [Frame(point, [1, 0, 0], [0, 1, 0]) for point in points],
+            'gradients': rng.uniform(0, 1, count).tolist(),
+            'colors': rng.uniform(0, 1, (count, 3)).tolist(),
+            'configurations': [Configuration.from_revolute_values(q) for q in joint_values],
+            'startends': startends.tolist()}
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.time()
+        function()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+def time_loads(count, repeat=5):
+    """Returns the file sizes and the load times of the robot's configurations
+    and of the proxy's colors and gradients, from JSON and from a binary file."""
+    directory = tempfile.mkdtemp()
+    json_filepath = os.path.join(directory, 'execution.json')
+    filepath = os.path.join(directory, 'execution.sjsu')
+    compas.json_dump(random_execution_data(count), json_filepath)
+    execution_file.from_json(json_filepath, filepath)
+
+    def json_configurations():
+        return compas.json_load(json_filepath)['configurations']
+
+    def json_colors():
+        with io.open(json_filepath, 'r') as fp:
+            data = json.load(fp)
+        return data['colors'], data['gradients'], len(data['frames'])
+
+    def binary_configurations():
+        return np.array(execution_file.ExecutionFile(filepath).configurations)
+
+    def binary_colors():
+        execution = execution_file.ExecutionFile(filepath)
+        return np.array(execution.colors), np.array(execution.gradients), len(execution.frames)
+
+    results = {'json_size': os.path.getsize(json_filepath),
+               'binary_size': os.path.getsize(filepath),
+               'json_configurations': best_of(json_configurations, repeat),
+               'binary_configurations': best_of(binary_configurations, repeat),
+               'json_colors': best_of(json_colors, repeat),
+               'binary_colors': best_of(binary_colors, repeat)}
+    os.remove(json_filepath)
+    os.remove(filepath)
+    return results
+
+
+if __name__ == "__main__":
+
+    for count in (1000, 10000, 100000):
+        r = time_loads(count)
+        print("%i waypoints, JSON %.1f MB, binary %.1f MB" % (count, r['json_size'] / 1e6, r['binary_size'] / 1e6))
+        for consumer in ('configurations', 'colors'):
+            json_time, binary_time = r['json_' + consumer], r['binary_' + consumer]
+            print("  %-15s JSON %8.4f s, binary %8.4f s (%.0fx)" % (
+                consumer, json_time, binary_time, json_time / max(binary_time, 1e-6)))
@@ -0,0 +1,102 @@
+import io
+import os
+import re
+import sys
+import time
+
+import numpy as np
+from compas.robots import Configuration
+
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(path)
+
+from workshop_sjsu.ur.utilities import URScriptHelper
+from workshop_sjsu.ur.utilities import write_script
+
+
+def concatenated_script(ur, configurations, velocity, radius, acceleration, startends):
+    """The previous ``send_configurations``, which concatenated the program."""
+    script = ""
+    for i, config in enumerate(configurations):
+        config = config.copy()
+        if i == 0:
+            script += 'movej([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], v=%.4f, r=%.4f)\n' % tuple(config.joint_values + [velocity, radius])
+        elif not startends[i]:
+            script += 'movel([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], v=%.4f, r=%.4f)\n' % tuple(config.joint_values + [velocity, radius])
+        else:
+            script += 'movel([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], a=%.4f, v=%.4f)\n' % tuple(config.joint_values + [acceleration, velocity])
+        script += 'socket_send_int(%i)\n' % i
+        script += 'textmsg("%i")\n' % i
+    return ur.wrap_script(script)
+
+
+def time_generation(count, seed=0):
+    """Returns the times of the concatenated and the streamed script of
+    ``count`` waypoints, and of the streamed script of a joint values array."""
+    rng = np.random.RandomState(seed)
+    joint_values = rng.uniform(-np.pi, np.pi, (count, 6))
+    startends = np.zeros(count, dtype=bool)
+    startends[::20] = True
+    configurations = [Configuration.from_revolute_values(q) for q in joint_values.tolist()]
+    ur = URScriptHelper('10.0.0.99', 9111)
+    args = (0.01, 0.01, 0.1, startends.tolist())
+
+    t0 = time.time()
+    concatenated = concatenated_script(ur, configurations, *args)
+    t1 = time.time()
+    streamed = io.StringIO()
+    write_script(streamed.write, ur.iter_configurations(configurations, *args))
+    t2 = time.time()
+    array = io.StringIO()
+    write_script(array.write, ur.iter_configurations(joint_values, *args))
+    t3 = time.time()
+
+    assert concatenated == streamed.getvalue() == array.getvalue()
+    return t1 - t0, t2 - t1, t3 - t2
+
+
+def decode_compact(script):
+    """Returns the joint values and the start and end indices that the
+    ``run`` calls of a compact script move to, as the controller loop does."""
+    joint_values, stops = [], []
+    for d, indices, n, offset in re.findall(r'\trun\(\[([-\d,]*)\], \[([\d,]*)\], (\d+), (\d+)', script):
+        deltas = np.array(d.split(','), dtype=np.int64).reshape(-1, 6)
+        joint_values.append(np.cumsum(deltas, axis=0) / 1000000.0)
+        stops += [int(offset) + int(i) for i in indices.split(',')[:-1]]
+    return np.concatenate(joint_values), stops
+
+
+def compare_sizes(count, seed=0, chunk_size=150):
+    """Returns the sizes in bytes and statements of the program with a move
+    per waypoint and of the compact program, and the time to generate the
+    compact one, of ``count`` waypoints along smooth paths."""
+    rng = np.random.RandomState(seed)
+    # planned waypoints are close to each other
+    joint_values = np.cumsum(rng.uniform(-0.002, 0.002, (count, 6)), axis=0) + rng.uniform(-np.pi, np.pi, 6)
+    startends = np.zeros(count, dtype=bool)
+    startends[::20] = True
+    ur = URScriptHelper('10.0.0.99', 9111)
+    args = (0.01, 0.01, 0.1, startends)
+
+    script = ur.send_configurations(joint_values, *args)
+    t0 = time.time()
+    compact = ''.join(ur.iter_compact_configurations(joint_values, *args, chunk_size=chunk_size))
+    seconds = time.time() - t0
+
+    decoded, stops = decode_compact(compact)
+    assert np.allclose(decoded, joint_values, atol=5e-7, rtol=0)
+    assert stops == (np.flatnonzero(startends[1:]) + 1).tolist()
+    return (len(script), script.count('\n')), (len(compact), compact.count('\n')), seconds
+
+
+if __name__ == "__main__":
+
+    for count in (1000, 10000, 50000, 100000):
+        concatenated, streamed, array = time_generation(count)
+        print("%6i waypoints: concatenated %7.3f s, streamed %7.3f s (%.1fx), from array %7.3f s" % (
+            count, concatenated, streamed, concatenated / streamed, array))
+
+    for count in (1000, 10000, 50000):
+        (size, lines), (compact_size, compact_lines), seconds = compare_sizes(count)
+        print("%6i waypoints: %5.1f MB in %6i lines, compact %5.2f MB in %4i lines (%.1fx), generated in %.3f s" % (
+            count, size / 1e6, lines, compact_size / 1e6, compact_lines, size / compact_size, seconds))
@@ -0,0 +1,346 @@
+"""A columnar binary container for execution data.
+
+The file starts with a magic string, the length of a JSON header and the
+header, which lists the dtype, shape and byte offset of every column. The
+columns follow as raw, 64-byte aligned arrays, so that every column can be
+memory-mapped on its own:
+
+========================  ===============  ==================================
+column                    dtype / shape    content
+========================  ===============  ==================================
+``frames``                float64 (N,4,4)  tool frames as transformations
+``configurations``        float64 (N,6)    joint values
+``colors``                uint8 (N,3)      RGB, 0-255
+``gradients``             float32 (N,)     brightness gradient
+``startends``             uint8 (N/8,)     bitmask of path starts and ends
+========================  ===============  ==================================
+"""
+import io
+import os
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'SJSUEXEC'
+VERSION = 1
+ALIGNMENT = 64
+
+COLUMNS = ('frames', 'configurations', 'colors', 'gradients', 'startends')
+
+
+def is_execution_file(filepath):
+    """Returns ``True`` if the file is a binary execution file."""
+    with io.open(filepath, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+
+def _arrays(data):
+    """Returns the columns of execution data, with the startends as booleans."""
+    frames = data['frames']
+    if not isinstance(frames, np.ndarray):
+        T = np.zeros((len(frames), 4, 4))
+        T[:, :3, 0] = [list(frame.xaxis) for frame in frames]
+        T[:, :3, 1] = [list(frame.yaxis) for frame in frames]
+        T[:, :3, 2] = [list(frame.zaxis) for frame in frames]
+        T[:, :3, 3] = [list(frame.point) for frame in frames]
+        T[:, 3, 3] = 1
+        frames = T.reshape(-1, 4, 4)
+    configurations = data['configurations']
+    if not isinstance(configurations, np.ndarray):
+        configurations = [c.joint_values if hasattr(c, 'joint_values') else c for c in configurations]
+    return {'frames': np.asarray(frames, dtype=np.float64).reshape(-1, 4, 4),
+            'configurations': np.asarray(configurations, dtype=np.float64).reshape(-1, 6),
+            'colors': np.round(np.asarray(data['colors'], dtype=float).reshape(-1, 3) * 255).astype(np.uint8),
+            'gradients': np.asarray(data['gradients'], dtype=np.float32).ravel(),
+            'startends': np.asarray(data['startends'], dtype=bool).ravel()}
+
+
+def to_columns(data):
+    """Converts execution data into columns.
+
+    Parameters
+    ----------
+    data : dict
+        ``frames`` (list of :class:`compas.geometry.Frame` or (N, 4, 4) array),
+        ``configurations`` (list of :class:`compas.robots.Configuration` or
+        (N, 6) array), ``colors`` (RGB values between 0 and 1),
+        ``gradients`` and ``startends`` (0 or 1) per waypoint.
+
+    Returns
+    -------
+    dict
+        The arrays of :data:`COLUMNS` and the number of waypoints ``count``.
+    """
+    columns = _arrays(data)
+    columns['count'] = len(columns['startends'])
+    columns['startends'] = np.packbits(columns['startends'])
+    return columns
+
+
+def _header(count, columns):
+    """Returns the encoded header for the ``{name: (dtype, shape)}`` of the
+    columns, and the offset of every column."""
+    header = {'version': VERSION, 'count': count, 'columns': {}}
+
+    # the offsets depend on the header length, which depends on the offsets
+    offset = 0
+    while True:
+        start = len(MAGIC) + 4 + len(json.dumps(header).encode('utf-8')) + offset
+        start += -start % ALIGNMENT
+        position = start
+        for name in COLUMNS:
+            dtype, shape = columns[name]
+            header['columns'][name] = {'dtype': dtype.str, 'shape': list(shape), 'offset': position}
+            position += dtype.itemsize * int(np.prod(shape))
+            position += -position % ALIGNMENT
+        encoded = json.dumps(header).encode('utf-8')
+        if len(MAGIC) + 4 + len(encoded) <= start:
+            return encoded, dict((name, header['columns'][name]['offset']) for name in COLUMNS)
+        offset += ALIGNMENT
+
+
+def _write_header(fp, encoded):
+    fp.write(MAGIC)
+    fp.write(struct.pack('<I', len(encoded)))
+    fp.write(encoded)
+
+
+def save(filepath, data):
+    """Writes execution data, see :func:`to_columns`, to a binary execution file."""
+    columns = to_columns(data)
+    encoded, offsets = _header(columns['count'], dict((name, (columns[name].dtype, columns[name].shape))
+                                                      for name in COLUMNS))
+    with io.open(filepath, 'wb') as fp:
+        _write_header(fp, encoded)
+        for name in COLUMNS:
+            fp.write(b'\0' * (offsets[name] - fp.tell()))
+            fp.write(np.ascontiguousarray(columns[name]).tobytes())
+
+
+class ExecutionFileWriter(object):
+    """Writes a binary execution file incrementally.
+
+    Every :meth:`write` appends its rows to one spill file per column next
+    to ``filepath``, so only the rows of one call are held in memory. The
+    execution file is assembled from the spill files on :meth:`close` and
+    replaces ``filepath`` only once it is complete. Leaving the ``with``
+    block with an exception calls :meth:`abort` instead, so that a failed
+    run never leaves a truncated file behind.
+
+    Parameters
+    ----------
+    filepath : str
+    chunk_size : int, optional
+        The number of bytes copied at once when assembling the file.
+
+    Examples
+    --------
+
+    >>> with ExecutionFileWriter('drawing.sjsu') as writer:      # doctest: +SKIP
+    ...     for segment in segments:                             # doctest: +SKIP
+    ...         writer.write(segment)                            # doctest: +SKIP
+    """
+
+    def __init__(self, filepath, chunk_size=1 << 20):
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._spills = dict((name, io.open(self._spill_path(name), 'wb')) for name in COLUMNS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _spill_path(self, name):
+        return '%s.%s.part' % (self.filepath, name)
+
+    def write(self, data):
+        """Appends execution data, in the form accepted by :func:`to_columns`."""
+        arrays = _arrays(data)
+        for name in COLUMNS:
+            self._spills[name].write(np.ascontiguousarray(arrays[name]).tobytes())
+        self.count += len(arrays['startends'])
+
+    def _close_spills(self):
+        if self._spills is None:
+            return False
+        for spill in self._spills.values():
+            spill.close()
+        self._spills = None
+        return True
+
+    def abort(self):
+        """Removes the spill files without writing the execution file."""
+        if not self._close_spills():
+            return
+        for name in COLUMNS:
+            if os.path.exists(self._spill_path(name)):
+                os.remove(self._spill_path(name))
+
+    def close(self):
+        """Assembles the execution file and removes the spill files."""
+        if not self._close_spills():
+            return
+
+        dtypes = {'frames': (np.float64, (4, 4)), 'configurations': (np.float64, (6,)),
+                  'colors': (np.uint8, (3,)), 'gradients': (np.float32, ())}
+        columns = dict((name, (np.dtype(dtype), (self.count,) + shape)) for name, (dtype, shape) in dtypes.items())
+        columns['startends'] = (np.dtype(np.uint8), ((self.count + 7) // 8,))
+        encoded, offsets = _header(self.count, columns)
+
+        # a multiple of 8 rows, so that the startends are packed chunk by chunk
+        chunk_size = max(8, self.chunk_size - self.chunk_size % 8)
+        partial = '%s.%i.partial' % (self.filepath, os.getpid())
+        try:
+            with io.open(partial, 'wb') as fp:
+                _write_header(fp, encoded)
+                for name in COLUMNS:
+                    fp.write(b'\0' * (offsets[name] - fp.tell()))
+                    with io.open(self._spill_path(name), 'rb') as spill:
+                        while True:
+                            chunk = spill.read(chunk_size)
+                            if not chunk:
+                                break
+                            if name == 'startends':
+                                chunk = np.packbits(np.frombuffer(chunk, dtype=bool)).tobytes()
+                            fp.write(chunk)
+            os.replace(partial, self.filepath)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+            for name in COLUMNS:
+                if os.path.exists(self._spill_path(name)):
+                    os.remove(self._spill_path(name))
+
+
+class ExecutionFile(object):
+    """Reads the columns of a binary execution file on demand.
+
+    Parameters
+    ----------
+    filepath : str
+    mmap : bool, optional
+        If ``True``, the columns are memory-mapped instead of read.
+
+    Examples
+    --------
+
+    >>> execution = ExecutionFile('drawing.sjsu')           # doctest: +SKIP
+    >>> joint_values = execution.configurations             # doctest: +SKIP
+    """
+
+    def __init__(self, filepath, mmap=True):
+        self.filepath = filepath
+        self.mmap = mmap
+        with io.open(filepath, 'rb') as fp:
+            if fp.read(len(MAGIC)) != MAGIC:
+                raise ValueError("Not an execution file: %s" % filepath)
+            length, = struct.unpack('<I', fp.read(4))
+            self.header = json.loads(fp.read(length).decode('utf-8'))
+        self.count = self.header['count']
+        self._columns = {}
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name):
+        """Returns a column as array, memory-mapped or read on first access."""
+        if name not in self._columns:
+            info = self.header['columns'][name]
+            dtype = np.dtype(info['dtype'])
+            shape = tuple(info['shape'])
+            if self.mmap and int(np.prod(shape)):
+                array = np.memmap(self.filepath, dtype=dtype, mode='r', offset=info['offset'], shape=shape)
+            else:
+                with io.open(self.filepath, 'rb') as fp:
+                    fp.seek(info['offset'])
+                    array = np.frombuffer(fp.read(dtype.itemsize * int(np.prod(shape))), dtype=dtype).reshape(shape)
+            self._columns[name] = array
+        return self._columns[name]
+
+    @property
+    def frames(self):
+        return self.column('frames')
+
+    @property
+    def configurations(self):
+        return self.column('configurations')
+
+    @property
+    def colors(self):
+        return self.column('colors')
+
+    @property
+    def gradients(self):
+        return self.column('gradients')
+
+    @property
+    def startends(self):
+        return np.unpackbits(self.column('startends'))[:self.count].astype(bool)
+
+    def to_data(self):
+        """Returns the data in the form of the JSON execution file, with
+        :class:`compas.geometry.Frame` and :class:`compas.robots.Configuration` objects."""
+        from compas.geometry import Frame
+        from compas.robots import Configuration
+        return {'frames': [Frame(T[:3, 3].tolist(), T[:3, 0].tolist(), T[:3, 1].tolist()) for T in self.frames],
+                'gradients': self.gradients.astype(float).tolist(),
+                'colors': (self.colors / 255.).tolist(),
+                'configurations': [Configuration.from_revolute_values(q) for q in self.configurations.tolist()],
+                'startends': self.startends.astype(int).tolist()}
+
+
+def from_json(json_filepath, filepath):
+    """Converts a JSON execution file into a binary one."""
+    import compas
+    save(filepath, compas.json_load(json_filepath))
+
+
+def to_json(filepath, json_filepath):
+    """Converts a binary execution file into a JSON one."""
+    import compas
+    compas.json_dump(ExecutionFile(filepath, mmap=False).to_data(), json_filepath)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    data = {'frames': np.tile(np.eye(4), (10, 1, 1)),
+            'configurations': np.arange(60, dtype=float).reshape(10, 6),
+            'colors': [[1, 0.5, 0]] * 10,
+            'gradients': np.linspace(0, 1, 10),
+            'startends': [1, 0, 0, 0, 1, 1, 0, 0, 0, 1]}
+    filepath = os.path.join(tempfile.mkdtemp(), 'test.sjsu')
+    save(filepath, data)
+    assert is_execution_file(filepath)
+    execution = ExecutionFile(filepath)
+    assert len(execution) == 10
+    assert execution.configurations[3].tolist() == list(range(18, 24))
+    assert execution.colors[0].tolist() == [255, 128, 0]
+    assert execution.startends.astype(int).tolist() == data['startends']
+    assert np.allclose(execution.frames, data['frames'])
+    assert all(execution.header['columns'][name]['offset'] % ALIGNMENT == 0 for name in COLUMNS)
+
+    # written in three parts, with a startends bitmask that does not end on a byte
+    written = os.path.join(os.path.dirname(filepath), 'written.sjsu')
+    with ExecutionFileWriter(written, chunk_size=16) as writer:
+        for part in (slice(0, 3), slice(3, 9), slice(9, 10)):
+            writer.write(dict((key, np.asarray(value)[part]) for key, value in data.items()))
+    with io.open(filepath, 'rb') as a, io.open(written, 'rb') as b:
+        assert a.read() == b.read()
+
+    # a failed run leaves neither the execution file nor the spill files behind
+    failed = os.path.join(os.path.dirname(filepath), 'failed.sjsu')
+    try:
+        with ExecutionFileWriter(failed) as writer:
+            writer.write(dict((key, np.asarray(value)[:3]) for key, value in data.items()))
+            raise ValueError
+    except ValueError:
+        pass
+    assert sorted(os.listdir(os.path.dirname(filepath))) == ['test.sjsu', 'written.sjsu']
@@ -3,8 +3,10 @@ from compas.robots import Configuration
 from compas_fab.backends.exceptions import BackendError
 from compas_fab.backends.interfaces import InverseKinematics
 from .utils import fit_within_bounds
+from .ik_cache import IKCache
 from .offset_wrist_kinematics import UR5
 from .offset_wrist_kinematics import UR5e
+from workshop_sjsu.instrumentation import DISABLED
 
 class AnalyticalInverseKinematics(InverseKinematics):
     """Create a custom InverseKinematicsSolver for a robot.
@@ -22,14 +24,57 @@ class AnalyticalInverseKinematics(InverseKinematics):
     --------
 
     >>> ik_solver = AnalyticalInverseKinematics()
+
+    Pass an :class:`IKCache` to re-use the solutions and collision verdicts
+    of frames that have been solved before.
+
+    >>> ik_solver = AnalyticalInverseKinematics(cache=IKCache(maxsize=1000))
+
+    With the option ``"seeded"`` and a ``start_configuration``, only the
+    shoulder/wrist/elbow branch of the start configuration is solved, and
+    the single solution is unwrapped to be closest to it. The returned
+    list then has one entry (or none if culled). The cache is not used in
+    this mode.
+
+    An :class:`workshop_sjsu.instrumentation.Instrumentation` counts the
+    calls, solutions per call, collision checks issued and skipped, and
+    the failures by reason.
     """
 
-    def __init__(self, client=None):
+    def __init__(self, client=None, cache=None, instrumentation=None):
         self.client = client
+        self.cache = cache
+        self.instrumentation = instrumentation or DISABLED
 
     def inverse_kinematics(self, robot, frame_RCF, start_configuration=None, group=None, options=None):
 
-        solutions = self._inverse_kinematics(frame_RCF)
+        check_collision = options and "check_collision" in options and options["check_collision"] is True
+        instrumentation = self.instrumentation
+        instrumentation.count('ik.calls')
+
+        if options and "seeded" in options and options["seeded"] is True and start_configuration:
+            return self.inverse_kinematics_seeded(robot, frame_RCF, start_configuration, check_collision, options)
+
+        entry = None
+        if self.cache is not None:
+            key = self.cache.key(frame_RCF, self.cache.identity(robot, self.client))
+            entry = self.cache.get(key)
+
+        if entry is None:
+            try:
+                solutions = self._inverse_kinematics(frame_RCF)
+            except ValueError:
+                instrumentation.fail('ik.no_solution')
+                if self.cache is not None:
+                    self.cache.put(key, None)
+                raise
+            collisions = None
+        else:
+            instrumentation.count('ik.cache_hits')
+            solutions, collisions = entry
+            if solutions is None:
+                instrumentation.fail('ik.no_solution')
+                raise ValueError("No solutions")
 
         # get smallest in numpy
         # new = []
@@ -44,12 +89,17 @@ class AnalyticalInverseKinematics(InverseKinematics):
         configurations = self.joint_angles_to_configurations(robot, solutions)
 
         # check collisions for all configurations (sets those to `None` that are not working)
-        if options and "check_collision" in options and options["check_collision"] is True:
-            for i, config in enumerate(configurations):
-                try:
-                    self.client.check_collisions(robot, config)
-                except BackendError:
-                    configurations[i] = None
+        if check_collision:
+            if collisions is None:
+                collisions = self.check_collisions(robot, configurations)
+                if self.cache is not None:
+                    self.cache.put(key, solutions, collisions)
+            else:
+                instrumentation.count('collision_checks.skipped.cache', sum(1 for c in configurations if c))
+            instrumentation.fail('ik.collision', sum(1 for collision in collisions if collision))
+            configurations = [None if collision else config for config, collision in zip(configurations, collisions)]
+        elif entry is None and self.cache is not None:
+            self.cache.put(key, solutions)
 
         # fit configurations within joint bounds
         #configurations = self.try_to_fit_configurations_between_bounds(robot, configurations)
@@ -58,11 +108,52 @@ class AnalyticalInverseKinematics(InverseKinematics):
         if options and "cull" in options and options["cull"] is True:
             configurations = [c for c in configurations if c is not None]
 
+        instrumentation.observe('ik.solutions_per_call', sum(1 for c in configurations if c is not None))
+        return configurations
+
+    def inverse_kinematics_seeded(self, robot, frame_RCF, start_configuration, check_collision, options):
+        try:
+            solution = self._inverse_kinematics_seeded(frame_RCF, start_configuration.joint_values)
+        except ValueError:
+            self.instrumentation.fail('ik.no_solution')
+            raise
+        configurations = self.joint_angles_to_configurations(robot, [solution])
+
+        if check_collision and self.check_collisions(robot, configurations)[0]:
+            self.instrumentation.fail('ik.collision')
+            configurations[0] = None
+
+        if options and "cull" in options and options["cull"] is True:
+            configurations = [c for c in configurations if c is not None]
+
+        self.instrumentation.observe('ik.solutions_per_call', sum(1 for c in configurations if c is not None))
         return configurations
 
+    def check_collisions(self, robot, configurations):
+        """Returns the collision verdict of every configuration, ``None`` for missing ones."""
+        collisions = [None for _ in configurations]
+        indices = [i for i, config in enumerate(configurations) if config]
+        if not indices:
+            return collisions
+
+        self.instrumentation.count('collision_checks.issued', len(indices))
+        for i in indices:
+            collisions[i] = self.in_collision(robot, configurations[i])
+        return collisions
+
+    def in_collision(self, robot, configuration):
+        try:
+            self.client.check_collisions(robot, configuration)
+        except BackendError:
+            return True
+        return False
+
     def _inverse_kinematics(self, frame):
         raise NotImplementedError
 
+    def _inverse_kinematics_seeded(self, frame, seed):
+        raise NotImplementedError
+
     def joint_angles_to_configurations(self, robot, solutions):
         joint_names = robot.get_configurable_joint_names()
         return [Configuration.from_revolute_values(q, joint_names=joint_names) if q else None for q in solutions]
@@ -93,7 +184,13 @@ class UR5AnalyticalIK(AnalyticalInverseKinematics):
     def _inverse_kinematics(self, frame):
         return UR5().inverse(frame)
 
+    def _inverse_kinematics_seeded(self, frame, seed):
+        return UR5().inverse_seeded(frame, seed)
+
 class UR5eAnalyticalIK(AnalyticalInverseKinematics):
 
     def _inverse_kinematics(self, frame):
-        return UR5e().inverse(frame)
\ No newline at end of file
+        return UR5e().inverse(frame)
+
+    def _inverse_kinematics_seeded(self, frame, seed):
+        return UR5e().inverse_seeded(frame, seed)
@@ -0,0 +1,125 @@
+import io
+import json
+import os
+from collections import OrderedDict
+
+
+class IKCache(object):
+    """A bounded least-recently-used cache of inverse kinematics solutions.
+
+    Entries are keyed by the quantized frame plus an identity string of
+    the robot, its attached tool and the collision objects of the scene,
+    and store the 8 solutions together with their collision verdicts.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The maximum number of entries, the least recently used ones are
+        evicted first.
+    resolution : float, optional
+        The quantization step for the frame's point and axes.
+    filepath : str, optional
+        A JSON file to load the cache from, and to :meth:`save` it to.
+
+    Examples
+    --------
+
+    >>> cache = IKCache(maxsize=1000)
+    >>> cache.hit_rate
+    0.0
+    """
+
+    def __init__(self, maxsize=100000, resolution=1e-6, filepath=None):
+        self.maxsize = maxsize
+        self.resolution = resolution
+        self.filepath = filepath
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if filepath and os.path.exists(filepath):
+            self.load(filepath)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    @property
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'size': len(self.entries),
+                'maxsize': self.maxsize}
+
+    def identity(self, robot, client=None):
+        """Returns a string identifying the robot, its tool and the scene.
+
+        Clients with a ``scene_fingerprint``, like
+        :class:`workshop_sjsu.planning.setup.Client`, are identified by the
+        content of their meshes, others only by the names of their objects.
+        """
+        parts = [robot.name]
+        tool = robot.attached_tool
+        if tool:
+            parts.append(self._quantize(list(tool.frame.point) + list(tool.frame.xaxis) + list(tool.frame.yaxis)))
+        if hasattr(client, 'scene_fingerprint'):
+            parts.append(client.scene_fingerprint(robot))
+        elif client is not None:
+            parts.append(','.join(sorted(client.collision_objects.keys())))
+            parts.append(','.join(sorted(client.attached_collision_objects.keys())))
+            geometry = getattr(client, 'collision_geometry', None)
+            if geometry is not None:
+                parts.append(geometry.key)
+        return '|'.join(parts)
+
+    def key(self, frame, identity):
+        """Returns the cache key of a frame for a given identity."""
+        return identity + '|' + self._quantize(list(frame.point) + list(frame.xaxis) + list(frame.yaxis))
+
+    def _quantize(self, values):
+        return ','.join(str(int(round(v / self.resolution))) for v in values)
+
+    def get(self, key):
+        """Returns the ``(solutions, collisions)`` entry of a key, or ``None``."""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries[key] = entry
+        return entry
+
+    def put(self, key, solutions, collisions=None):
+        """Stores the solutions of a key.
+
+        Parameters
+        ----------
+        key : str
+        solutions : list of list of float or ``None``
+            The 8 solutions, ``None`` if the frame has no solutions at all.
+        collisions : list of bool, optional
+            The collision verdict of every solution, ``None`` if not checked.
+        """
+        self.entries.pop(key, None)
+        self.entries[key] = (solutions, collisions)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, filepath=None):
+        filepath = filepath or self.filepath
+        with io.open(filepath, 'w') as fp:
+            json.dump([[k, s, c] for k, (s, c) in self.entries.items()], fp)
+
+    def load(self, filepath):
+        with io.open(filepath, 'r') as fp:
+            for k, s, c in json.load(fp):
+                self.put(k, s, c)
@@ -60,30 +60,10 @@ def forward_kinematics_offset_wrist(joint_values, params):
     return frame
 
 
-def inverse_kinematics_offset_wrist(frame, params, q6_des=0.):
-    """Inverse kinematics function for offset wrist 6-axis robots.
-
-    Parameters
-    ----------
-    frame : :class:`compas.geometry.Frame`
-        The frame we want to calculate the inverse kinematics for.
-    params : list of float
-        The offset wrist parameters that specify the robot.
+ZERO_THRESH = 0.00000001
 
-    Returns
-    -------
-    list of list
-
-    Notes
-    -----
-    Code adapted from https://github.com/ros-industrial/universal_robot/blob/indigo-devel/ur_kinematics/src/ur_kin.cpp
-    """
-
-    ZERO_THRESH = 0.00000001
-    d1, a2, a3, d4, d5, d6 = params
-
-    solutions = []
 
+def _transformation_entries(frame):
     T02, T12, T22 = frame.xaxis
     T00, T10, T20 = frame.yaxis
     T01, T11, T21 = frame.zaxis
@@ -94,9 +74,15 @@ def inverse_kinematics_offset_wrist(frame, params, q6_des=0.):
     T13 *= -1
     T20 *= -1
     T21 *= -1
+    return (T00, T01, T02, T03, T10, T11, T12, T13, T20, T21, T22, T23)
 
+
+def _shoulder_joint(T, params):
     # shoulder rotate joint (q1)
     # q1[2]
+    d1, a2, a3, d4, d5, d6 = params
+    T00, T01, T02, T03, T10, T11, T12, T13, T20, T21, T22, T23 = T
+
     q1 = [0, 0]
     A = d6 * T12 - T13
     B = d6 * T02 - T03
@@ -145,91 +131,173 @@ def inverse_kinematics_offset_wrist(frame, params, q6_des=0.):
             q1[1] = neg
         else:
             q1[1] = 2.0*pi + neg
+    return q1
 
-    # wrist 2 joint (q5)
-    q5 = [[0, 0], [0, 0]]
-    for i in range(2):
-        numer = (T03 * sin(q1[i]) - T13*cos(q1[i]) - d4)
-        div = 0.0
-        if(fabs(fabs(numer) - fabs(d6)) < ZERO_THRESH):
-            div = sign(numer) * sign(d6)
-        else:
-            div = numer / d6
-        arccos = acos(div)
-        q5[i][0] = arccos
-        q5[i][1] = 2.0 * pi - arccos
 
-    for i in range(2):
-        for j in range(2):
-            c1 = cos(q1[i])
-            s1 = sin(q1[i])
-            c5 = cos(q5[i][j])
-            s5 = sin(q5[i][j])
-            q6 = 0.0
-
-            # wrist 3 joint (q6)
-            if(fabs(s5) < ZERO_THRESH):
-                q6 = q6_des
-            else:
-                q6 = atan2(sign(s5)*-(T01*s1 - T11*c1),
-                           sign(s5)*(T00*s1 - T10*c1))
-            if(fabs(q6) < ZERO_THRESH):
-                q6 = 0.0
-            if(q6 < 0.0):
-                q6 += 2.0*pi
-
-            # RRR joints (q2,q3,q4)
-            q2, q3, q4 = [0, 0], [0, 0], [0, 0]
-
-            c6 = cos(q6)
-            s6 = sin(q6)
-            x04x = -s5*(T02*c1 + T12*s1) - c5 * \
-                (s6*(T01*c1 + T11*s1) - c6*(T00*c1 + T10*s1))
-            x04y = c5*(T20*c6 - T21*s6) - T22*s5
-            p13x = d5*(s6*(T00*c1 + T10*s1) + c6*(T01*c1 + T11*s1)
-                       ) - d6*(T02*c1 + T12*s1) + T03*c1 + T13*s1
-            p13y = T23 - d1 - d6*T22 + d5*(T21*c6 + T20*s6)
-
-            c3 = (p13x*p13x + p13y*p13y - a2*a2 - a3*a3) / (2.0*a2*a3)
-            if(fabs(fabs(c3) - 1.0) < ZERO_THRESH):
-                c3 = sign(c3)
-            elif(fabs(c3) > 1.0):
-                solutions.extend([None, None])
-                continue
-
-            arccos = acos(c3)
-            q3[0] = arccos
-            q3[1] = 2.0*pi - arccos
-            denom = a2*a2 + a3*a3 + 2*a2*a3*c3
-            s3 = sin(arccos)
-            A = (a2 + a3*c3)
-            B = a3*s3
+def _wrist_2_joint(T, params, q1):
+    # wrist 2 joint (q5) for one value of q1
+    d1, a2, a3, d4, d5, d6 = params
+    T00, T01, T02, T03, T10, T11, T12, T13, T20, T21, T22, T23 = T
+
+    numer = (T03 * sin(q1) - T13*cos(q1) - d4)
+    div = 0.0
+    if(fabs(fabs(numer) - fabs(d6)) < ZERO_THRESH):
+        div = sign(numer) * sign(d6)
+    else:
+        div = numer / d6
+    arccos = acos(div)
+    return [arccos, 2.0 * pi - arccos]
+
+
+def _remaining_joints(T, params, q1, q5, q6_des, elbows=(0, 1)):
+    # wrist 3 joint (q6) and RRR joints (q2,q3,q4) for one value of q1 and q5
+    d1, a2, a3, d4, d5, d6 = params
+    T00, T01, T02, T03, T10, T11, T12, T13, T20, T21, T22, T23 = T
+
+    c1 = cos(q1)
+    s1 = sin(q1)
+    c5 = cos(q5)
+    s5 = sin(q5)
+    q6 = 0.0
+
+    # wrist 3 joint (q6)
+    if(fabs(s5) < ZERO_THRESH):
+        q6 = q6_des
+    else:
+        q6 = atan2(sign(s5)*-(T01*s1 - T11*c1),
+                   sign(s5)*(T00*s1 - T10*c1))
+    if(fabs(q6) < ZERO_THRESH):
+        q6 = 0.0
+    if(q6 < 0.0):
+        q6 += 2.0*pi
+
+    # RRR joints (q2,q3,q4)
+    q2, q3, q4 = [0, 0], [0, 0], [0, 0]
+
+    c6 = cos(q6)
+    s6 = sin(q6)
+    x04x = -s5*(T02*c1 + T12*s1) - c5 * \
+        (s6*(T01*c1 + T11*s1) - c6*(T00*c1 + T10*s1))
+    x04y = c5*(T20*c6 - T21*s6) - T22*s5
+    p13x = d5*(s6*(T00*c1 + T10*s1) + c6*(T01*c1 + T11*s1)
+               ) - d6*(T02*c1 + T12*s1) + T03*c1 + T13*s1
+    p13y = T23 - d1 - d6*T22 + d5*(T21*c6 + T20*s6)
+
+    c3 = (p13x*p13x + p13y*p13y - a2*a2 - a3*a3) / (2.0*a2*a3)
+    if(fabs(fabs(c3) - 1.0) < ZERO_THRESH):
+        c3 = sign(c3)
+    elif(fabs(c3) > 1.0):
+        return [None for _ in elbows]
+
+    arccos = acos(c3)
+    q3[0] = arccos
+    q3[1] = 2.0*pi - arccos
+    denom = a2*a2 + a3*a3 + 2*a2*a3*c3
+    s3 = sin(arccos)
+    A = (a2 + a3*c3)
+    B = a3*s3
+
+    solutions = []
+    for k in elbows:
+        if k == 0:
             q2[0] = atan2((A*p13y - B*p13x) / denom,
                           (A*p13x + B*p13y) / denom)
+        else:
             q2[1] = atan2((A*p13y + B*p13x) / denom,
                           (A*p13x - B*p13y) / denom)
-            c23_0 = cos(q2[0]+q3[0])
-            s23_0 = sin(q2[0]+q3[0])
-            c23_1 = cos(q2[1]+q3[1])
-            s23_1 = sin(q2[1]+q3[1])
-            q4[0] = atan2(c23_0*x04y - s23_0*x04x, x04x*c23_0 + x04y*s23_0)
-            q4[1] = atan2(c23_1*x04y - s23_1*x04x, x04x*c23_1 + x04y*s23_1)
-
-            for k in range(2):
-                if(fabs(q2[k]) < ZERO_THRESH):
-                    q2[k] = 0.0
-                elif(q2[k] < 0.0):
-                    q2[k] += 2.0*pi
-                if(fabs(q4[k]) < ZERO_THRESH):
-                    q4[k] = 0.0
-                elif(q4[k] < 0.0):
-                    q4[k] += 2.0*pi
-
-                solutions.append([q1[i], q2[k], q3[k], q4[k], q5[i][j], q6])
+        c23 = cos(q2[k]+q3[k])
+        s23 = sin(q2[k]+q3[k])
+        q4[k] = atan2(c23*x04y - s23*x04x, x04x*c23 + x04y*s23)
+
+        if(fabs(q2[k]) < ZERO_THRESH):
+            q2[k] = 0.0
+        elif(q2[k] < 0.0):
+            q2[k] += 2.0*pi
+        if(fabs(q4[k]) < ZERO_THRESH):
+            q4[k] = 0.0
+        elif(q4[k] < 0.0):
+            q4[k] += 2.0*pi
+
+        solutions.append([q1, q2[k], q3[k], q4[k], q5, q6])
+    return solutions
+
+
+def inverse_kinematics_offset_wrist(frame, params, q6_des=0.):
+    """Inverse kinematics function for offset wrist 6-axis robots.
+
+    Parameters
+    ----------
+    frame : :class:`compas.geometry.Frame`
+        The frame we want to calculate the inverse kinematics for.
+    params : list of float
+        The offset wrist parameters that specify the robot.
+
+    Returns
+    -------
+    list of list
+
+    Notes
+    -----
+    Code adapted from https://github.com/ros-industrial/universal_robot/blob/indigo-devel/ur_kinematics/src/ur_kin.cpp
+    """
+    T = _transformation_entries(frame)
+
+    solutions = []
+
+    q1 = _shoulder_joint(T, params)
+    q5 = [_wrist_2_joint(T, params, q1[i]) for i in range(2)]
+
+    for i in range(2):
+        for j in range(2):
+            solutions.extend(_remaining_joints(T, params, q1[i], q5[i][j], q6_des))
 
     return solutions
 
 
+def inverse_kinematics_offset_wrist_seeded(frame, params, seed):
+    """Inverse kinematics function for offset wrist 6-axis robots that only
+    solves the branch of the seed configuration.
+
+    Parameters
+    ----------
+    frame : :class:`compas.geometry.Frame`
+        The frame we want to calculate the inverse kinematics for.
+    params : list of float
+        The offset wrist parameters that specify the robot.
+    seed : list of float
+        The 6 joint values of the seed configuration.
+
+    Returns
+    -------
+    list of float or ``None``
+        The solution on the seed's shoulder, wrist and elbow branch, with
+        every joint value unwrapped to be closest to the seed, or ``None``
+        if that branch has no solution.
+
+    Notes
+    -----
+    The shoulder branch is the value of q1 closest to the seed, the wrist
+    and elbow branches are given by the sign of ``sin`` of q5 and q3. If the
+    wrist is singular, the seed's q6 is kept.
+    """
+    T = _transformation_entries(frame)
+
+    q1 = _shoulder_joint(T, params)
+    i = 0 if fabs(_wrap_to_pi(q1[0] - seed[0])) <= fabs(_wrap_to_pi(q1[1] - seed[0])) else 1
+    j = 0 if sin(seed[4]) >= 0 else 1
+    k = 0 if sin(seed[2]) >= 0 else 1
+
+    q5 = _wrist_2_joint(T, params, q1[i])
+    solution = _remaining_joints(T, params, q1[i], q5[j], seed[5], elbows=(k,))[0]
+    if solution is None:
+        return None
+    return [s + _wrap_to_pi(q - s) for q, s in zip(solution, seed)]
+
+
+def _wrap_to_pi(angle):
+    return (angle + pi) % (2.0 * pi) - pi
+
+
 if __name__ == "__main__":
     from compas.geometry import allclose
     params = [0.089159, -0.42500, -0.39225, 0.10915, 0.09465, 0.0823]  # ur5
@@ -237,3 +305,6 @@ if __name__ == "__main__":
     frame = forward_kinematics_offset_wrist(q, params)
     sol = inverse_kinematics_offset_wrist(frame, params)
     assert(allclose(sol[0], q))
+    for seed in sol:
+        if seed:
+            assert(allclose(inverse_kinematics_offset_wrist_seeded(frame, params, seed), seed))
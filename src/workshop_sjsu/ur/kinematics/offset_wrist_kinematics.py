@@ -1,6 +1,13 @@
+import compas
+
 from .offset_wrist import inverse_kinematics_offset_wrist
+from .offset_wrist import inverse_kinematics_offset_wrist_seeded
 from .offset_wrist import forward_kinematics_offset_wrist
 
+if not compas.IPY:
+    from .offset_wrist_numpy import forward_kinematics_offset_wrist_numpy
+    from .offset_wrist_numpy import inverse_kinematics_offset_wrist_numpy
+
 
 class OffsetWristKinematics(object):
     """
@@ -15,6 +22,23 @@ class OffsetWristKinematics(object):
     def inverse(self, frame_rcf):
         return inverse_kinematics_offset_wrist(frame_rcf, self.params)
 
+    def inverse_seeded(self, frame_rcf, seed):
+        return inverse_kinematics_offset_wrist_seeded(frame_rcf, self.params, seed)
+
+    def forward_numpy(self, joint_values, return_links=False):
+        """Calculates the flange transformations for a batch of joint values.
+
+        See :func:`forward_kinematics_offset_wrist_numpy`.
+        """
+        return forward_kinematics_offset_wrist_numpy(joint_values, self.params, return_links=return_links)
+
+    def inverse_numpy(self, poses, rotations=None):
+        """Solves the inverse kinematics for a batch of poses.
+
+        See :func:`inverse_kinematics_offset_wrist_numpy`.
+        """
+        return inverse_kinematics_offset_wrist_numpy(poses, self.params, rotations=rotations)
+
 
 UR10_PARAMS = {'d1': 0.1273,
                'a2': -0.612,
@@ -0,0 +1,272 @@
+import numpy as np
+from compas.geometry import Frame
+
+ZERO_THRESH = 0.00000001
+
+# base and flange rotations that map the DH chain onto the convention of
+# :func:`forward_kinematics_offset_wrist`
+BASE_FRAME = np.diag([-1.0, -1.0, 1.0, 1.0])
+FLANGE_FRAME = np.array([[0.0, -1.0, 0.0, 0.0],
+                         [0.0, 0.0, -1.0, 0.0],
+                         [1.0, 0.0, 0.0, 0.0],
+                         [0.0, 0.0, 0.0, 1.0]])
+
+
+def frames_to_numpy(frames):
+    """Converts a list of frames into an array of transformation matrices.
+
+    Parameters
+    ----------
+    frames : list of :class:`compas.geometry.Frame`
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Array of shape (N, 4, 4).
+    """
+    T = np.zeros((len(frames), 4, 4))
+    T[:, :3, 0] = [frame.xaxis for frame in frames]
+    T[:, :3, 1] = [frame.yaxis for frame in frames]
+    T[:, :3, 2] = [frame.zaxis for frame in frames]
+    T[:, :3, 3] = [frame.point for frame in frames]
+    T[:, 3, 3] = 1.0
+    return T
+
+
+def numpy_to_frames(T):
+    """Converts an array of transformation matrices into a list of frames.
+
+    Parameters
+    ----------
+    T : :class:`numpy.ndarray`
+        Array of shape (N, 4, 4).
+
+    Returns
+    -------
+    list of :class:`compas.geometry.Frame`
+    """
+    return [Frame(t[:3, 3].tolist(), t[:3, 0].tolist(), t[:3, 1].tolist()) for t in T]
+
+
+def forward_kinematics_offset_wrist_numpy(joint_values, params, return_links=False):
+    """Vectorized forward kinematics function for offset wrist 6-axis robots.
+
+    Parameters
+    ----------
+    joint_values : array-like
+        An (N, 6) array of joint values in radians.
+    params : list of float
+        The offset wrist parameters that specify the robot.
+    return_links : bool, optional
+        If ``True``, also return the intermediate link frames.
+
+    Returns
+    -------
+    :class:`numpy.ndarray` or tuple of :class:`numpy.ndarray`
+        The (N, 4, 4) flange transformations, same as the frames returned by
+        :func:`forward_kinematics_offset_wrist`. If ``return_links`` is
+        ``True``, also the (N, 7, 4, 4) DH link frames, from the base frame
+        up to (and including) the frame of the last joint.
+    """
+    d1, a2, a3, d4, d5, d6 = params
+    a = np.array([0.0, a2, a3, 0.0, 0.0, 0.0])
+    d = np.array([d1, 0.0, 0.0, d4, d5, d6])
+    alpha = np.array([np.pi / 2, 0.0, 0.0, np.pi / 2, -np.pi / 2, 0.0])
+    ca, sa = np.cos(alpha), np.sin(alpha)
+
+    q = np.asarray(joint_values, dtype=float).reshape(-1, 6)
+    n = len(q)
+    c, s = np.cos(q), np.sin(q)
+
+    # standard DH transformations, shape (N, 6, 4, 4)
+    A = np.zeros((n, 6, 4, 4))
+    A[..., 0, 0] = c
+    A[..., 0, 1] = -s * ca
+    A[..., 0, 2] = s * sa
+    A[..., 0, 3] = a * c
+    A[..., 1, 0] = s
+    A[..., 1, 1] = c * ca
+    A[..., 1, 2] = -c * sa
+    A[..., 1, 3] = a * s
+    A[..., 2, 1] = sa
+    A[..., 2, 2] = ca
+    A[..., 2, 3] = d
+    A[..., 3, 3] = 1.0
+
+    links = np.empty((n, 7, 4, 4))
+    links[:, 0] = BASE_FRAME
+    for i in range(6):
+        links[:, i + 1] = links[:, i] @ A[:, i]
+
+    T = links[:, 6] @ FLANGE_FRAME
+    if return_links:
+        return T, links
+    return T
+
+
+def _wrap_positive(angles):
+    # same clean-up as the scalar version: snap to zero, then move into [0, 2pi)
+    angles = np.where(np.fabs(angles) < ZERO_THRESH, 0.0, angles)
+    return np.where(angles < 0.0, angles + 2.0 * np.pi, angles)
+
+
+def inverse_kinematics_offset_wrist_numpy(poses, params, rotations=None, q6_des=0.):
+    """Vectorized inverse kinematics function for offset wrist 6-axis robots.
+
+    Parameters
+    ----------
+    poses : array-like
+        Either an (N, 4, 4) array of transformation matrices or, if
+        ``rotations`` is given, an (N, 3) array of positions.
+    params : list of float
+        The offset wrist parameters that specify the robot.
+    rotations : array-like, optional
+        An (N, 3, 3) array of rotation matrices, with the frame's xaxis,
+        yaxis and zaxis as columns.
+    q6_des : float, optional
+        The value of the last joint if the wrist is singular.
+
+    Returns
+    -------
+    tuple of :class:`numpy.ndarray`
+        The (N, 8, 6) joint values and the (N, 8) boolean validity mask.
+        Solutions are ordered as in :func:`inverse_kinematics_offset_wrist`,
+        invalid ones are filled with ``nan``. Where the scalar version raises
+        a ``ValueError``, all 8 solutions of that pose are invalid.
+
+    Notes
+    -----
+    Code adapted from https://github.com/ros-industrial/universal_robot/blob/indigo-devel/ur_kinematics/src/ur_kin.cpp
+    """
+    d1, a2, a3, d4, d5, d6 = params
+    pi = np.pi
+
+    poses = np.asarray(poses, dtype=float)
+    if rotations is None:
+        R = poses[..., :3, :3].reshape(-1, 3, 3)
+        p = poses[..., :3, 3].reshape(-1, 3)
+    else:
+        R = np.asarray(rotations, dtype=float).reshape(-1, 3, 3)
+        p = poses.reshape(-1, 3)
+    n = len(p)
+
+    T02, T12, T22 = -R[:, 0, 0], -R[:, 1, 0], R[:, 2, 0]
+    T00, T10, T20 = R[:, 0, 1], R[:, 1, 1], -R[:, 2, 1]
+    T01, T11, T21 = R[:, 0, 2], R[:, 1, 2], -R[:, 2, 2]
+    T03, T13, T23 = -p[:, 0], -p[:, 1], p[:, 2]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+
+        # shoulder rotate joint (q1), shape (N, 2)
+        A = d6 * T12 - T13
+        B = d6 * T02 - T03
+        R2 = A * A + B * B
+        a_zero = np.fabs(A) < ZERO_THRESH
+        b_zero = ~a_zero & (np.fabs(B) < ZERO_THRESH)
+
+        div = np.where(np.fabs(np.fabs(d4) - np.fabs(B)) < ZERO_THRESH, -np.sign(d4) * np.sign(B), -d4 / B)
+        arcsin = np.arcsin(div)
+        arcsin = np.where(np.fabs(arcsin) < ZERO_THRESH, 0.0, arcsin)
+        q1_a = np.stack([np.where(arcsin < 0.0, arcsin + 2.0 * pi, arcsin), pi - arcsin], axis=-1)
+
+        div = np.where(np.fabs(np.fabs(d4) - np.fabs(A)) < ZERO_THRESH, np.sign(d4) * np.sign(A), d4 / A)
+        arccos = np.arccos(div)
+        q1_b = np.stack([arccos, 2.0 * pi - arccos], axis=-1)
+
+        arccos = np.arccos(d4 / np.sqrt(R2))
+        arctan = np.arctan2(-B, A)
+        q1_r = _wrap_positive(np.stack([arccos + arctan, -arccos + arctan], axis=-1))
+
+        q1 = np.where(a_zero[:, None], q1_a, np.where(b_zero[:, None], q1_b, q1_r))
+        valid = ~(~a_zero & ~b_zero & (d4 * d4 > R2))
+
+        # wrist 2 joint (q5), shape (N, 2, 2)
+        s1, c1 = np.sin(q1), np.cos(q1)
+        numer = T03[:, None] * s1 - T13[:, None] * c1 - d4
+        div = np.where(np.fabs(np.fabs(numer) - np.fabs(d6)) < ZERO_THRESH, np.sign(numer) * np.sign(d6), numer / d6)
+        arccos = np.arccos(div)
+        q5 = np.stack([arccos, 2.0 * pi - arccos], axis=-1)
+
+        valid &= np.isfinite(q1).all(axis=1) & np.isfinite(q5).all(axis=(1, 2))
+
+        # broadcast everything to (N, 2, 2), indexed by [pose, q1 branch, q5 branch]
+        c1, s1 = c1[:, :, None], s1[:, :, None]
+        c5, s5 = np.cos(q5), np.sin(q5)
+        T00, T01, T02, T03 = [t[:, None, None] for t in (T00, T01, T02, T03)]
+        T10, T11, T12, T13 = [t[:, None, None] for t in (T10, T11, T12, T13)]
+        T20, T21, T22, T23 = [t[:, None, None] for t in (T20, T21, T22, T23)]
+
+        # wrist 3 joint (q6)
+        sign_s5 = np.sign(s5)
+        q6 = np.arctan2(sign_s5 * -(T01 * s1 - T11 * c1), sign_s5 * (T00 * s1 - T10 * c1))
+        q6 = np.where(np.fabs(s5) < ZERO_THRESH, q6_des, q6)
+        q6 = _wrap_positive(q6)
+
+        # RRR joints (q2, q3, q4)
+        c6, s6 = np.cos(q6), np.sin(q6)
+        x04x = -s5 * (T02 * c1 + T12 * s1) - c5 * (s6 * (T01 * c1 + T11 * s1) - c6 * (T00 * c1 + T10 * s1))
+        x04y = c5 * (T20 * c6 - T21 * s6) - T22 * s5
+        p13x = d5 * (s6 * (T00 * c1 + T10 * s1) + c6 * (T01 * c1 + T11 * s1)) - d6 * (T02 * c1 + T12 * s1) + T03 * c1 + T13 * s1
+        p13y = T23 - d1 - d6 * T22 + d5 * (T21 * c6 + T20 * s6)
+
+        c3 = (p13x * p13x + p13y * p13y - a2 * a2 - a3 * a3) / (2.0 * a2 * a3)
+        c3 = np.where(np.fabs(np.fabs(c3) - 1.0) < ZERO_THRESH, np.sign(c3), c3)
+        valid_c3 = np.fabs(c3) <= 1.0
+        c3 = np.clip(c3, -1.0, 1.0)
+
+        arccos = np.arccos(c3)
+        q3 = np.stack([arccos, 2.0 * pi - arccos], axis=-1)
+        denom = a2 * a2 + a3 * a3 + 2 * a2 * a3 * c3
+        s3 = np.sin(arccos)
+        A = a2 + a3 * c3
+        B = a3 * s3
+        q2 = np.stack([np.arctan2((A * p13y - B * p13x) / denom, (A * p13x + B * p13y) / denom),
+                       np.arctan2((A * p13y + B * p13x) / denom, (A * p13x - B * p13y) / denom)], axis=-1)
+        q23 = q2 + q3
+        c23, s23 = np.cos(q23), np.sin(q23)
+        x04x, x04y = x04x[..., None], x04y[..., None]
+        q4 = np.arctan2(c23 * x04y - s23 * x04x, x04x * c23 + x04y * s23)
+
+        q2 = _wrap_positive(q2)
+        q4 = _wrap_positive(q4)
+
+    # assemble (N, 2, 2, 2, 6), which flattens into the scalar solution order
+    shape = (n, 2, 2, 2)
+    solutions = np.empty(shape + (6,))
+    solutions[..., 0] = np.broadcast_to(q1[:, :, None, None], shape)
+    solutions[..., 1] = q2
+    solutions[..., 2] = q3
+    solutions[..., 3] = q4
+    solutions[..., 4] = np.broadcast_to(q5[..., None], shape)
+    solutions[..., 5] = np.broadcast_to(q6[..., None], shape)
+    solutions = solutions.reshape(n, 8, 6)
+
+    mask = np.broadcast_to((valid[:, None, None] & valid_c3)[..., None], shape).reshape(n, 8)
+    mask = mask & np.isfinite(solutions).all(axis=2)
+    solutions[~mask] = np.nan
+
+    return solutions, mask
+
+
+if __name__ == "__main__":
+    from compas.geometry import allclose
+    from offset_wrist import forward_kinematics_offset_wrist
+    from offset_wrist import inverse_kinematics_offset_wrist
+
+    params = [0.089159, -0.42500, -0.39225, 0.10915, 0.09465, 0.0823]  # ur5
+    q = [0.2, 5.5, 1.4, 1.3, 2.6, 3.6]
+    T = frames_to_numpy([forward_kinematics_offset_wrist(q, params)])
+    assert(allclose(forward_kinematics_offset_wrist_numpy([q], params).flatten(), T.flatten()))
+
+    frame = forward_kinematics_offset_wrist(q, params)
+    sol, mask = inverse_kinematics_offset_wrist_numpy(frames_to_numpy([frame]), params)
+    assert(allclose(sol[0, 0], q))
+
+    np.random.seed(0)
+    frames = [forward_kinematics_offset_wrist(qs, params) for qs in np.random.uniform(0, 2 * np.pi, (200, 6))]
+    sol, mask = inverse_kinematics_offset_wrist_numpy(frames_to_numpy(frames), params)
+    for frame, s, m in zip(frames, sol, mask):
+        for q_scalar, q_numpy, valid in zip(inverse_kinematics_offset_wrist(frame, params), s, m):
+            assert(valid == (q_scalar is not None))
+            if valid:
+                assert(allclose(q_scalar, q_numpy))
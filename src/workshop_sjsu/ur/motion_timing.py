@@ -0,0 +1,257 @@
+"""Estimates how long the UR takes for the programs of :mod:`utilities`.
+
+The motion commands of a program, with a move per waypoint or compact,
+are parsed into moves, and every move is timed with a trapezoidal
+velocity profile: ``movej`` on the leading joint, ``movel`` along the
+straight line of the TCP, which is found with the batched forward
+kinematics of the UR5e. Moves with a blend radius run into the next
+``movel`` without stopping; the speed at every waypoint is limited
+forwards and backwards by the accelerations, like a controller looking
+ahead. The orientation of ``movel`` and the shape of the blends are not
+modelled.
+"""
+import re
+
+import numpy as np
+
+try:
+    from kinematics.offset_wrist_kinematics import UR5e
+    from utilities import segments
+except ImportError:
+    from .kinematics.offset_wrist_kinematics import UR5e
+    from .utilities import segments
+
+MOVEJ, MOVEL = 0, 1
+# the URScript defaults
+DEFAULTS = {MOVEJ: {'a': 1.4, 'v': 1.05, 'r': 0.}, MOVEL: {'a': 1.2, 'v': 0.25, 'r': 0.}}
+
+NUMBER = r"-?[\d.]+(?:e-?\d+)?"
+MOVE = re.compile(r"(movej|movel)\(\[([^\]]*)\]((?:,\s*[avr]=%s)*)\)" % NUMBER)
+PARAMETER = re.compile(r"([avr])=(%s|\w+\[i\])" % NUMBER)
+SEND_INT = re.compile(r"socket_send_int\((\d+)\)")
+SET_TCP = re.compile(r"set_tcp\(p\[([^\]]*)\]\)")
+# the loop of a compact program, see URScriptHelper.iter_compact_configurations
+RUN_DEF = re.compile(r"def run\(([^)]*)\):")
+RUN_FIRST = re.compile(r"if offset \+ i == (\d+):")
+RUN_MOVES = {'movej': re.compile(r"movej\(q((?:,\s*[avr]=(?:%s|\w+\[i\]))*)\)" % NUMBER),
+             'stop': re.compile(r"movel\(q((?:,\s*a=(?:%s|\w+\[i\]))(?:,\s*[vr]=(?:%s|\w+\[i\]))*)\)" % (NUMBER, NUMBER)),
+             'blend': re.compile(r"movel\(q((?:,\s*[vr]=(?:%s|\w+\[i\]))*)\)" % NUMBER)}
+RUN_CALL = re.compile(r"^run\((.*)\)$")
+ARGUMENT = re.compile(r"\[[^\]]*\]|[^,\s]+")
+
+
+class Moves(object):
+    """The moves of a program, as arrays.
+
+    Attributes
+    ----------
+    kinds : :class:`numpy.ndarray`
+        :data:`MOVEJ` or :data:`MOVEL` per move.
+    joints : :class:`numpy.ndarray`
+        The (N, 6) target joint values.
+    a, v, r : :class:`numpy.ndarray`
+        The accelerations, velocities and blend radii.
+    indices : :class:`numpy.ndarray`
+        The waypoint index the program sends after the move, or -1.
+    tcp : list of float
+        The pose of ``set_tcp``.
+    """
+
+    def __init__(self, moves, tcp=None):
+        self.kinds = np.array([m[0] for m in moves], dtype=int)
+        self.joints = np.array([m[1] for m in moves], dtype=float).reshape(-1, 6)
+        self.a, self.v, self.r = (np.array([m[2][key] for m in moves], dtype=float).reshape(-1) for key in 'avr')
+        self.indices = np.array([m[3] for m in moves], dtype=int)
+        self.tcp = tcp or [0, 0, 0, 0, 0, 0]
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+def _parameters(kind, text, lists=None, i=None):
+    parameters = dict(DEFAULTS[kind])
+    for key, value in PARAMETER.findall(text):
+        parameters[key] = lists[value[:-3]][i] if value.endswith('[i]') else float(value)
+    return parameters
+
+
+def _numbers(text):
+    text = text.strip('[]')
+    return [float(x) for x in text.split(',')] if text else []
+
+
+def _run_moves(script):
+    """Returns the moves of the ``run`` calls of a compact program."""
+    names = [name.strip() for name in RUN_DEF.search(script).group(1).split(',')]
+    first = int(RUN_FIRST.search(script).group(1))
+    texts = dict((name, pattern.search(script).group(1)) for name, pattern in RUN_MOVES.items())
+    moves = []
+    for line in script.splitlines():
+        match = RUN_CALL.match(line.strip())
+        if not match:
+            continue
+        arguments = dict(zip(names, ARGUMENT.findall(match.group(1))))
+        deltas = np.array(_numbers(arguments['d']), dtype=float).reshape(-1, 6)
+        joints = np.cumsum(deltas, axis=0) / 1000000.0
+        stops = set(int(x) for x in _numbers(arguments['stops']))
+        offset = int(arguments['offset'])
+        lists = dict((name, _numbers(value)) for name, value in arguments.items() if name not in ('d', 'stops'))
+        for i in range(int(arguments['n'])):
+            if offset + i == first:
+                kind, text = MOVEJ, texts['movej']
+            else:
+                kind, text = MOVEL, texts['stop'] if i in stops else texts['blend']
+            moves.append((kind, joints[i], _parameters(kind, text, lists, i), offset + i))
+    return moves
+
+
+def parse_program(script):
+    """Returns the :class:`Moves` of a program, moves to poses are skipped."""
+    tcp = SET_TCP.search(script)
+    tcp = _numbers(tcp.group(1)) if tcp else None
+    if RUN_DEF.search(script):
+        moves = []
+        # the approach of a resumed program comes before the loop
+        for match in MOVE.finditer(script[:RUN_DEF.search(script).start()]):
+            kind = MOVEJ if match.group(1) == 'movej' else MOVEL
+            moves.append((kind, _numbers(match.group(2)), _parameters(kind, match.group(3)), -1))
+        return Moves(moves + _run_moves(script), tcp)
+
+    moves = []
+    for line in script.splitlines():
+        line = line.strip()
+        match = MOVE.match(line)
+        if match:
+            kind = MOVEJ if match.group(1) == 'movej' else MOVEL
+            moves.append([kind, _numbers(match.group(2)), _parameters(kind, match.group(3)), -1])
+            continue
+        match = SEND_INT.match(line)
+        if match and moves:
+            moves[-1][3] = int(match.group(1))
+    return Moves(moves, tcp)
+
+
+def tcp_positions(joints, tcp=None):
+    """Returns the (N, 3) TCP positions of the (N, 6) joint values."""
+    T = UR5e().forward_numpy(joints)
+    offset = np.array((tcp or [0, 0, 0])[:3], dtype=float)
+    return T[:, :3, 3] + T[:, :3, :3] @ offset
+
+
+def _segment_times(length, u, w, v, a):
+    """Returns the times of trapezoidal profiles over ``length`` from the
+    speed ``u`` to ``w``, with the maximum speed ``v`` and acceleration ``a``."""
+    accelerating = (v ** 2 - u ** 2) / (2 * a)
+    decelerating = (v ** 2 - w ** 2) / (2 * a)
+    cruising = length - accelerating - decelerating
+    trapezoid = (v - u) / a + (v - w) / a + np.maximum(cruising, 0) / v
+    peak = np.sqrt(np.maximum((2 * a * length + u ** 2 + w ** 2) / 2, 0))
+    triangle = (peak - u) / a + (peak - w) / a
+    return np.where(cruising >= 0, trapezoid, triangle)
+
+
+def move_times(moves, start=None):
+    """Returns the duration of every move, starting at rest at the joint
+    values ``start``, or at the first target if None."""
+    count = len(moves)
+    if not count:
+        return np.zeros(0)
+    previous = np.vstack([moves.joints[:1] if start is None else np.reshape(start, (1, 6)), moves.joints[:-1]])
+
+    # the lengths in rad for movej and in m for movel
+    lengths = np.max(np.abs(moves.joints - previous), axis=1)
+    linear = moves.kinds == MOVEL
+    if np.any(linear):
+        positions = tcp_positions(np.vstack([previous[:1], moves.joints]), moves.tcp)
+        distances = np.linalg.norm(np.diff(positions, axis=0), axis=1)
+        lengths[linear] = distances[linear]
+
+    # the speed at the end of every move, not zero only into a blended movel
+    limits = np.zeros(count)
+    blended = (moves.r[:-1] > 0) & linear[:-1] & linear[1:]
+    limits[:-1][blended] = np.minimum(moves.v[:-1], moves.v[1:])[blended]
+    speeds = np.zeros(count + 1)
+    for k in range(count):
+        speeds[k + 1] = min(limits[k], np.sqrt(speeds[k] ** 2 + 2 * moves.a[k] * lengths[k]))
+    for k in range(count - 1, -1, -1):
+        speeds[k] = min(speeds[k], np.sqrt(speeds[k + 1] ** 2 + 2 * moves.a[k] * lengths[k]))
+
+    return _segment_times(lengths, speeds[:-1], speeds[1:], moves.v, moves.a)
+
+
+def timing_report(indices, durations, startends=None, gradients=None, colors=None):
+    """Returns the total duration, the durations of the paths and the time
+    the light is off, in s, of moves with the waypoint ``indices``, -1 for
+    moves without one, and the ``durations``.
+
+    The paths are split from the transitions by :func:`utilities.segments`.
+    The light is off during the moves without an index and into the
+    waypoints with a zero gradient or color, or, without them, outside of
+    the paths; it is None without both.
+    """
+    indices = np.asarray(indices, dtype=int)
+    durations = np.asarray(durations, dtype=float)
+    times = np.cumsum(durations)
+    indexed = indices >= 0
+    arrivals = dict(zip(indices[indexed].tolist(), times[indexed].tolist()))
+    report = {'duration': float(times[-1]) if len(times) else 0., 'moves': len(indices),
+              'waypoints': len(arrivals)}
+
+    paths = []
+    if startends is not None:
+        for start, end, is_path in segments(startends, gradients, colors):
+            if is_path and start in arrivals and end in arrivals:
+                paths.append({'start': start, 'end': end, 'duration': arrivals[end] - arrivals[start]})
+    report['paths'] = paths
+
+    if startends is None and gradients is None:
+        report['light_on'] = report['light_off'] = None
+        return report
+    lit = np.zeros(len(indices), dtype=bool)
+    if gradients is not None:
+        lit_waypoints = np.asarray(gradients, dtype=float) > 0
+        if colors is not None:
+            lit_waypoints &= np.any(np.asarray(colors, dtype=float) > 0, axis=1)
+        lit[indexed] = lit_waypoints[indices[indexed]]
+    else:
+        for path in paths:
+            lit |= (indices > path['start']) & (indices <= path['end'])
+    report['light_on'] = float(np.sum(durations[lit]))
+    report['light_off'] = report['duration'] - report['light_on']
+    return report
+
+
+def format_report(report):
+    """Returns a timing report as text."""
+    lines = ['Duration   %9.1f s for %i waypoints' % (report['duration'], report['waypoints'])]
+    if report['light_on'] is not None:
+        lines.append('Light on   %9.1f s' % report['light_on'])
+        lines.append('Light off  %9.1f s' % report['light_off'])
+    for path in report['paths']:
+        lines.append('Path %5i to %5i %7.1f s' % (path['start'], path['end'], path['duration']))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    from utilities import URScriptHelper
+
+    joint_values = np.array([[0, -np.pi / 2, np.pi / 2, -np.pi / 2, -np.pi / 2, 0]] * 3)
+    joint_values[1, 0] = 0.5
+    joint_values[2, 0] = 1.0
+    ur = URScriptHelper('10.0.0.99', 9111)
+    for emit in (ur.iter_configurations, ur.iter_compact_configurations):
+        moves = parse_program(''.join(emit(joint_values, 0.1, 0., 0.5, [0, 0, 1])))
+        assert moves.indices.tolist() == [0, 1, 2] and moves.kinds.tolist() == [MOVEJ, MOVEL, MOVEL]
+        durations = move_times(moves, start=joint_values[0] - [0.35, 0, 0, 0, 0, 0])
+        # the compact program rounds to microradians
+        # movej of 0.35 rad at v=0.1 and the default a=1.4, accelerating and braking over 0.1 ** 2 / 1.4 rad
+        assert abs(durations[0] - (2 * 0.1 / 1.4 + (0.35 - 0.1 ** 2 / 1.4) / 0.1)) < 1e-4
+        # movel without blend at v=0.1 and the default a=1.2 along the chord of the TCP
+        length = np.linalg.norm(np.diff(tcp_positions(joint_values[:2]), axis=0))
+        assert abs(durations[1] - (2 * 0.1 / 1.2 + (length - 0.1 ** 2 / 1.2) / 0.1)) < 1e-4
+
+    # a path of a single waypoint has only one flag
+    startends = [0, 0, 1, 0, 1, 1, 1, 1, 1, 1, 1, 0, 0, 1, 0, 0]
+    report = timing_report(range(16), [1.] * 16, startends)
+    assert [(path['start'], path['end'], path['duration']) for path in report['paths']] == [(2, 4, 2.), (7, 7, 0.), (10, 13, 3.)]
+    assert report['light_on'] == 5.
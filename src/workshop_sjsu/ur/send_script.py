@@ -1,54 +1,284 @@
 import argparse
 import io
+import json
 import os
 import sys
+import queue
+import socket
 import struct
+import threading
 
 import compas
 
 try:
-    from utilities import is_available, URScriptHelper
+    from utilities import is_available, segments, windows, URScriptHelper, UR_SERVER_PORT
+    from execution_file import is_execution_file, ExecutionFile
 except:
-    from .utilities import is_available, URScriptHelper
+    from .utilities import is_available, segments, windows, URScriptHelper, UR_SERVER_PORT
+    from .execution_file import is_execution_file, ExecutionFile
 
 
 BYTE_ORDER = '!'
 PAYLOAD_FORMAT = 'I'
 
-def execute(proxy_ip, proxy_port, ur_ip, configurations, tool_angle_axis):
-    ur = URScriptHelper(proxy_ip, proxy_port, tool_angle_axis)
-    script = ur.send_configurations(configurations, velocity=0.01, radius=0.01)
+VELOCITY = 0.01
+RADIUS = 0.01
+# of the moves into the start and end waypoints, where the windows are handed over
+ACCELERATION = 0.1
+WINDOW_SIZE = 2000
+# the programs of the windowed mode connect back to this port to send the reached waypoints
+PROGRESS_PORT = 30010
+PROGRESS_TIMEOUT = 30
 
+def execute(proxy_ip, proxy_port, ur_ip, configurations, tool_angle_axis, compact=False,
+            start=0, approach=None, checkpoint=None, progress_port=None, startends=None):
+    """Sends the program and follows the waypoints the robot reports.
+
+    Only with a ``progress_port`` the program connects back to report the
+    reached waypoints, and it must do so within :data:`PROGRESS_TIMEOUT`.
+    Without, the reports are read from the connection the program is sent
+    on, and it returns once nothing is reported for that long, while the
+    program keeps running on the robot.
+    """
     ur_available = is_available(ur_ip)
 
     if ur_available:
         print('UR connected, sending script...')
+        sock = listener = connection = None
         try:
-            sock = ur.execute(ur_ip, script)
+            sock = socket.create_connection((ur_ip, UR_SERVER_PORT), timeout=2)
+            progress = None
+            if progress_port:
+                listener = progress_listener(progress_port)
+                progress = (sock.getsockname()[0], progress_port)
+            ur = URScriptHelper(proxy_ip, proxy_port, tool_angle_axis, progress=progress)
+            # generated while it is sent
+            emit = ur.iter_compact_configurations if compact else ur.iter_configurations
+            # the robot stops at the start and end waypoints of the paths
+            script = emit(configurations[start:], VELOCITY, RADIUS, ACCELERATION,
+                          startends[start:] if startends is not None else None, offset=start, approach=approach)
+            ur.execute(ur_ip, script, sock)
+            if listener:
+                connection = accept_progress(listener)
+            else:
+                sock.settimeout(PROGRESS_TIMEOUT)
 
             while True:
-                data = sock.recv(4)
-                if not data:
+                try:
+                    value = recv_index(connection or sock)
+                except socket.timeout:
+                    print('No progress reported for {} s, the program keeps running on the robot.'.format(
+                        PROGRESS_TIMEOUT))
+                    return
+                if value is None:
                     break
+                if not start <= value < len(configurations):
+                    continue
 
-                value = struct.unpack(BYTE_ORDER + PAYLOAD_FORMAT, data)[0]
+                if checkpoint:
+                    save_checkpoint(checkpoint, value, len(configurations))
                 if (value + 1) == len(configurations):
+                    if checkpoint:
+                        os.remove(checkpoint)
                     print('Done!')
                     return
         finally:
-            if sock:
-                sock.close()
+            for s in (connection, listener, sock):
+                if s:
+                    s.close()
+    else:
+        print('UR not connected!')
+
+
+def progress_listener(port=PROGRESS_PORT):
+    """Returns a socket listening for the ``"progress"`` connections of the
+    programs, see :class:`utilities.URScriptHelper`."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('', port))
+    listener.listen(1)
+    return listener
+
+
+def accept_progress(listener, timeout=PROGRESS_TIMEOUT):
+    """Returns the connection of the next program that starts, it blocks
+    while the robot moves."""
+    listener.settimeout(timeout)
+    try:
+        connection, address = listener.accept()
+    except socket.timeout:
+        raise ConnectionError('No program connected for progress within {} s'.format(timeout))
+    connection.settimeout(None)
+    return connection
+
+
+def recv_index(sock):
+    """Returns the next waypoint index the program sends, or None if the
+    connection is closed."""
+    data = b''
+    while len(data) < 4:
+        chunk = sock.recv(4 - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return struct.unpack(BYTE_ORDER + PAYLOAD_FORMAT, data)[0]
+
+
+def run_windows(ur, sock, listener, configurations, startends, window_size=WINDOW_SIZE, compact=False,
+                start=0, approach=None, checkpoint=None):
+    """Runs a long program in windows of about ``window_size`` waypoints
+    on the connected robot, see :func:`utilities.windows`.
+
+    A program sent to the controller replaces the running one, so every
+    window is sent when the robot reports the last waypoint of the previous
+    one, a start or end waypoint where it stands still, and starts there.
+    The robot reports the waypoints on the ``"progress"`` connection every
+    program of ``ur`` opens to the ``listener``, indices outside of the
+    current window are ignored. The script of the next window is generated
+    while the current one runs. The program runs from the waypoint
+    ``start`` on, after the ``approach``, and every reached index is written
+    to the ``checkpoint`` file. Returns the number of windows.
+    """
+    bounds = [(a + start, b + start) for a, b in windows(startends[start:], window_size)]
+    emit = ur.iter_compact_configurations if compact else ur.iter_configurations
+    # at most one window is generated ahead
+    scripts = queue.Queue(maxsize=1)
+
+    def generate():
+        try:
+            for k, (first, end) in enumerate(bounds):
+                chunks = emit(configurations[first:end + 1], VELOCITY, RADIUS, ACCELERATION,
+                              startends[first:end + 1], offset=first, approach=approach if k == 0 else None)
+                scripts.put(''.join(chunks))
+        except Exception as e:
+            scripts.put(e)
+
+    thread = threading.Thread(target=generate)
+    thread.daemon = True
+    thread.start()
+
+    for k, (first, end) in enumerate(bounds):
+        script = scripts.get()
+        if isinstance(script, Exception):
+            raise script
+        sock.sendall(script.encode('ascii'))
+        print(' [ ] Window {} of {}, waypoints {} to {}'.format(k + 1, len(bounds), first, end))
+        connection = accept_progress(listener)
+        try:
+            while True:
+                index = recv_index(connection)
+                if index is None:
+                    raise ConnectionError('The robot closed the connection in window {}'.format(k + 1))
+                if not first <= index <= end:
+                    continue
+                if checkpoint:
+                    save_checkpoint(checkpoint, index, len(configurations))
+                if index == end:
+                    break
+        finally:
+            connection.close()
+    if checkpoint:
+        os.remove(checkpoint)
+    return len(bounds)
+
+
+def execute_windowed(proxy_ip, proxy_port, ur_ip, configurations, startends, tool_angle_axis,
+                     window_size=WINDOW_SIZE, compact=False, start=0, approach=None, checkpoint=None,
+                     progress_port=PROGRESS_PORT):
+    if is_available(ur_ip):
+        print('UR connected, sending windows...')
+        sock = socket.create_connection((ur_ip, UR_SERVER_PORT), timeout=2)
+        listener = progress_listener(progress_port)
+        try:
+            # the address the robot reaches this computer at
+            ur = URScriptHelper(proxy_ip, proxy_port, tool_angle_axis,
+                                progress=(sock.getsockname()[0], progress_port))
+            run_windows(ur, sock, listener, configurations, startends, window_size, compact, start, approach,
+                        checkpoint)
+            print('Done!')
+        finally:
+            listener.close()
+            sock.close()
     else:
         print('UR not connected!')
 
 
+def save_checkpoint(filepath, index, count):
+    """Writes the last index the robot reached of a program of ``count`` waypoints."""
+    # replaced in one go, so that an interruption never leaves half a file
+    partial = filepath + '.partial'
+    with io.open(partial, 'w') as fp:
+        fp.write(json.dumps({'index': index, 'count': count}))
+    os.replace(partial, filepath)
+
+
+def load_checkpoint(filepath, count):
+    """Returns the last index the robot reached, or None if there is no
+    checkpoint of a program of ``count`` waypoints."""
+    if not os.path.exists(filepath):
+        return None
+    with io.open(filepath, 'r') as fp:
+        checkpoint = json.load(fp)
+    if checkpoint['count'] != count:
+        return None
+    return checkpoint['index']
+
+
+def resume_index(startends, index, gradients=None, colors=None):
+    """Returns the waypoint to resume at if ``index`` was the last one
+    reached: the start of the path, or the transition, the next waypoint
+    is on, so that no finished path is drawn twice. Returns None if the
+    last path is finished.
+
+    The paths and transitions are split by :func:`utilities.segments`,
+    with the ``gradients`` and ``colors`` if given.
+
+    Examples
+    --------
+
+    >>> startends = [0, 0, 1, 0, 1, 1, 1, 1, 1, 1, 1, 0, 0, 1, 0, 0]
+    >>> resume_index(startends, 12), resume_index(startends, 7), resume_index(startends, 13)
+    (10, 8, None)
+    """
+    parts = segments(startends, gradients, colors)
+    ends = [end for start, end, is_path in parts if is_path]
+    if not ends or index >= ends[-1]:
+        return None
+    following = [start for start, end, is_path in parts if start <= index + 1]
+    return following[-1] if following else 0
+
+
+def load_startends(file):
+    """Returns the start and end flags of the waypoints of a command file."""
+    if is_execution_file(file):
+        return ExecutionFile(file).startends
+    with io.open(file, 'r') as fp:
+        commands = compas.json_load(fp)
+    startends = commands.get('startends')
+    return [0] * len(commands['configurations']) if startends is None else startends
+
+
+def load_light(file):
+    """Returns the gradients and colors of the waypoints of a command file,
+    or None if it has none."""
+    if is_execution_file(file):
+        execution = ExecutionFile(file)
+        return execution.gradients, execution.colors
+    with io.open(file, 'r') as fp:
+        commands = compas.json_load(fp)
+    return commands.get('gradients'), commands.get('colors')
+
+
 def load_command_file(file):
     if not os.path.exists(file):
         print(f' [!] Cannot find file={file}')
         print('     Verify the file exists and is a valid JSON file.')
         sys.exit(1)
 
-    
+    if is_execution_file(file):
+        # the memory-mapped joint values, formatted directly into the script
+        return ExecutionFile(file).configurations
+
     with io.open(file, 'r') as fp:
         commands = compas.json_load(fp)
         configurations = commands['configurations']
@@ -64,9 +294,21 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='Lightpainting controller')
     parser.add_argument(
-        'file', type=str, help='light painting file containing robot points and colors')
+        'file', type=str, help='light painting file containing robot points and colors, JSON or binary')
     parser.add_argument(
         '--ur', type=str, help='IP address of the UR robot.', default='10.0.0.10')
+    parser.add_argument(
+        '--compact', action='store_true', help='send the waypoints as lists run by a loop on the controller.')
+    parser.add_argument(
+        '--window', type=int, help='send the program in windows of about this many waypoints.', default=None)
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='resume an interrupted run at the path of the last reached waypoint of its checkpoint.')
+    parser.add_argument(
+        '--progress-port', type=int, default=None,
+        help='let the programs connect back to this port to report the reached waypoints, '
+             'the robot must reach this computer. The windowed mode always does, on port {} '
+             'by default.'.format(PROGRESS_PORT))
 
     args = parser.parse_args()
 
@@ -79,5 +321,30 @@ if __name__ == "__main__":
     print(' [✓] Loaded {} configurations'.format(len(configurations)))
 
     ur_ip = args.ur
+    checkpoint = args.file + '.checkpoint'
+
+    startends = load_startends(args.file)
+    start, approach = 0, None
+    if args.resume:
+        index = load_checkpoint(checkpoint, len(configurations))
+        if index is None:
+            print(' [!] No checkpoint of this file to resume from.')
+            sys.exit(1)
+        start = resume_index(startends, index, *load_light(args.file))
+        if start is None:
+            print(' [✓] The last path was finished at waypoint {}, nothing to resume.'.format(index))
+            os.remove(checkpoint)
+            sys.exit(0)
+        # back along the executed waypoints, which are free of collisions
+        approach = configurations[start:index + 1][::-1]
+        print(' [✓] Resuming at waypoint {}, the last one reached was {}'.format(start, index))
 
-    execute(proxy_ip, proxy_port, ur_ip, configurations, tool_angle_axis)
+    if args.window:
+        execute_windowed(proxy_ip, proxy_port, ur_ip, configurations, startends, tool_angle_axis,
+                         window_size=args.window, compact=args.compact,
+                         start=start, approach=approach, checkpoint=checkpoint,
+                         progress_port=args.progress_port or PROGRESS_PORT)
+    else:
+        execute(proxy_ip, proxy_port, ur_ip, configurations, tool_angle_axis, compact=args.compact,
+                start=start, approach=approach, checkpoint=checkpoint, progress_port=args.progress_port,
+                startends=startends)
@@ -1,9 +1,23 @@
 import argparse
 import asyncio
 import functools
+import io
+import json
 import re
 import socket
 import struct
+import sys
+
+try:
+    from motion_timing import parse_program, move_times, timing_report, format_report
+    from utilities import URScriptHelper
+    from execution_file import is_execution_file, ExecutionFile
+    from send_script import VELOCITY, RADIUS, ACCELERATION
+except ImportError:
+    from .motion_timing import parse_program, move_times, timing_report, format_report
+    from .utilities import URScriptHelper
+    from .execution_file import is_execution_file, ExecutionFile
+    from .send_script import VELOCITY, RADIUS, ACCELERATION
 
 BYTE_ORDER = '!'
 PAYLOAD_FORMAT = 'I'
@@ -20,7 +34,104 @@ def get_current_ip_address():
     return ip
 
 
-async def handle_tcp_request(callback, reader, writer):
+TEXTMSG = re.compile(r"textmsg\(\"(.+)\"\)")
+PROGRESS_OPEN = re.compile(r"socket_open\(\"([^\"]+)\", (\d+), \"progress\"\)")
+
+
+def program_messages(script):
+    """Returns the text messages of a program, but the waypoint indices."""
+    messages = []
+    for line in script.splitlines():
+        match = TEXTMSG.match(line.strip())
+        if match and not match.group(1).isdigit():
+            messages.append(match.group(1))
+    return messages
+
+
+def load_execution(file):
+    """Returns the configurations, startends, gradients and colors of an
+    execution file, binary or JSON."""
+    if is_execution_file(file):
+        execution = ExecutionFile(file)
+        return execution.configurations, execution.startends, execution.gradients, execution.colors / 255.
+    import compas
+    data = compas.json_load(file)
+    return data['configurations'], data['startends'], data['gradients'], data['colors']
+
+
+class SimulatedRobot(object):
+    """The joint values and the executed moves of the robot of a connection,
+    over all the programs it receives.
+
+    Parameters
+    ----------
+    speedup : float, optional
+        How many times faster than real time the moves run, as fast as
+        possible with 0.
+    execution : tuple, optional
+        The startends, gradients and colors of the execution file, for the
+        paths and the light of the report.
+    """
+
+    def __init__(self, speedup=1., execution=None):
+        self.speedup = speedup
+        self.execution = execution
+        self.joints = None
+        self.indices = []
+        self.durations = []
+
+    def report(self):
+        startends, gradients, colors = self.execution or (None, None, None)
+        return timing_report(self.indices, self.durations, startends, gradients, colors)
+
+
+async def run_program(script, writer, robot):
+    """Runs the moves of a program in simulated time and sends the index of
+    every waypoint when the robot reaches it, see :mod:`motion_timing`.
+
+    Like the controller, the indices are sent on the ``"progress"`` socket
+    the program opens, which is closed when the program ends or is
+    replaced. Programs without one get them back on the connection they
+    were received on.
+    """
+    for message in program_messages(script):
+        print(f'| {message}')
+    moves = parse_program(script)
+    durations = move_times(moves, robot.joints)
+
+    progress = None
+    match = PROGRESS_OPEN.search(script)
+    if match:
+        reader, progress = await asyncio.open_connection(match.group(1), int(match.group(2)))
+    print(f' [ ] Running program of {len(moves)} moves, {durations.sum():.1f} s\r', end='', flush=True)
+
+    loop = asyncio.get_event_loop()
+    t0 = loop.time()
+    elapsed = 0.
+    try:
+        for k in range(len(moves)):
+            elapsed += durations[k]
+            if robot.speedup:
+                delay = t0 + elapsed / robot.speedup - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # where a replacing program starts from
+            robot.joints = moves.joints[k]
+            robot.indices.append(int(moves.indices[k]))
+            robot.durations.append(float(durations[k]))
+            if moves.indices[k] >= 0:
+                (progress or writer).write(struct.pack(BYTE_ORDER + PAYLOAD_FORMAT, int(moves.indices[k])))
+                await (progress or writer).drain()
+    finally:
+        if progress:
+            progress.close()
+    print(f' [✓] Ran program of {len(moves)} moves in {elapsed:.1f} s')
+
+
+async def handle_tcp_request(speedup, execution, report_file, reader, writer):
+    robot = SimulatedRobot(speedup, execution)
+    running = None
+    lines = []
     try:
         while True:
             data = await reader.readline()
@@ -29,29 +140,74 @@ async def handle_tcp_request(callback, reader, writer):
             if len(data) == 0:
                 return
 
-            print(f' [ ] Received {len(data)} bytes from {addr}:{port}', end='', flush=True)
-            callback(data, writer)
-            print(f' [✓]')
+            lines.append(data.decode('ascii'))
+            # a program ends with its call
+            if data.strip() == b'program()':
+                print(f' [✓] Received program of {sum(map(len, lines))} bytes from {addr}:{port}')
+                # like the controller, a new program replaces the running one
+                if running:
+                    running.cancel()
+                running = asyncio.ensure_future(run_program(''.join(lines), writer, robot))
+                lines = []
 
     finally:
+        if running:
+            running.cancel()
         if writer:
             writer.close()
+        if robot.indices:
+            report = robot.report()
+            print(format_report(report))
+            if report_file:
+                with io.open(report_file, 'w') as fp:
+                    fp.write(json.dumps(report, indent=2))
 
 
-async def start_server(callback, port=30002):
+async def start_server(speedup=1., port=30002, execution=None, report_file=None):
     print(' [ ] Starting TCP server...\r', end='', flush=True)
-    server = await asyncio.start_server(functools.partial(handle_tcp_request, callback), '0.0.0.0', port)
+    server = await asyncio.start_server(functools.partial(handle_tcp_request, speedup, execution, report_file),
+                                        '0.0.0.0', port)
     addr, port = server.sockets[0].getsockname()
     print(f' [✓] Started TCP server on {addr}:{port}')
 
     async with server:
         await server.serve_forever()
 
+
+def estimate(file, velocity=VELOCITY, radius=RADIUS, acceleration=ACCELERATION, compact=False):
+    """Returns the timing report of an execution file, planned with its start
+    and end waypoints as stops, like the windows of ``send_script.py``."""
+    configurations, startends, gradients, colors = load_execution(file)
+    ur = URScriptHelper('127.0.0.1', 9111)
+    emit = ur.iter_compact_configurations if compact else ur.iter_configurations
+    moves = parse_program(''.join(emit(configurations, velocity, radius, acceleration, startends)))
+    return timing_report(moves.indices, move_times(moves), startends, gradients, colors)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='UR Server simulator')
+    parser.add_argument('--speedup', type=float, default=1.,
+                        help='how many times faster than real time the robot moves, 0 for as fast as possible.')
+    parser.add_argument('--port', type=int, default=30002, help='the port to listen on.')
+    parser.add_argument('--execution-file', type=str, help='the execution file, for the paths and the light of the report.')
+    parser.add_argument('--report', type=str, help='write the timing report of every connection as JSON to this file.')
+    parser.add_argument('--estimate', type=str, metavar='FILE',
+                        help='print the timing report of this execution file, without a server.')
+    parser.add_argument('--velocity', type=float, default=VELOCITY, help='the velocity of --estimate.')
+    parser.add_argument('--radius', type=float, default=RADIUS, help='the blend radius of --estimate.')
+    parser.add_argument('--acceleration', type=float, default=ACCELERATION, help='the acceleration of --estimate.')
+    parser.add_argument('--compact', action='store_true', help='estimate the compact program.')
 
     args = parser.parse_args()
 
+    if args.estimate:
+        report = estimate(args.estimate, args.velocity, args.radius, args.acceleration, args.compact)
+        print(format_report(report))
+        if args.report:
+            with io.open(args.report, 'w') as fp:
+                fp.write(json.dumps(report, indent=2))
+        sys.exit(0)
+
     print()
     print('UR Server Simulator')
     print()
@@ -59,23 +215,5 @@ if __name__ == '__main__':
     ip_address = get_current_ip_address()
     print(' [✓] Local IP address: {}'.format(ip_address))
 
-    regex = re.compile(r"(textmsg)\(\"(.+)\"\)|(socket_send_int)\((\d+)\)")
-
-    def urserver_callback(data, writer):
-        data = data.decode('ascii').strip()
-        match = regex.match(data)
-
-        if match:
-            for group in range(1, len(match.groups()))[::2]:
-                if match.group(group) is not None:
-                    cmd = match.group(group)
-                    params = match.group(group + 1)
-                    if cmd == 'textmsg':
-                        print(f'| {params}', end='', flush=True)
-                    if cmd == 'socket_send_int':
-                        response = struct.pack(BYTE_ORDER + PAYLOAD_FORMAT, int(params))
-                        writer.write(response)
-        
-        print('\r', end='', flush=True)
-
-    asyncio.run(start_server(urserver_callback))
+    execution = load_execution(args.execution_file)[1:] if args.execution_file else None
+    asyncio.run(start_server(args.speedup, args.port, execution, args.report))
@@ -2,6 +2,8 @@ import math
 import os
 import socket
 
+import numpy as np
+
 
 def is_available(ur_ip):
     syscall = "ping -r 1 -n 1 %s"
@@ -24,48 +26,299 @@ URSCRIPT_TEMPLATE_PRE += "\tset_tcp(p{tcp})\n"
 URSCRIPT_TEMPLATE_PRE += "\tsocket_open(PROXY_ADDRESS, PROXY_PORT)\n"
 
 
+# the connection the programs send the reached waypoint indices on, back to send_script.py
+URSCRIPT_PROGRESS_OPEN = "\tsocket_open(\"{host}\", {port}, \"progress\")\n"
+URSCRIPT_PROGRESS_CLOSE = "socket_close(\"progress\")\n\t"
+
 URSCRIPT_TEMPLATE_POST = "socket_close()\n"
 URSCRIPT_TEMPLATE_POST += "\ttextmsg(\"<< Exiting program.\")\n"
 URSCRIPT_TEMPLATE_POST += "end\n"
 URSCRIPT_TEMPLATE_POST += "program()\n\n\n"
 
+# waypoints per list literal of the compact program, the joint value list
+# of a chunk stays below 1000 items
+COMPACT_CHUNK_SIZE = 150
+# joint values are sent as integer deltas in this unit, in rad
+COMPACT_RESOLUTION = 1e-6
+
+URSCRIPT_COMPACT_RUN = """def run(d, stops, n, offset{params}):
+	j = [0, 0, 0, 0, 0, 0]
+	k = 0
+	i = 0
+	while i < n:
+		j = [j[0] + d[6 * i], j[1] + d[6 * i + 1], j[2] + d[6 * i + 2], j[3] + d[6 * i + 3], j[4] + d[6 * i + 4], j[5] + d[6 * i + 5]]
+		q = [j[0] / {unit}, j[1] / {unit}, j[2] / {unit}, j[3] / {unit}, j[4] / {unit}, j[5] / {unit}]
+		if offset + i == {first}:
+			movej(q, v={v}, r={r})
+		elif stops[k] == i:
+			movel(q, a={a}, v={v})
+			k = k + 1
+		else:
+			movel(q, v={v}, r={r})
+		end
+		socket_send_int(offset + i)
+{progress}		i = i + 1
+	end
+end
+"""
+
+
+def write_script(write, chunks, buffer_size=1 << 16):
+    """Writes the chunks of a script with ``write``, e.g. ``fp.write``, in
+    blocks of about ``buffer_size`` characters."""
+    block, size = [], 0
+    for chunk in chunks:
+        block.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            write(''.join(block))
+            block, size = [], 0
+    if block:
+        write(''.join(block))
+
+
+def windows(startends, size):
+    """Returns the ``(start, end)`` indices of the windows of a long program
+    of about ``size`` waypoints.
+
+    Every window but the last ends at a start or end waypoint, where the
+    robot stops, and the next window starts there, so that it can take
+    over the motion without a jump.
+    """
+    stops = np.flatnonzero(np.asarray(startends, dtype=bool))
+    count = len(startends)
+    result, start = [], 0
+    while count - 1 - start > size:
+        candidates = stops[(stops > start) & (stops <= start + size)]
+        if not len(candidates):
+            # a longer window up to the next stop
+            candidates = stops[stops > start][:1]
+            if not len(candidates):
+                break
+        end = int(candidates[-1])
+        result.append((start, end))
+        start = end
+    if start < count - 1 or not result:
+        result.append((start, count - 1))
+    return result
+
+
+def segments(startends, gradients=None, colors=None):
+    """Returns the ``(start, end, is_path)`` indices of the paths and of the
+    transitions between them of the flattened waypoints.
+
+    The paths and transitions follow each other without a gap and are
+    flagged at their first and last waypoint in ``startends``, a path of
+    one waypoint only once, see
+    :meth:`workshop_sjsu.planning.session.PlanningSession.add_transition_between_paths_and_flatten`.
+    A transition has at least two waypoints. Where the flags allow more
+    than one split, the one is taken whose transitions are dark, with a
+    zero gradient or color, and whose paths are not, or else the one with
+    the longer paths first.
+
+    Examples
+    --------
+
+    >>> startends = [0, 0, 1, 0, 1, 1, 1, 1, 1, 1, 1, 0, 0, 1, 0, 0]
+    >>> segments(startends)
+    [(2, 4, True), (5, 6, False), (7, 7, True), (8, 9, False), (10, 13, True)]
+    """
+    flags = np.flatnonzero(np.asarray(startends, dtype=bool)).tolist()
+    count = len(flags)
+    if not count:
+        return []
+    if gradients is not None:
+        dark = np.asarray(gradients, dtype=float) <= 0
+        if colors is not None:
+            dark |= ~np.any(np.asarray(colors, dtype=float) > 0, axis=1)
+        dark = np.concatenate([[0], np.cumsum(dark)])
+
+    def score(is_path, start, end):
+        if gradients is None:
+            return 0
+        return int((dark[end + 1] - dark[start] == end + 1 - start) == is_path)
+
+    # best[i][is_path] is the score and end flag of the best split of the flags
+    # from i on, with a path or a transition at i, the last segment is a path
+    best = [[None, None] for _ in range(count + 1)]
+    best[count][False] = (0, None)
+    for i in range(count - 1, -1, -1):
+        for is_path in (False, True):
+            # the segment ends at the next flag, or here if it is a single waypoint
+            for j in (i + 1, i) if is_path else (i + 1,):
+                if j >= count or (j + 1 < count and flags[j + 1] != flags[j] + 1):
+                    continue
+                following = best[j + 1][not is_path]
+                if following is None:
+                    continue
+                value = score(is_path, flags[i], flags[j]) + following[0]
+                if best[i][is_path] is None or value < best[i][is_path][0]:
+                    best[i][is_path] = (value, j)
+
+    if best[0][True] is None:
+        # not flattened paths, every pair of flags is one
+        return [(flags[i], flags[min(i + 1, count - 1)], True) for i in range(0, count, 2)]
+    result, i, is_path = [], 0, True
+    while i < count:
+        j = best[i][is_path][1]
+        result.append((flags[i], flags[j], is_path))
+        i, is_path = j + 1, not is_path
+    return result
+
 
 class URScriptHelper(object):
-    def __init__(self, proxy_ip, proxy_port, tcp=[0, 0, 0, 0, 0, 0]):
+    """Generates the programs that move the robot through the waypoints and
+    send the index of every reached waypoint to the proxy.
+
+    With ``progress``, the ``(host, port)`` of ``send_script.py``, the
+    programs also open a socket named ``"progress"`` to it and send the
+    indices there, the controller does not send them back on the
+    connection a program is received on.
+    """
+
+    def __init__(self, proxy_ip, proxy_port, tcp=[0, 0, 0, 0, 0, 0], progress=None):
         self.template_pre = URSCRIPT_TEMPLATE_PRE.format(proxy_ip=proxy_ip, proxy_port=proxy_port, tcp=tcp, indent=INDENT)
+        self.template_post = URSCRIPT_TEMPLATE_POST
+        self.progress = progress
+        if progress:
+            host, port = progress
+            self.template_pre += URSCRIPT_PROGRESS_OPEN.format(host=host, port=port)
+            self.template_post = URSCRIPT_PROGRESS_CLOSE + URSCRIPT_TEMPLATE_POST
 
     def wrap_script(self, script):
         indented_script = '\n'.join([INDENT + line for line in script.split('\n')])
-        script = self.template_pre + indented_script + URSCRIPT_TEMPLATE_POST.format(indent=INDENT)
+        script = self.template_pre + indented_script + self.template_post.format(indent=INDENT)
         return script
 
-    def send_configurations(self, configurations, velocity, radius, acceleration, startends=None):
-        script = ""
-        for i, config in enumerate(configurations):
-            config = config.copy()
+    def send_configurations(self, configurations, velocity, radius, acceleration=None, startends=None):
+        return ''.join(self.iter_configurations(configurations, velocity, radius, acceleration, startends))
 
-            start_or_end = startends[i]
-        
+    def iter_configurations(self, configurations, velocity, radius, acceleration=None, startends=None, offset=0,
+                            approach=None):
+        """Yields the program of :meth:`send_configurations` in chunks of
+        indented lines, one per waypoint, so that it can be written to a
+        file or socket while it is generated.
+
+        ``configurations`` are :class:`compas.robots.Configuration` or rows of
+        joint values, e.g. the memory-mapped column of an execution file.
+        The waypoints are numbered from ``offset``, for a window of a longer
+        program, see :func:`windows`. ``approach`` are waypoints the robot
+        moves through first, see :meth:`approach_script`.
+        """
+        if hasattr(configurations, 'tolist'):
+            configurations = configurations.tolist()
+        if hasattr(startends, 'tolist'):
+            startends = startends.tolist()
+
+        joint_values = '[%.6f, %.6f, %.6f, %.6f, %.6f, %.6f]'
+        movej = INDENT + 'movej(' + joint_values + ', v=%.4f, r=%.4f)\n'
+        blend = INDENT + 'movel(' + joint_values + ', v=%.4f, r=%.4f)\n'
+        stop = INDENT + 'movel(' + joint_values + ', a=%.4f, v=%.4f)\n'
+        feedback = INDENT + 'socket_send_int(%i)\n'
+        if self.progress:
+            feedback += INDENT + 'socket_send_int(%i, "progress")\n'
+        feedback += INDENT + 'textmsg("%i")\n'
+
+        yield self.template_pre
+        if approach is not None:
+            yield self.approach_script(approach, velocity, radius, acceleration)
+        for i, config in enumerate(configurations):
+            values = tuple(getattr(config, 'joint_values', config))
             if i == 0:
-                script += 'movej([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], v=%.4f, r=%.4f)\n' % tuple(config.joint_values + [velocity, radius])
+                line = movej % (values + (velocity, radius))
+            elif startends and startends[i]:
+                line = stop % (values + (acceleration, velocity))
             else:
-                #script += 'movel([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], v=%.4f, r=%.4f)\n' % tuple(config.joint_values + [velocity, radius])
-                if not start_or_end:
-                    script += 'movel([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], v=%.4f, r=%.4f)\n' % tuple(config.joint_values + [velocity, radius])
-                else:
-                    script += 'movel([%.6f, %.6f, %.6f, %.6f, %.6f, %.6f], a=%.4f, v=%.4f)\n' % tuple(config.joint_values + [acceleration, velocity])
+                line = blend % (values + (velocity, radius))
+            yield line + feedback % ((offset + i,) * feedback.count('%i'))
+        yield INDENT + self.template_post
 
-            script += 'socket_send_int(%i)\n' % i
-            script += 'textmsg("%i")\n' % i
+    def iter_compact_configurations(self, configurations, velocity, radius, acceleration=None, startends=None,
+                                    chunk_size=COMPACT_CHUNK_SIZE, offset=0, approach=None):
+        """Yields a compact program that moves like the one of
+        :meth:`iter_configurations`, in chunks.
 
-        return self.wrap_script(script)
+        The waypoints are packed into URScript list literals of at most
+        ``chunk_size`` waypoints, run by a ``while`` loop on the controller:
+        the joint values as integer deltas of :data:`COMPACT_RESOLUTION`
+        to the previous waypoint of the chunk, and the start and end
+        waypoints as a list of indices. ``velocity``, ``radius`` and
+        ``acceleration`` are numbers or sequences with a value per waypoint.
+        The index of every waypoint, from ``offset``, is sent to the proxy
+        as before, but it is no longer logged with ``textmsg``. ``approach``
+        is the same as for :meth:`iter_configurations`.
+        """
+        joint_values = np.array([getattr(config, 'joint_values', config) for config in configurations]
+                                if not hasattr(configurations, 'shape') else configurations, dtype=float)
+        count = len(joint_values)
+        startends = np.zeros(count, dtype=bool) if startends is None else np.asarray(startends, dtype=bool)
+        # the first waypoint is always a movej
+        stops = np.flatnonzero(startends[1:]) + 1
+        if len(stops) and acceleration is None:
+            raise ValueError("The start and end waypoints need an acceleration.")
+
+        # the values per waypoint are passed as lists, the others are constants in the loop
+        values, params, names = [], '', {}
+        for name, value in (('v', velocity), ('r', radius), ('a', 0. if acceleration is None else acceleration)):
+            if np.ndim(value):
+                values.append((name, np.broadcast_to(np.asarray(value, dtype=float), (count,))))
+                params += ', ' + name
+                names[name] = name + '[i]'
+            else:
+                names[name] = '%.4f' % value
+
+        units = np.round(joint_values / COMPACT_RESOLUTION).astype(np.int64)
+        progress = '\t\tsocket_send_int(offset + i, "progress")\n' if self.progress else ''
+        run = URSCRIPT_COMPACT_RUN.format(params=params, unit='%.1f' % (1 / COMPACT_RESOLUTION), first=offset,
+                                          progress=progress, **names)
+
+        yield self.template_pre
+        if approach is not None:
+            yield self.approach_script(approach, velocity, radius, acceleration)
+        yield ''.join(INDENT + line + '\n' for line in run.splitlines())
+        for start in range(0, count, chunk_size):
+            chunk = units[start:start + chunk_size]
+            deltas = np.diff(chunk, axis=0, prepend=np.zeros((1, 6), dtype=np.int64))
+            indices = stops[(stops >= start) & (stops < start + chunk_size)] - start
+            # the number of waypoints is a sentinel that never matches an index
+            arguments = ['[%s]' % ','.join(map(str, deltas.ravel().tolist())),
+                         '[%s]' % ','.join(map(str, indices.tolist() + [len(chunk)])),
+                         str(len(chunk)), str(offset + start)]
+            arguments += ['[%s]' % ','.join('%.4f' % x for x in value[start:start + chunk_size].tolist())
+                          for name, value in values]
+            yield INDENT + 'run(%s)\n' % ', '.join(arguments)
+        yield INDENT + self.template_post
+
+    def approach_script(self, configurations, velocity, radius, acceleration):
+        """Returns the indented moves through the waypoints before a resumed
+        program, e.g. the executed ones backwards, stopping at the last one.
+        No indices are sent, so the light stays off."""
+        if hasattr(configurations, 'tolist'):
+            configurations = configurations.tolist()
+        joint_values = '[%.6f, %.6f, %.6f, %.6f, %.6f, %.6f]'
+        blend = INDENT + 'movel(' + joint_values + ', v=%.4f, r=%.4f)\n'
+        stop = INDENT + 'movel(' + joint_values + ', a=%.4f, v=%.4f)\n'
+
+        lines = [INDENT + 'textmsg("Approaching the resumed waypoint.")\n']
+        for i, config in enumerate(configurations):
+            values = tuple(getattr(config, 'joint_values', config))
+            if i < len(configurations) - 1:
+                lines.append(blend % (values + (velocity, radius)))
+            else:
+                lines.append(stop % (values + (acceleration, velocity)))
+        return ''.join(lines)
 
     def execute(self, ur_ip, script, sock=None):
+        """Sends the script, a string or the chunks of :meth:`iter_configurations`
+        or :meth:`iter_compact_configurations`."""
         try:
             if not sock:
                 sock = socket.create_connection((ur_ip, UR_SERVER_PORT), timeout=2)
 
-            sock.send(script.encode('ascii'))
+            if isinstance(script, str):
+                sock.send(script.encode('ascii'))
+            else:
+                write_script(lambda chunk: sock.sendall(chunk.encode('ascii')), script)
             print("Script sent to {} on port {}".format(ur_ip, UR_SERVER_PORT))
 
             return sock